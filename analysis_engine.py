@@ -0,0 +1,839 @@
+import json
+import os
+import re
+import warnings
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 向量化統計分析引擎
+# 一次將所有欄位轉成數值，並以 NumPy 同時計算每個數值欄位的
+# 敘述統計、線性趨勢 (斜率 / R²)、年增率 (YoY) 與年複合成長率 (CAGR)。
+# 分析結果為結構化物件，文字報告由 render_report() 依結果產生。
+
+TOTAL_LABEL = "桃園市"
+TOTAL_LABELS = (TOTAL_LABEL, "總計", "合計")
+LABEL_HINTS = ("年", "月", "別", "名稱", "區")
+TIME_HINTS = ("年", "月")
+
+
+@dataclass
+class SeriesStats:
+    name: str
+    count: int
+    total: float
+    mean: float
+    std: float
+    min_value: float
+    max_value: float
+    min_label: Any
+    max_label: Any
+    slope: Optional[float] = None
+    intercept: Optional[float] = None
+    r_squared: Optional[float] = None
+    growth_pct: Optional[float] = None
+    yoy_pct: Optional[float] = None
+    cagr_pct: Optional[float] = None
+
+
+@dataclass
+class AnalysisResult:
+    label_col: str
+    total_count: int
+    numeric_cols: List[str]
+    total_row_excluded: bool
+    is_time_series: bool
+    series: Dict[str, SeriesStats] = field(default_factory=dict)
+    correlation: Optional[Tuple[str, float]] = None
+    top10: List[Tuple[Any, float]] = field(default_factory=list)
+
+    @property
+    def target_col(self) -> Optional[str]:
+        return self.numeric_cols[0] if self.numeric_cols else None
+
+
+def pick_label_column(columns: List[str]) -> str:
+    return next((c for c in columns if any(h in str(c) for h in LABEL_HINTS)), columns[0])
+
+
+def coerce_numeric(df: pd.DataFrame, columns: List[str]) -> Tuple[pd.DataFrame, List[str]]:
+    """一次轉換所有欄位；只要有任一非空值無法轉成數字，該欄就不視為數值欄位。"""
+    if not columns:
+        return pd.DataFrame(index=df.index), []
+    raw = df[columns]
+    # 已經是數值型別的欄位不必再轉換，只處理 object 欄位
+    object_cols = [c for c in columns if not pd.api.types.is_numeric_dtype(raw[c])]
+    coerced = raw.copy()
+    if object_cols:
+        coerced[object_cols] = raw[object_cols].apply(pd.to_numeric, errors="coerce")
+    valid = (coerced.notna() | raw.isna()).all(axis=0)
+    numeric_cols = [c for c in columns if valid[c]]
+    return coerced[numeric_cols], numeric_cols
+
+
+def _pairwise_moments(x: np.ndarray, y: np.ndarray):
+    """x 為 (n, 1)、y 為 (n, k)；只使用兩者皆非 NaN 的列計算 (平移後的) 一階 / 二階動差。"""
+    w = ~np.isnan(y) & ~np.isnan(x)
+    # 先平移到接近 0 再累加，避免大數值相減時失去精度 (平移不影響變異數與共變異數)
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        x_shift = np.nan_to_num(np.nanmean(x, axis=0))
+        y_shift = np.nan_to_num(np.nanmean(y, axis=0))
+    xz = np.where(w, x - x_shift, 0.0)
+    yz = np.where(w, y - y_shift, 0.0)
+    cnt = w.sum(axis=0)
+    sx = xz.sum(axis=0)
+    sy = yz.sum(axis=0)
+    var_x = cnt * (xz * xz).sum(axis=0) - sx ** 2
+    var_y = cnt * (yz * yz).sum(axis=0) - sy ** 2
+    cov = cnt * (xz * yz).sum(axis=0) - sx * sy
+    return cnt, sx, sy, var_x, var_y, cov, x_shift, y_shift
+
+
+def _linear_trend(y: np.ndarray):
+    """對 (n, k) 矩陣的每一欄做簡單線性迴歸 (忽略 NaN)，回傳 slope / intercept / R²。"""
+    x = np.arange(y.shape[0], dtype=float)[:, None]
+    cnt, sx, sy, var_x, var_y, cov, x_shift, y_shift = _pairwise_moments(x, y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(var_x != 0, cov / var_x, np.nan)
+        intercept = (sy - slope * sx) / cnt + y_shift - slope * x_shift
+        r_squared = np.where((var_x != 0) & (var_y > 0), cov ** 2 / (var_x * var_y), 0.0)
+    return slope, intercept, r_squared
+
+
+def _correlate_with(target: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """target 與 y 每一欄的皮爾森相關係數 (pairwise complete，同 pandas corr)。"""
+    _, _, _, var_x, var_y, cov, _, _ = _pairwise_moments(target[:, None], y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where((var_x > 0) & (var_y > 0), cov / np.sqrt(var_x * var_y), np.nan)
+
+
+def analyze_records(records: List[Dict[str, Any]]) -> AnalysisResult:
+    df = pd.DataFrame(records)
+    columns = df.columns.tolist()
+    label_col = pick_label_column(columns)
+    values, numeric_cols = coerce_numeric(df, [c for c in columns if c != label_col])
+    is_time = any(h in str(label_col) for h in TIME_HINTS)
+
+    result = AnalysisResult(
+        label_col=label_col,
+        total_count=len(df),
+        numeric_cols=numeric_cols,
+        total_row_excluded=False,
+        is_time_series=is_time,
+    )
+    if not numeric_cols:
+        return result
+
+    labels = df[label_col].to_numpy()
+    all_y = values.to_numpy(dtype=float)
+
+    # 若有「桃園市」總計列，總計直接取該列，其餘統計排除該列
+    is_total = df[label_col].astype(str).str.strip().to_numpy() == TOTAL_LABEL
+    if is_total.any() and not is_total.all():
+        totals = all_y[np.argmax(is_total)]
+        y = all_y[~is_total]
+        labels = labels[~is_total]
+        result.total_row_excluded = True
+    else:
+        totals = np.nansum(all_y, axis=0)
+        y = all_y
+
+    n = y.shape[0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        counts = (~np.isnan(y)).sum(axis=0)
+        means = np.nanmean(y, axis=0)
+        stds = np.nanstd(y, axis=0, ddof=1) if n > 1 else np.full(y.shape[1], np.nan)
+        filled_max = np.where(np.isnan(y), -np.inf, y)
+        filled_min = np.where(np.isnan(y), np.inf, y)
+        max_idx = filled_max.argmax(axis=0)
+        min_idx = filled_min.argmin(axis=0)
+
+        first, last = y[0], y[-1]
+        growth = np.where(first != 0, (last - first) / first * 100, np.nan)
+        prev = y[-2] if n >= 2 else np.full(y.shape[1], np.nan)
+        yoy = np.where(prev != 0, (last - prev) / prev * 100, np.nan)
+        periods = max(n - 1, 1)
+        cagr = np.where((first > 0) & (last > 0), (np.abs(last / first) ** (1 / periods) - 1) * 100, np.nan)
+
+    slope = intercept = r_squared = None
+    if n >= 3:
+        slope, intercept, r_squared = _linear_trend(y)
+
+    cols = np.arange(len(numeric_cols))
+    max_vals = y[max_idx, cols]
+    min_vals = y[min_idx, cols]
+    for j, col in enumerate(numeric_cols):
+        result.series[col] = SeriesStats(
+            name=col,
+            count=int(counts[j]),
+            total=float(totals[j]),
+            mean=float(means[j]),
+            std=float(stds[j]),
+            min_value=float(min_vals[j]),
+            max_value=float(max_vals[j]),
+            min_label=labels[min_idx[j]],
+            max_label=labels[max_idx[j]],
+            slope=None if slope is None else float(slope[j]),
+            intercept=None if intercept is None else float(intercept[j]),
+            r_squared=None if r_squared is None else float(r_squared[j]),
+            growth_pct=float(growth[j]) if n >= 2 and is_time else None,
+            yoy_pct=float(yoy[j]) if n >= 2 and is_time else None,
+            cagr_pct=float(cagr[j]) if n >= 2 and is_time else None,
+        )
+
+    if len(numeric_cols) >= 2:
+        corr = _correlate_with(y[:, 0], y[:, 1:])
+        if not np.isnan(corr).all():
+            best = int(np.nanargmax(np.abs(corr)))
+            result.correlation = (numeric_cols[best + 1], float(corr[best]))
+
+    target = y[:, 0]
+    valid = np.flatnonzero(~np.isnan(target))
+    order = valid[np.argsort(-target[valid], kind="stable")][:10]
+    result.top10 = [(labels[i], float(target[i])) for i in order]
+    return result
+
+
+# --- Long Format (Data / DataDate / ComplexName) ---
+# 上游 API 實際回傳的是 {"Header": ..., "EffectiveComplexName": ..., "Data": [...]} 長表，
+# 每列為一個 (DataDate, ComplexName1, ComplexName2, FValue) 儲存格。
+# 與 script.js 相同：ComplexName1 視為指標，ComplexName2 (空白時退回 PlaceName) 視為地區 / 細項。
+# 長表只 pivot 一次成 (日期 × 指標 × 地區) 的稠密陣列，之後所有統計都在陣列上批次計算。
+
+DATE_FIELD = "DataDate"
+METRIC_FIELD = "ComplexName1"
+DISTRICT_FIELD = "ComplexName2"
+PLACE_FIELD = "PlaceName"
+VALUE_FIELD = "FValue"
+
+# 稠密陣列的儲存格上限 (float64，預設約 160 MB)，避免極度稀疏的資料把記憶體撐爆
+CUBE_MAX_CELLS = int(os.environ.get("TAOYUAN_CUBE_MAX_CELLS", str(20_000_000)))
+# 報告中逐一列出的指標數上限
+REPORT_METRIC_LIMIT = 10
+
+
+def is_long_format(data: Any) -> bool:
+    return isinstance(data, dict) and isinstance(data.get("Data"), list)
+
+
+@dataclass
+class LongFormatCube:
+    title: str
+    header: Dict[str, Any]
+    dates: List[str]
+    metrics: List[str]
+    districts: List[str]
+    values: np.ndarray  # shape = (日期, 指標, 地區)，缺值為 NaN
+    row_count: int
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.values.shape
+
+
+@dataclass
+class MetricStats:
+    name: str
+    cells: int
+    total: float
+    mean: float
+    max_value: float
+    max_at: Tuple[str, str]  # (地區, 日期)
+    min_value: float
+    min_at: Tuple[str, str]
+    per_date: List[float]  # 各期總計 (有總計列時取總計列)
+    slope: Optional[float] = None
+    r_squared: Optional[float] = None
+    growth_pct: Optional[float] = None
+    yoy_pct: Optional[float] = None
+    cagr_pct: Optional[float] = None
+    top_districts: List[Tuple[str, float]] = field(default_factory=list)
+    fastest_growing: Optional[Tuple[str, float]] = None
+    top10: List[Tuple[str, str, float]] = field(default_factory=list)  # (地區, 日期, 數值)
+
+
+@dataclass
+class CubeAnalysis:
+    cube: LongFormatCube
+    total_row_excluded: bool
+    district_count: int
+    metrics: Dict[str, MetricStats] = field(default_factory=dict)
+    correlation: Optional[Tuple[str, str, float]] = None
+
+
+def pivot_long_format(payload: Dict[str, Any]) -> LongFormatCube:
+    """將長表 pivot 成 (日期 × 指標 × 地區) 陣列；同一儲存格出現多筆時加總。"""
+    rows = payload.get("Data") or []
+    header = payload.get("Header") if isinstance(payload.get("Header"), dict) else {}
+    title = payload.get("EffectiveComplexName") or "統計資料"
+    value_name = header.get("FValueHeaderName") or "數值"
+
+    df = pd.DataFrame(rows, columns=[DATE_FIELD, METRIC_FIELD, DISTRICT_FIELD, PLACE_FIELD, VALUE_FIELD])
+    dates = df[DATE_FIELD].fillna("").astype(str).str.strip()
+    metrics = df[METRIC_FIELD].fillna("").astype(str).str.strip().replace("", value_name)
+    districts = df[DISTRICT_FIELD].fillna("").astype(str).str.strip()
+    places = df[PLACE_FIELD].fillna("").astype(str).str.strip()
+    districts = districts.where(districts != "", places)
+
+    # 日期排序與 script.js 一致；指標 / 地區維持資料出現順序 (即 dashboard 下拉選單順序)
+    date_codes, date_labels = pd.factorize(dates, sort=True)
+    metric_codes, metric_labels = pd.factorize(metrics)
+    district_codes, district_labels = pd.factorize(districts)
+    shape = (len(date_labels), len(metric_labels), len(district_labels))
+    size = shape[0] * shape[1] * shape[2]
+    if size > CUBE_MAX_CELLS:
+        raise ValueError(f"資料維度過大 ({shape[0]}×{shape[1]}×{shape[2]})，無法建立分析陣列")
+
+    values = pd.to_numeric(df[VALUE_FIELD], errors="coerce").to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    flat = ((date_codes * shape[1] + metric_codes) * shape[2] + district_codes)[valid]
+    sums = np.bincount(flat, weights=values[valid], minlength=size)
+    counts = np.bincount(flat, minlength=size)
+    cube = np.where(counts > 0, sums, np.nan).reshape(shape)
+
+    return LongFormatCube(
+        title=title,
+        header=header,
+        dates=[str(d) for d in date_labels],
+        metrics=[str(m) for m in metric_labels],
+        districts=[str(d) for d in district_labels],
+        values=cube,
+        row_count=len(rows),
+    )
+
+
+def _nansum_or_nan(values: np.ndarray, axis) -> np.ndarray:
+    present = (~np.isnan(values)).any(axis=axis)
+    return np.where(present, np.nansum(values, axis=axis), np.nan)
+
+
+def analyze_cube(cube: LongFormatCube) -> CubeAnalysis:
+    """對所有指標一次計算總計 / 極值 / 各期趨勢 / 地區排行。"""
+    n_dates, n_metrics, _ = cube.shape
+    is_total = np.isin(np.array(cube.districts, dtype=object), TOTAL_LABELS)
+    excluded = bool(is_total.any() and not is_total.all())
+    keep = ~is_total if excluded else np.ones(len(cube.districts), dtype=bool)
+    v = cube.values[:, :, keep]  # (D, M, K)
+    districts = np.array(cube.districts, dtype=object)[keep]
+    n_districts = v.shape[2]
+    analysis = CubeAnalysis(cube=cube, total_row_excluded=excluded, district_count=n_districts)
+    if v.size == 0:
+        return analysis
+
+    # 各期總計：有總計列時優先採用，該期總計列缺值才退回地區加總
+    per_date = _nansum_or_nan(v, axis=2)  # (D, M)
+    if excluded:
+        total_row = cube.values[:, :, np.argmax(is_total)]
+        per_date = np.where(np.isnan(total_row), per_date, total_row)
+
+    # 以 (指標, 日期 × 地區) 攤平後一次算出極值與排行
+    by_metric = v.transpose(1, 0, 2).reshape(n_metrics, -1)
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        cells = (~np.isnan(by_metric)).sum(axis=1)
+        totals = np.nansum(per_date, axis=0)
+        means = np.nanmean(by_metric, axis=1)
+        max_idx = np.where(np.isnan(by_metric), -np.inf, by_metric).argmax(axis=1)
+        min_idx = np.where(np.isnan(by_metric), np.inf, by_metric).argmin(axis=1)
+        district_totals = _nansum_or_nan(v, axis=0)  # (M, K)
+
+        first, last = per_date[0], per_date[-1]
+        growth = np.where(first != 0, (last - first) / first * 100, np.nan)
+        prev = per_date[-2] if n_dates >= 2 else np.full(n_metrics, np.nan)
+        yoy = np.where(prev != 0, (last - prev) / prev * 100, np.nan)
+        periods = max(n_dates - 1, 1)
+        cagr = np.where((first > 0) & (last > 0), ((last / first) ** (1 / periods) - 1) * 100, np.nan)
+        district_growth = np.where(v[0] != 0, (v[-1] - v[0]) / v[0] * 100, np.nan)  # (M, K)
+
+    slope = r_squared = None
+    if n_dates >= 3:
+        slope, _, r_squared = _linear_trend(per_date)
+
+    for j, metric in enumerate(cube.metrics):
+        if cells[j] == 0:
+            continue
+        row = by_metric[j]
+        max_d, max_k = divmod(int(max_idx[j]), n_districts)
+        min_d, min_k = divmod(int(min_idx[j]), n_districts)
+
+        ranked = np.flatnonzero(~np.isnan(district_totals[j]))
+        ranked = ranked[np.argsort(-district_totals[j][ranked], kind="stable")][:10]
+        valid = np.flatnonzero(~np.isnan(row))
+        top = valid[np.argsort(-row[valid], kind="stable")][:10]
+
+        fastest = None
+        if n_dates >= 2 and not np.isnan(district_growth[j]).all():
+            k = int(np.nanargmax(district_growth[j]))
+            fastest = (districts[k], float(district_growth[j][k]))
+
+        has_period = n_dates >= 2
+        analysis.metrics[metric] = MetricStats(
+            name=metric,
+            cells=int(cells[j]),
+            total=float(totals[j]),
+            mean=float(means[j]),
+            max_value=float(row[max_idx[j]]),
+            max_at=(districts[max_k], cube.dates[max_d]),
+            min_value=float(row[min_idx[j]]),
+            min_at=(districts[min_k], cube.dates[min_d]),
+            per_date=[float(x) for x in per_date[:, j]],
+            slope=None if slope is None else float(slope[j]),
+            r_squared=None if r_squared is None else float(r_squared[j]),
+            growth_pct=float(growth[j]) if has_period else None,
+            yoy_pct=float(yoy[j]) if has_period else None,
+            cagr_pct=float(cagr[j]) if has_period else None,
+            top_districts=[(districts[k], float(district_totals[j][k])) for k in ranked],
+            fastest_growing=fastest,
+            top10=[(districts[i % n_districts], cube.dates[i // n_districts], float(row[i])) for i in top],
+        )
+
+    # 指標間相關：以第一個指標的各期總計與其他指標比較
+    if n_metrics >= 2 and n_dates >= 3:
+        corr = _correlate_with(per_date[:, 0], per_date[:, 1:])
+        if not np.isnan(corr).all():
+            best = int(np.nanargmax(np.abs(corr)))
+            analysis.correlation = (cube.metrics[0], cube.metrics[best + 1], float(corr[best]))
+    return analysis
+
+
+# --- Dashboard Payload ---
+# dashboard 不再注入原始資料列，而是注入預先彙整好的欄式 (columnar) 資料：
+# 日期 / 指標 / 地區 / 地點以字典編碼 (整數索引)，資料列依指標分組 (metricOffsets)，
+# 並附上各指標的總計 / 平均 / 排行與 (地區 × 年) 數值矩陣，script.js 直接取用即可。
+
+DASHBOARD_FORMAT = "columnar-v1"
+DASHBOARD_TOP_N = 10
+
+
+def _json_values(values: np.ndarray) -> List[Any]:
+    """NaN -> null，整數值輸出為整數 (縮小 JSON)。"""
+    return [None if np.isnan(v) else (int(v) if float(v).is_integer() else float(v)) for v in values.tolist()]
+
+
+def build_dashboard_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    rows = payload.get("Data") or []
+    header = payload.get("Header") if isinstance(payload.get("Header"), dict) else {}
+    value_name = header.get("FValueHeaderName") or "數值"
+
+    df = pd.DataFrame(rows, columns=[DATE_FIELD, METRIC_FIELD, DISTRICT_FIELD, PLACE_FIELD, VALUE_FIELD])
+    text = {c: df[c].fillna("").astype(str) for c in (DATE_FIELD, METRIC_FIELD, DISTRICT_FIELD, PLACE_FIELD)}
+    year_codes, years = pd.factorize(text[DATE_FIELD], sort=True)
+    metric_codes, metrics = pd.factorize(text[METRIC_FIELD].replace("", value_name))
+    district_codes, districts = pd.factorize(text[DISTRICT_FIELD])
+    place_codes, places = pd.factorize(text[PLACE_FIELD])
+    values = pd.to_numeric(df[VALUE_FIELD], errors="coerce").to_numpy(dtype=float)
+    n_years, n_metrics, n_districts = len(years), len(metrics), len(districts)
+
+    # 資料列依指標分組 (保持原順序)，切換指標時只需取一段連續區間
+    order = np.argsort(metric_codes, kind="stable")
+    g_metric, g_values = metric_codes[order], values[order]
+    offsets = np.searchsorted(g_metric, np.arange(n_metrics + 1))
+
+    valid = ~np.isnan(g_values)
+    sums = np.bincount(g_metric[valid], weights=g_values[valid], minlength=n_metrics)
+    counts = np.bincount(g_metric[valid], minlength=n_metrics)
+    # 各指標內依數值由大到小排序 (缺值排最後)
+    ranked = np.lexsort((np.where(valid, -g_values, np.inf), g_metric))
+
+    # (指標, 地區, 年) 數值矩陣；同一格有多筆時取第一筆 (與原本 script.js 的 find 相同)
+    flat = (metric_codes * n_districts + district_codes) * n_years + year_codes
+    cells, first = np.unique(flat, return_index=True)
+    grid = np.full(n_metrics * n_districts * n_years, np.nan)
+    grid[cells] = values[first]
+    grid = grid.reshape(n_metrics, n_districts, n_years)
+
+    stats = []
+    for m in range(n_metrics):
+        top = ranked[offsets[m]:offsets[m] + min(DASHBOARD_TOP_N, int(counts[m]))]
+        stats.append({
+            "sum": _json_values(np.array([sums[m]]))[0],
+            "avg": float(sums[m] / counts[m]) if counts[m] else None,
+            "count": int(counts[m]),
+            "top": top.tolist(),
+        })
+
+    return {
+        "format": DASHBOARD_FORMAT,
+        "title": payload.get("EffectiveComplexName") or "",
+        "header": header,
+        "totalRecords": len(rows),
+        "years": [str(y) for y in years],
+        "metrics": [str(m) for m in metrics],
+        "districts": [str(d) for d in districts],
+        "places": [str(p) for p in places],
+        "metricOffsets": offsets.tolist(),
+        "columns": {
+            "year": year_codes[order].tolist(),
+            "district": district_codes[order].tolist(),
+            "place": place_codes[order].tolist(),
+            "value": _json_values(g_values),
+        },
+        "stats": stats,
+        "series": [[_json_values(grid[m, k]) for k in range(n_districts)] for m in range(n_metrics)],
+    }
+
+
+# --- Cross-Series Comparison ---
+# 將多組資料 (不同 sid) 依共同的 (日期, 地區) 鍵對齊成 (鍵 × 資料組) 矩陣，
+# 一次算出相關係數矩陣、時間落差相關與多元迴歸。
+
+COMPARE_MAX_LAG = 3
+_ROC_YEAR = re.compile(r"^(?:民國)?\s*(\d{2,3})\s*年?$")
+
+
+def normalize_period(label: Any) -> str:
+    """統一日期標籤，民國年 (例如 "112年"、"民國112年") 轉為西元年，使不同資料集能對齊。"""
+    text = str(label).strip()
+    m = _ROC_YEAR.match(text)
+    if m and int(m.group(1)) < 1911:
+        return str(int(m.group(1)) + 1911)
+    return text
+
+
+@dataclass
+class KeyedSeries:
+    name: str
+    values: pd.Series  # index = (日期, 地區)，地區為 "" 代表全市總計
+
+
+@dataclass
+class ComparisonResult:
+    names: List[str]
+    level: str  # "district" = 依 (日期, 地區) 對齊；"date" = 依各期總計對齊
+    key_count: int
+    correlation: np.ndarray
+    pair_counts: np.ndarray
+    lagged: Dict[str, Tuple[int, float]] = field(default_factory=dict)  # 名稱 -> (最佳落差期數, 相關係數)
+    coefficients: Dict[str, float] = field(default_factory=dict)
+    intercept: Optional[float] = None
+    r_squared: Optional[float] = None
+    regression_n: int = 0
+
+
+def series_from_cube(cube: LongFormatCube, name: str, metric: Optional[str] = None) -> KeyedSeries:
+    metric = metric or cube.metrics[0]
+    if metric not in cube.metrics:
+        raise ValueError(f"{name} 沒有指標 '{metric}' (可用: {', '.join(cube.metrics)})")
+    values = cube.values[:, cube.metrics.index(metric), :]
+    districts = ["" if d in TOTAL_LABELS else d for d in cube.districts]
+    index = pd.MultiIndex.from_product([[normalize_period(d) for d in cube.dates], districts])
+    series = pd.Series(values.reshape(-1), index=index).dropna()
+    return KeyedSeries(name=f"{name}:{metric}", values=series.groupby(level=[0, 1], sort=False).sum())
+
+
+def series_from_records(records: List[Dict[str, Any]], name: str, column: Optional[str] = None) -> KeyedSeries:
+    df = pd.DataFrame(records)
+    label_col = pick_label_column(df.columns.tolist())
+    values, numeric_cols = coerce_numeric(df, [c for c in df.columns if c != label_col])
+    column = column or (numeric_cols[0] if numeric_cols else None)
+    if column not in numeric_cols:
+        raise ValueError(f"{name} 沒有數值欄位 '{column}'")
+    labels = df[label_col].astype(str).str.strip()
+    if any(h in str(label_col) for h in TIME_HINTS):
+        keys = list(zip(labels.map(normalize_period), [""] * len(df)))
+    else:
+        # 標籤為地區時沒有日期，以空字串作為日期鍵
+        keys = [("", "" if v in TOTAL_LABELS else v) for v in labels]
+    series = pd.Series(values[column].to_numpy(dtype=float), index=pd.MultiIndex.from_tuples(keys)).dropna()
+    return KeyedSeries(name=f"{name}:{column}", values=series.groupby(level=[0, 1], sort=False).sum())
+
+
+def _date_totals(series: pd.Series) -> pd.Series:
+    """各期總計：有全市總計列時採用，否則加總各地區。"""
+    dates = series.index.get_level_values(0)
+    is_total = series.index.get_level_values(1) == ""
+    summed = series[~is_total].groupby(dates[~is_total]).sum()
+    totals = series[is_total].droplevel(1)
+    return totals.combine_first(summed).sort_index()
+
+
+def align_series(series_list: List[KeyedSeries], level: str = "auto") -> Tuple[str, pd.DataFrame]:
+    """以 outer join 對齊各資料組；auto 時若所有資料組有 2 個以上共同地區，依 (日期, 地區) 對齊。"""
+    if level == "auto":
+        common = None
+        for ks in series_list:
+            districts = set(ks.values.index.get_level_values(1)) - {""}
+            common = districts if common is None else common & districts
+        level = "district" if common and len(common) >= 2 else "date"
+    if level == "district":
+        columns = {ks.name: ks.values[ks.values.index.get_level_values(1) != ""] for ks in series_list}
+    else:
+        columns = {ks.name: _date_totals(ks.values) for ks in series_list}
+    return level, pd.concat(columns, axis=1).sort_index()
+
+
+def correlation_matrix(y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(n, k) 矩陣所有欄位兩兩的皮爾森相關 (pairwise complete，與 pandas corr 相同)，以矩陣乘法一次算完。"""
+    w = (~np.isnan(y)).astype(float)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        shift = np.nan_to_num(np.nanmean(y, axis=0))
+    yz = np.where(w > 0, y - shift, 0.0)
+    cnt = w.T @ w                 # cnt[i, j] = 兩欄皆有值的列數
+    sx = yz.T @ w                 # sx[i, j]  = 欄 i 在共同列上的總和
+    sxx = (yz * yz).T @ w
+    sxy = yz.T @ yz
+    var_i = cnt * sxx - sx ** 2
+    cov = cnt * sxy - sx * sx.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = np.where((var_i > 0) & (var_i.T > 0) & (cnt >= 3), cov / np.sqrt(var_i * var_i.T), np.nan)
+    np.fill_diagonal(corr, np.where(np.diag(cnt) >= 3, 1.0, np.nan))
+    return corr, cnt.astype(int)
+
+
+def _lagged_correlations(totals: np.ndarray, max_lag: int) -> List[Tuple[int, float]]:
+    """第一欄與其他欄在 -max_lag..max_lag 期落差下的相關；正落差代表其他欄領先第一欄。"""
+    target, others = totals[:, 0], totals[:, 1:]
+    n = totals.shape[0]
+    best = [(0, np.nan)] * others.shape[1]
+    # 由落差 0 往外找，相關係數相同時取落差較小者
+    for lag in sorted(range(-max_lag, max_lag + 1), key=abs):
+        if n - abs(lag) < 3:
+            continue
+        if lag >= 0:
+            t, o = target[lag:], others[:n - lag]
+        else:
+            t, o = target[:n + lag], others[-lag:]
+        corr = _correlate_with(t, o)
+        for j, r in enumerate(corr):
+            if not np.isnan(r) and (np.isnan(best[j][1]) or abs(r) > abs(best[j][1])):
+                best[j] = (lag, float(r))
+    return best
+
+
+def _joint_regression(y: np.ndarray):
+    """以第一欄為目標、其他欄為解釋變數做最小平方法迴歸，只使用所有欄皆有值的列。"""
+    complete = ~np.isnan(y).any(axis=1)
+    data = y[complete]
+    k = y.shape[1] - 1
+    if data.shape[0] < k + 2:
+        return None
+    x = np.column_stack([np.ones(data.shape[0]), data[:, 1:]])
+    coef, *_ = np.linalg.lstsq(x, data[:, 0], rcond=None)
+    residual = data[:, 0] - x @ coef
+    ss_tot = ((data[:, 0] - data[:, 0].mean()) ** 2).sum()
+    r_squared = 1 - (residual ** 2).sum() / ss_tot if ss_tot > 0 else 0.0
+    return coef, float(r_squared), int(data.shape[0])
+
+
+def compare_series(series_list: List[KeyedSeries], level: str = "auto", max_lag: int = COMPARE_MAX_LAG) -> ComparisonResult:
+    if len(series_list) < 2:
+        raise ValueError("至少需要 2 組資料才能比較")
+    level, aligned = align_series(series_list, level)
+    y = aligned.to_numpy(dtype=float)
+    names = aligned.columns.tolist()
+    corr, counts = correlation_matrix(y)
+    result = ComparisonResult(names=names, level=level, key_count=len(aligned), correlation=corr, pair_counts=counts)
+
+    # 時間落差相關一律使用各期總計 (依日期排序)
+    totals = pd.concat({ks.name: _date_totals(ks.values) for ks in series_list}, axis=1).sort_index().to_numpy(dtype=float)
+    for name, best in zip(names[1:], _lagged_correlations(totals, max_lag)):
+        if not np.isnan(best[1]):
+            result.lagged[name] = best
+
+    regression = _joint_regression(y)
+    if regression is not None:
+        coef, result.r_squared, result.regression_n = regression
+        result.intercept = float(coef[0])
+        result.coefficients = {name: float(c) for name, c in zip(names[1:], coef[1:])}
+    return result
+
+
+def render_comparison(result: ComparisonResult, begin: Optional[str], end: Optional[str], errors: Dict[str, str] = None) -> str:
+    level_desc = "日期 × 地區" if result.level == "district" else "各期總計 (依日期)"
+    labels = [f"S{i + 1}" for i in range(len(result.names))]
+    legend = "\n".join(f"- {label}: {name}" for label, name in zip(labels, result.names))
+    matrix = ["| | " + " | ".join(labels) + " |", "|---" * (len(labels) + 1) + "|"]
+    for label, row in zip(labels, result.correlation):
+        matrix.append(f"| {label} | " + " | ".join("-" if np.isnan(r) else f"{r:.3f}" for r in row) + " |")
+
+    target = result.names[0]
+    lag_lines = []
+    for name, (lag, r) in result.lagged.items():
+        if lag == 0:
+            desc = "同期"
+        elif lag > 0:
+            desc = f"領先 {lag} 期"
+        else:
+            desc = f"落後 {-lag} 期"
+        lag_lines.append(f"- {name}：{desc}時相關最強 (r = {r:.4f})")
+
+    if result.r_squared is not None:
+        terms = " ".join(f"{'+' if c >= 0 else '-'} {abs(c):.4f} × [{name}]" for name, c in result.coefficients.items())
+        regression = (
+            f"- 模型: [{target}] = {result.intercept:.4f} {terms}\n"
+            f"- 決定係數 (R-squared): {result.r_squared:.4f}，使用 {result.regression_n} 筆完整資料"
+        )
+    else:
+        regression = "- 共同資料筆數不足，無法進行多元迴歸。"
+
+    error_lines = ""
+    if errors:
+        error_lines = "\n\n**5. 無法納入比較的資料**\n" + "\n".join(f"- {k}: {v}" for k, v in errors.items())
+
+    return f"""
+### 跨資料集比較 (Cross-Series Comparison)
+
+**1. 基本資訊 (Basic Info)**
+- 時間範圍: {begin} ~ {end}
+- 對齊方式: {level_desc}，共 {result.key_count} 個鍵
+{legend}
+
+**2. 相關係數矩陣 (Correlation Matrix)**
+{chr(10).join(matrix)}
+
+**3. 時間落差相關 (Lagged Correlation，以 '{target}' 為基準)**
+{chr(10).join(lag_lines) if lag_lines else "- 期數不足，無法計算落差相關。"}
+
+**4. 多元迴歸 (Joint Regression)**
+{regression}{error_lines}
+    """
+
+
+def _fmt(value: float) -> str:
+    if value is None or np.isnan(value):
+        return "-"
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def _pct(value: Optional[float]) -> str:
+    return "-" if value is None or np.isnan(value) else f"{value:.2f}%"
+
+
+def render_report(result: AnalysisResult, tid: str, cid: str, sid: str, begin: Optional[str], end: Optional[str], data: List[Any]) -> str:
+    section_2_info = ""
+    section_3_info = ""
+    section_4_info = ""
+    target_col = result.target_col
+
+    if target_col:
+        s = result.series[target_col]
+        total_msg = "(已自動排除「桃園市」總計列)" if result.total_row_excluded else ""
+        growth_txt = ""
+        if s.growth_pct is not None and not np.isnan(s.growth_pct):
+            growth_txt = f"本期間總體成長率為 {s.growth_pct:.2f}%"
+
+        lines = [
+            f"- 資料總筆數: {result.total_count} 筆 {total_msg}",
+            f"- 分析主體欄位: {target_col}",
+            f"- 數值總計: {s.total:,.0f}",
+            f"- 平均水準: {s.mean:,.2f}",
+            f"- 極值: 最高為 {s.max_label} ({_fmt(s.max_value)})，最低為 {s.min_label} ({_fmt(s.min_value)})",
+        ]
+        if growth_txt:
+            lines.append(f"- {growth_txt}")
+        if len(result.numeric_cols) > 1:
+            lines.append("- 各數值欄位摘要 (平均 / 斜率 / R² / 年增率 / CAGR):")
+            for col in result.numeric_cols:
+                c = result.series[col]
+                slope_txt = "-" if c.slope is None else f"{c.slope:.4f}"
+                r2_txt = "-" if c.r_squared is None else f"{c.r_squared:.4f}"
+                lines.append(f"   - {col}: {c.mean:,.2f} / {slope_txt} / {r2_txt} / {_pct(c.yoy_pct)} / {_pct(c.cagr_pct)}")
+        section_2_info = "\n".join(lines)
+
+        if s.slope is not None and not np.isnan(s.slope):
+            trend_desc = "呈現上升趨勢" if s.slope > 0 else "呈現下降趨勢"
+            section_3_info += f"""
+1. 趨勢檢定 (Trend Analysis)：
+   - 統計方法：採用簡單線性迴歸模型 (Simple Linear Regression)。
+   - 分析結果：迴歸斜率 (Slope) 為 {s.slope:.4f}，決定係數 (R-squared) 為 {s.r_squared:.4f}。
+   - 解讀：數據整體{trend_desc} (R平方值越接近1代表趨勢越明顯)。
+"""
+        if result.correlation:
+            best_corr_col, best_corr_val = result.correlation
+            section_3_info += f"""
+2. 相關係數分析 (Correlation Analysis)：
+   - 統計方法：採用皮爾森積動差相關係數。
+   - 分析結果：'{target_col}' 與 '{best_corr_col}' 之相關係數為 {best_corr_val:.4f}。
+"""
+
+        top10_str = "\n".join(f"   - 第{i + 1}名: {label} (數值: {_fmt(value)})" for i, (label, value) in enumerate(result.top10))
+        section_4_info = f"數值最高的熱點區域/時間 (前10名):\n{top10_str}"
+
+    return _render_summary(tid, cid, sid, begin, end, result.total_count, section_2_info, section_3_info, section_4_info, data)
+
+
+def render_cube_report(analysis: CubeAnalysis, tid: str, cid: str, sid: str, begin: Optional[str], end: Optional[str], payload: Dict[str, Any]) -> str:
+    cube = analysis.cube
+    rows = payload.get("Data") or []
+    district_name = cube.header.get("ComplexHeaderName2") or "地區/細項"
+    total_msg = "(已自動排除「桃園市」總計列)" if analysis.total_row_excluded else ""
+    n_dates, n_metrics, _ = cube.shape
+    n_districts = analysis.district_count
+    period = f"{cube.dates[0]} ~ {cube.dates[-1]}" if cube.dates else "-"
+
+    lines = [
+        f"- 資料名稱: {cube.title}",
+        f"- 資料總筆數: {cube.row_count} 筆 {total_msg}",
+        f"- 資料維度: {n_dates} 期 × {n_metrics} 個指標 × {n_districts} 個{district_name}",
+        f"- 資料期間: {period}",
+    ]
+    section_3 = []
+    shown = list(analysis.metrics.values())[:REPORT_METRIC_LIMIT]
+    for m in shown:
+        lines.append(
+            f"- {m.name}: 總計 {m.total:,.0f}，平均 {m.mean:,.2f}，"
+            f"最高 {m.max_at[0]} ({m.max_at[1]}) {_fmt(m.max_value)}，最低 {m.min_at[0]} ({m.min_at[1]}) {_fmt(m.min_value)}"
+        )
+        if m.growth_pct is not None:
+            lines.append(f"   - 成長率 {_pct(m.growth_pct)} / 年增率 {_pct(m.yoy_pct)} / CAGR {_pct(m.cagr_pct)}")
+        if m.slope is not None and not np.isnan(m.slope):
+            trend_desc = "上升" if m.slope > 0 else "下降"
+            section_3.append(f"   - {m.name}: 斜率 {m.slope:.4f}，R² {m.r_squared:.4f}，整體呈現{trend_desc}趨勢")
+        if m.fastest_growing:
+            section_3.append(f"   - {m.name}: 成長最快的{district_name}為 {m.fastest_growing[0]} ({_pct(m.fastest_growing[1])})")
+    if len(analysis.metrics) > len(shown):
+        lines.append(f"- (其餘 {len(analysis.metrics) - len(shown)} 個指標省略)")
+
+    section_3_info = ""
+    if section_3:
+        section_3_info = "1. 各指標趨勢 (Trend Analysis，以各期總計做簡單線性迴歸)：\n" + "\n".join(section_3)
+    if analysis.correlation:
+        a, b, r = analysis.correlation
+        section_3_info += f"\n2. 指標相關 (Correlation Analysis)：'{a}' 與 '{b}' 各期總計之皮爾森相關係數為 {r:.4f}。"
+
+    section_4_info = ""
+    if shown:
+        m = shown[0]
+        top10_str = "\n".join(
+            f"   - 第{i + 1}名: {district} ({date}) (數值: {_fmt(value)})" for i, (district, date, value) in enumerate(m.top10)
+        )
+        district_str = "、".join(f"{d} ({_fmt(v)})" for d, v in m.top_districts[:5])
+        section_4_info = f"'{m.name}' 數值最高的{district_name}/時間 (前10名):\n{top10_str}"
+        if district_str:
+            section_4_info += f"\n- 累計最高的{district_name}: {district_str}"
+
+    return _render_summary(tid, cid, sid, begin, end, cube.row_count, "\n".join(lines), section_3_info, section_4_info, rows)
+
+
+def _render_summary(tid, cid, sid, begin, end, total_count, section_2_info, section_3_info, section_4_info, data) -> str:
+    data_sample = data[:5] if len(data) > 5 else data
+    data_sample_str = json.dumps(data_sample, ensure_ascii=False)
+
+    return f"""
+### 數據統計摘要 (Statistical Summary)
+
+**1. 基本資訊 (Basic Info)**
+- 資料來源: {tid}-{cid}-{sid}
+- 時間範圍: {begin} ~ {end}
+- 總筆數: {total_count}
+
+**2. 現況描述 (Descriptive Stats)**
+- 分析主體: {section_2_info.strip()}
+
+**3. 統計檢定 (Statistical Analysis)**
+{section_3_info.strip() if section_3_info else "- 無足夠數據進行趨勢/相關性分析。"}
+
+**4. 熱點排行 (Top 10 Hotspots)**
+{section_4_info.strip()}
+
+**5. 原始資料範例 (Sample Data - Top 5)**
+{data_sample_str}
+    """
+
+
+def render_error_report(tid, cid, sid, begin, end, data, error: Exception) -> str:
+    return _render_summary(tid, cid, sid, begin, end, len(data), f"計算錯誤: {str(error)}", "", "", data)
@@ -0,0 +1,108 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# 分析引擎基準測試
+# 比較舊版 _analyze_statistics_report_internal (逐欄 to_numeric、只分析第一個數值欄位)
+# 與 analysis_engine (一次向量化計算所有數值欄位) 在寬表上的耗時。
+# 用法: python benchmarks/bench_analysis.py [列數] [欄數]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analysis_engine
+
+
+def legacy_analyze(data):
+    """舊版分析流程 (計算部分)，保留作為比較基準。"""
+    df_temp = pd.DataFrame(data)
+    cols = df_temp.columns.tolist()
+    label_col = next((c for c in cols if '年' in c or '月' in c or '別' in c or '名稱' in c or '區' in c), cols[0])
+
+    numeric_cols = []
+    for c in cols:
+        if c == label_col: continue
+        try:
+            df_temp[c] = pd.to_numeric(df_temp[c])
+            numeric_cols.append(c)
+        except: pass
+
+    target_col = numeric_cols[0]
+    is_total = df_temp[label_col].astype(str).str.strip() == '桃園市'
+    df_calc = df_temp[~is_total].copy() if is_total.any() else df_temp.copy()
+
+    mean_val = df_calc[target_col].mean()
+    max_row = df_calc.loc[df_calc[target_col].idxmax()]
+    min_row = df_calc.loc[df_calc[target_col].idxmin()]
+
+    x = np.arange(len(df_calc))
+    y = df_calc[target_col].values
+    slope, intercept = np.polyfit(x, y, 1)
+    p = np.poly1d([slope, intercept])
+    yhat = p(x)
+    ybar = np.sum(y)/len(y)
+    ssreg = np.sum((yhat-ybar)**2)
+    sstot = np.sum((y - ybar)**2)
+    r_squared = ssreg / sstot if sstot != 0 else 0
+
+    corr_matrix = df_calc[numeric_cols].corr(method='pearson')
+    corr_target = corr_matrix[target_col].drop(target_col)
+    best_corr_col = corr_target.abs().idxmax()
+
+    top10 = df_calc.nlargest(10, target_col)
+    top10_str = "\n".join([f"   - 第{i+1}名: {row[label_col]} (數值: {row[target_col]})" for i, row in top10.iterrows()])
+    return {"mean": mean_val, "slope": slope, "r_squared": r_squared, "best_corr": best_corr_col,
+            "max_label": max_row[label_col], "min_label": min_row[label_col], "top10": top10_str}
+
+
+def make_table(rows, cols, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(1000, 200, size=(rows, cols)) + np.arange(rows)[:, None] * rng.uniform(-1, 1, cols)
+    records = []
+    for i in range(rows):
+        row = {"年別": str(1900 + i)}
+        row.update({f"指標{j}": round(float(values[i, j]), 2) for j in range(cols)})
+        row["備註"] = "-"
+        records.append(row)
+    return records
+
+
+def timed(fn, data, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    cols = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    data = make_table(rows, cols)
+
+    legacy_time, legacy = timed(legacy_analyze, data, 3)
+    engine_time, result = timed(analysis_engine.analyze_records, data, 3)
+
+    # 對第一個數值欄位確認兩者結果一致
+    target = result.series[result.target_col]
+    assert np.isclose(target.mean, legacy["mean"])
+    assert np.isclose(target.slope, legacy["slope"])
+    assert np.isclose(target.r_squared, legacy["r_squared"])
+    assert result.correlation[0] == legacy["best_corr"]
+
+    print(json.dumps({
+        "rows": rows,
+        "numeric_columns": cols,
+        "legacy_s (first column only)": round(legacy_time, 4),
+        "engine_s (all columns)": round(engine_time, 4),
+        "legacy_per_series_ms": round(legacy_time * 1000, 3),
+        "engine_per_series_ms": round(engine_time * 1000 / cols, 3),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+# 壓力測試 (load test)
+# 啟動本機的上游替身 (fake_upstream.py) 與 server.py (api / mcp 模式)，對各路由 / MCP 工具
+# 發送請求，回報 p50 / p95 / p99 延遲、吞吐量與 Server 的峰值記憶體 (RSS)。
+# 結果存成 JSON (預設 benchmarks/results/)，--baseline 可與上一次的結果比較。
+# 名稱以 _cold 結尾的情境量測第一次 (需向上游抓取) 的延遲；其餘情境在計時前先把每種請求各送一次 (不計時)，
+# 量測的是資料已在快取中的穩定狀態。
+# 用法: python benchmarks/bench_load.py [--requests 200] [--concurrency 16] [--latency 200] [--baseline 舊結果.json]
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+SERVER = os.path.join(BASE_DIR, "server.py")
+FAKE_UPSTREAM = os.path.join(BENCH_DIR, "fake_upstream.py")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+API_PORT = int(os.environ.get("BENCH_API_PORT", "8765"))
+UPSTREAM_PORT = int(os.environ.get("BENCH_UPSTREAM_PORT", "8766"))
+STARTUP_TIMEOUT = 60
+
+KEYWORD = "人口"
+PERIOD = {"begin": "2015", "end": "2024"}
+WARM_SERIES = 5       # 熱門資料的組數 (重複請求，應由快取回答)
+
+
+def _series(i):
+    return {"tid": "0001", "cid": "0001", "sid": f"{i:06d}"}
+
+
+def is_cold(name):
+    return name.endswith("_cold")
+
+
+def distinct(items):
+    """每種請求各取一個 (依出現順序)，用於計時前的預熱。"""
+    seen = {}
+    for item in items:
+        seen.setdefault(json.dumps(item, sort_keys=True, ensure_ascii=False), item)
+    return list(seen.values())
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 2)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1] if values else None),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def peak_rss_mb(pid):
+    """讀取 /proc/<pid>/status 的 VmHWM (Linux)；其他平台回傳 None。"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _wait_http(url, proc):
+    start = time.perf_counter()
+    while True:
+        if proc.poll() is not None:
+            raise RuntimeError(f"process exited before {url} became ready")
+        if time.perf_counter() - start > STARTUP_TIMEOUT:
+            raise RuntimeError(f"{url} did not respond in time")
+        try:
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                resp.read()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def _stop(proc):
+    proc.kill()
+    proc.wait()
+
+
+# --- API 模式 ---
+
+async def _drive(client, requests_, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(method, path, params, body):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params, json=body)
+                await response.aread()
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(*r) for r in requests_])
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def api_scenarios(n):
+    warm = [_series(i % WARM_SERIES + 1) for i in range(n)]
+    batch = [f"0001-0001-{i + 1:06d}" for i in range(10)]
+    return {
+        "search_statistics": [("GET", "/search_statistics", {"keyword": KEYWORD}, None)] * n,
+        # 每個請求都是不同的項目，全部需要向上游抓取
+        "get_statistics_data_cold": [("GET", "/get_statistics_data", {**_series(1000 + i), **PERIOD}, None) for i in range(n)],
+        "get_statistics_data_warm": [("GET", "/get_statistics_data", {**s, **PERIOD}, None) for s in warm],
+        "analyze_statistics_report": [("GET", "/analyze_statistics_report", {**s, **PERIOD}, None) for s in warm],
+        "dashboard": [("GET", "/dashboard", {**s, **PERIOD}, None) for s in warm],
+        "analyze_statistics_batch": [("POST", "/analyze_statistics_batch", None, {"series": batch, **PERIOD})] * max(1, n // 10),
+    }
+
+
+def bench_api(env, n, concurrency):
+    import httpx
+
+    proc = subprocess.Popen([sys.executable, SERVER, "api"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=BASE_DIR, env=dict(env, PORT=str(API_PORT)))
+    try:
+        base = f"http://127.0.0.1:{API_PORT}"
+        _wait_http(f"{base}/", proc)
+
+        async def run():
+            results = {}
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            async with httpx.AsyncClient(base_url=base, timeout=120, limits=limits) as client:
+                for name, requests_ in api_scenarios(n).items():
+                    if not is_cold(name):
+                        warm_up = await _drive(client, distinct(requests_), concurrency)
+                        if warm_up["errors"]:
+                            print(f"  api {name}: 預熱時有 {warm_up['errors']} 個請求失敗", file=sys.stderr)
+                    results[name] = await _drive(client, requests_, concurrency)
+                    print(f"  api {name}: {results[name]}", file=sys.stderr)
+            return results
+
+        results = asyncio.run(run())
+        results["peak_rss_mb"] = peak_rss_mb(proc.pid)
+        return results
+    finally:
+        _stop(proc)
+
+
+# --- MCP 模式 (stdio JSON-RPC，依序呼叫) ---
+
+class _McpSession:
+    def __init__(self, env):
+        self.proc = subprocess.Popen(
+            [sys.executable, SERVER, "mcp"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding="utf-8", cwd=BASE_DIR, env=env,
+        )
+        self.next_id = 0
+
+    def request(self, method, params=None):
+        self.next_id += 1
+        self.send({"jsonrpc": "2.0", "id": self.next_id, "method": method, "params": params or {}})
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                raise RuntimeError("MCP server exited before responding")
+            message = json.loads(line)
+            if message.get("id") == self.next_id:
+                return message
+
+    def send(self, message):
+        self.proc.stdin.write(json.dumps(message) + "\n")
+        self.proc.stdin.flush()
+
+
+def mcp_scenarios(n):
+    warm = [_series(i % WARM_SERIES + 1) for i in range(n)]
+    return {
+        "search_statistics": [{"keyword": KEYWORD}] * n,
+        "get_statistics_data_cold": [{**_series(2000 + i), **PERIOD} for i in range(n)],
+        "get_statistics_data_warm": [{**s, **PERIOD} for s in warm],
+        "analyze_statistics_report": [{**s, **PERIOD} for s in warm],
+    }
+
+
+def bench_mcp(env, n):
+    session = _McpSession(env)
+    try:
+        session.request("initialize", {"protocolVersion": "2024-11-05", "capabilities": {}, "clientInfo": {"name": "bench", "version": "0"}})
+        session.send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+        results = {}
+        for name, calls in mcp_scenarios(n).items():
+            tool = name.removesuffix("_cold").removesuffix("_warm")
+            if not is_cold(name):
+                for arguments in distinct(calls):
+                    session.request("tools/call", {"name": tool, "arguments": arguments})
+            latencies, errors = [], 0
+            start = time.perf_counter()
+            for arguments in calls:
+                t = time.perf_counter()
+                message = session.request("tools/call", {"name": tool, "arguments": arguments})
+                if "error" in message or message.get("result", {}).get("isError"):
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - t)
+            results[name] = summarize(latencies, errors, time.perf_counter() - start)
+            print(f"  mcp {name}: {results[name]}", file=sys.stderr)
+        results["peak_rss_mb"] = peak_rss_mb(session.proc.pid)
+        return results
+    finally:
+        _stop(session.proc)
+
+
+# --- 報告 ---
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """列出與 baseline 相比的 p50 / p95 / 吞吐量變化 (百分比)。"""
+    lines = []
+    for mode in ("api", "mcp"):
+        for name, current in report.get(mode, {}).items():
+            previous = baseline.get(mode, {}).get(name)
+            if not isinstance(current, dict) or not isinstance(previous, dict):
+                continue
+            deltas = []
+            for key in ("p50_ms", "p95_ms", "throughput_rps"):
+                if current.get(key) and previous.get(key):
+                    deltas.append(f"{key} {previous[key]} -> {current[key]} ({(current[key] / previous[key] - 1) * 100:+.1f}%)")
+            lines.append(f"{mode} {name}: " + ", ".join(deltas))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="對 api / mcp 模式做壓力測試 (使用本機上游替身)")
+    parser.add_argument("--requests", type=int, default=200, help="每個情境的請求數 (MCP 為 1/4)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=200.0, help="上游替身的平均延遲 (ms)")
+    parser.add_argument("--jitter", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rows", type=int, default=500, help="上游替身每次回傳的筆數")
+    parser.add_argument("--records", default=None, help="上游替身的錄製檔目錄")
+    parser.add_argument("--modes", default="api,mcp")
+    parser.add_argument("--out", default=None, help="結果 JSON 路徑 (預設 benchmarks/results/load-<時間>.json)")
+    parser.add_argument("--baseline", default=None, help="與先前的結果 JSON 比較")
+    args = parser.parse_args()
+
+    upstream_cmd = [sys.executable, FAKE_UPSTREAM, "--port", str(UPSTREAM_PORT), "--latency", str(args.latency),
+                    "--jitter", str(args.jitter), "--error-rate", str(args.error_rate), "--rows", str(args.rows)]
+    if args.records:
+        upstream_cmd += ["--records", args.records]
+    upstream = subprocess.Popen(upstream_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    report = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "config": {k: getattr(args, k) for k in ("requests", "concurrency", "latency", "jitter", "error_rate", "rows", "records")},
+    }
+    try:
+        _wait_http(f"http://127.0.0.1:{UPSTREAM_PORT}/__stats", upstream)
+        for mode in args.modes.split(","):
+            # 每個模式使用全新的快取，冷資料的情境才會真的打到上游
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(
+                    os.environ,
+                    TAOYUAN_UPSTREAM_URL=f"http://127.0.0.1:{UPSTREAM_PORT}/GetStaticData.aspx",
+                    TAOYUAN_CACHE_PATH=os.path.join(tmp, "cache.sqlite3"),
+                    TAOYUAN_DASHBOARD_DIR=os.path.join(tmp, "dashboards"),
+                    TAOYUAN_PREFETCH="0",
+                )
+                if mode == "api":
+                    report["api"] = bench_api(env, args.requests, args.concurrency)
+                elif mode == "mcp":
+                    report["mcp"] = bench_mcp(env, max(1, args.requests // 4))
+        with urllib.request.urlopen(f"http://127.0.0.1:{UPSTREAM_PORT}/__stats", timeout=5) as resp:
+            report["upstream"] = json.loads(resp.read())
+    finally:
+        _stop(upstream)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"結果已儲存至: {out}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            for line in compare(report, json.load(f)):
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
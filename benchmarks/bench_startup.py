@@ -0,0 +1,110 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+# 啟動時間基準測試
+# 分別量測 mcp / api 兩種模式從「啟動 process」到「第一個工具回應」所需時間。
+# 用法: python benchmarks/bench_startup.py [次數]
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(BASE_DIR, "server.py")
+KEYWORD = "人口"
+API_PORT = int(os.environ.get("BENCH_API_PORT", "8765"))
+STARTUP_TIMEOUT = 60
+
+
+def _rpc(proc, message):
+    proc.stdin.write(json.dumps(message) + "\n")
+    proc.stdin.flush()
+
+
+def _read_response(proc, request_id):
+    while True:
+        line = proc.stdout.readline()
+        if not line:
+            raise RuntimeError("MCP server exited before responding")
+        message = json.loads(line)
+        if message.get("id") == request_id:
+            return message
+
+
+def bench_mcp():
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, "mcp"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        text=True, encoding="utf-8", cwd=BASE_DIR,
+    )
+    try:
+        _rpc(proc, {
+            "jsonrpc": "2.0", "id": 1, "method": "initialize",
+            "params": {"protocolVersion": "2024-11-05", "capabilities": {}, "clientInfo": {"name": "bench", "version": "0"}},
+        })
+        _read_response(proc, 1)
+        handshake = time.perf_counter() - start
+        _rpc(proc, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+        _rpc(proc, {
+            "jsonrpc": "2.0", "id": 2, "method": "tools/call",
+            "params": {"name": "search_statistics", "arguments": {"keyword": KEYWORD}},
+        })
+        _read_response(proc, 2)
+        first_tool = time.perf_counter() - start
+    finally:
+        proc.kill()
+        proc.wait()
+    return {"handshake_s": handshake, "first_tool_response_s": first_tool}
+
+
+def bench_api():
+    url = f"http://127.0.0.1:{API_PORT}/search_statistics?" + urllib.parse.urlencode({"keyword": KEYWORD})
+    env = dict(os.environ, PORT=str(API_PORT))
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, "api"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=BASE_DIR, env=env,
+    )
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError("API server exited before responding")
+            if time.perf_counter() - start > STARTUP_TIMEOUT:
+                raise RuntimeError("API server did not respond in time")
+            try:
+                with urllib.request.urlopen(url, timeout=5) as resp:
+                    resp.read()
+                break
+            except OSError:
+                time.sleep(0.01)
+        first_tool = time.perf_counter() - start
+    finally:
+        proc.kill()
+        proc.wait()
+    return {"first_tool_response_s": first_tool}
+
+
+def _summary(samples):
+    result = {}
+    for key in samples[0]:
+        values = [s[key] for s in samples]
+        result[key] = {"median": round(statistics.median(values), 4), "min": round(min(values), 4), "max": round(max(values), 4)}
+    return result
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    report = {"runs": runs}
+    for mode, fn in (("mcp", bench_mcp), ("api", bench_api)):
+        try:
+            report[mode] = _summary([fn() for _ in range(runs)])
+        except Exception as e:
+            report[mode] = {"error": str(e)}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
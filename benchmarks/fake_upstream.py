@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 桃園市統計 API (GetStaticData.aspx) 的本機替身，供壓測與離線開發使用。
+# - 回放：--records 目錄中的 {tid}-{cid}-{sid}.json (完整期間)，依 begin / end 切片後回傳
+# - 錄製：加上 --record 時，沒有錄製檔的項目會向真正的上游抓取並存檔
+# - 其他項目產生固定種子的合成長表資料，筆數由 --rows 控制
+# 延遲 / 抖動 / 錯誤率皆可設定；GET /__stats 回傳請求統計。
+# 用法: python benchmarks/fake_upstream.py [--port 8766] [--latency 200] [--jitter 50] [--error-rate 0.01]
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from offline_mirror import row_year
+
+REAL_UPSTREAM_URL = "https://statisticsinfo.tycg.gov.tw/TaoyuanSTYB/RestfulAPI/GetStaticData.aspx"
+DEFAULT_PORT = int(os.environ.get("BENCH_UPSTREAM_PORT", "8766"))
+RECORD_BEGIN = "1990"
+
+METRICS = ("人口數", "戶數", "出生數", "死亡數", "遷入數", "遷出數")
+DISTRICTS = ("桃園區", "中壢區", "平鎮區", "八德區", "楊梅區", "蘆竹區", "大溪區", "龜山區", "大園區", "觀音區", "新屋區", "復興區", "龍潭區")
+
+
+class FakeUpstreamConfig:
+    def __init__(self, latency_ms=200.0, jitter_ms=50.0, error_rate=0.0, rows=500, records_dir=None, record=False, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rows = rows
+        self.records_dir = records_dir
+        self.record = record
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "replayed": 0, "recorded": 0, "synthetic": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self.random.random() < self.error_rate
+        return max(0.0, self.latency_ms + jitter) / 1000, fail
+
+
+def synthetic_payload(tid, cid, sid, begin, end, rows):
+    """長表格式的合成資料：依 rows 決定指標 / 地區數，數值由 (tid, cid, sid) 決定，每次回傳相同內容。"""
+    years = list(range(row_year(begin) or 2020, (row_year(end) or 2024) + 1)) or [2024]
+    per_year = max(1, rows // len(years))
+    metrics = max(1, min(len(METRICS), per_year // (len(DISTRICTS) + 1)))
+    rng = random.Random(f"{tid}-{cid}-{sid}")
+    base = [rng.uniform(1000, 50000) for _ in range(metrics * len(DISTRICTS))]
+    data = []
+    for i, year in enumerate(years):
+        for m in range(metrics):
+            values = [round(base[m * len(DISTRICTS) + d] * (1 + 0.02 * i), 0) for d in range(len(DISTRICTS))]
+            for d, district in enumerate(DISTRICTS):
+                data.append({"DataDate": str(year), "PlaceName": "", "ComplexName1": METRICS[m], "ComplexName2": district, "FValue": str(values[d])})
+            data.append({"DataDate": str(year), "PlaceName": "", "ComplexName1": METRICS[m], "ComplexName2": "桃園市", "FValue": str(sum(values))})
+    return {"Header": {"Title": f"合成資料 {tid}-{cid}-{sid}"}, "Data": data}
+
+
+def slice_payload(payload, begin, end):
+    lo, hi = row_year(begin), row_year(end)
+    if lo is None or hi is None or not isinstance(payload, dict) or not isinstance(payload.get("Data"), list):
+        return payload
+    rows = [r for r in payload["Data"] if (row_year(r.get("DataDate")) or lo) in range(lo, hi + 1)]
+    return {**payload, "Data": rows}
+
+
+def _record(config, path, params):
+    import requests
+
+    query = {**params, "begin": RECORD_BEGIN, "end": str(time.localtime().tm_year), "type": "JSON"}
+    response = requests.get(REAL_UPSTREAM_URL, params=query, timeout=30, verify=False)
+    text = response.text.strip()
+    if response.status_code != 200 or not text:
+        return None
+    payload = json.loads(text)
+    os.makedirs(config.records_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    config.count("recorded")
+    return payload
+
+
+def _load_payload(config, tid, cid, sid, begin, end):
+    if config.records_dir:
+        path = os.path.join(config.records_dir, f"{tid}-{cid}-{sid}.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            config.count("replayed")
+            return slice_payload(payload, begin, end)
+        if config.record:
+            payload = _record(config, path, {"tid": tid, "cid": cid, "sid": sid})
+            if payload is not None:
+                return slice_payload(payload, begin, end)
+    config.count("synthetic")
+    return synthetic_payload(tid, cid, sid, begin, end, config.rows)
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, body, content_type="application/json; charset=utf-8"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/__stats":
+                with config.lock:
+                    self._send(200, json.dumps(config.stats).encode("utf-8"))
+                return
+            config.count("requests")
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            wait, fail = config.delay()
+            time.sleep(wait)
+            if fail:
+                config.count("errors")
+                self._send(500, b"Internal Server Error", "text/plain")
+                return
+            ids = [query.get(k, "") for k in ("tid", "cid", "sid")]
+            if not all(ids):
+                self._send(200, b"")
+                return
+            payload = _load_payload(config, *ids, query.get("begin", "2020"), query.get("end", "2024"))
+            self._send(200, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start(port=DEFAULT_PORT, config=None):
+    """在背景 thread 啟動替身 Server (測試 / 同一 process 內使用)，回傳 ThreadingHTTPServer。"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config or FakeUpstreamConfig()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-upstream", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="桃園市統計 API 的本機替身")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=200.0, help="平均延遲 (ms)")
+    parser.add_argument("--jitter", type=float, default=50.0, help="延遲抖動 ± (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回傳 HTTP 500 的機率 (0~1)")
+    parser.add_argument("--rows", type=int, default=500, help="合成資料的筆數")
+    parser.add_argument("--records", default=None, help="錄製檔目錄 ({tid}-{cid}-{sid}.json)")
+    parser.add_argument("--record", action="store_true", help="沒有錄製檔的項目向真正的上游抓取並存檔")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = FakeUpstreamConfig(args.latency, args.jitter, args.error_rate, args.rows, args.records, args.record, args.seed)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(config))
+    server.daemon_threads = True
+    print(f"Fake upstream listening on http://127.0.0.1:{args.port}/ (latency {args.latency}±{args.jitter} ms, error rate {args.error_rate})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
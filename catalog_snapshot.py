@@ -0,0 +1,107 @@
+import os
+import pickle
+import sys
+import tempfile
+
+from search_index import NgramIndex
+
+# 統計目錄的二進位快照
+# 由爬蟲 (或手動執行本檔) 產生，內容為已補零的 tid/cid/sid 紀錄與預先建好的搜尋索引。
+# 快照只保存內建型別 (各欄位的 list 與 posting list)，不含 NgramIndex 物件本身，
+# 索引類別調整後舊快照仍可讀取；格式變更時調高 SNAPSHOT_VERSION 即可讓舊快照失效。
+# Server 啟動時直接讀取快照，完全不需要 pandas；只有在快照不存在或比 CSV 舊時才退回解析 CSV。
+
+SNAPSHOT_VERSION = 2
+SNAPSHOT_SUFFIX = ".snapshot.pkl"
+
+ID_WIDTHS = {"tid": 4, "cid": 4, "sid": 6}
+
+
+def snapshot_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + SNAPSHOT_SUFFIX
+
+
+def normalize_ids(df):
+    """統一 tid / cid / sid 欄位為補零字串 (例如 1 -> 0001)。"""
+    for col, width in ID_WIDTHS.items():
+        df[col] = df[col].astype(str).str.zfill(width)
+    return df
+
+
+def _source_signature(csv_path: str):
+    st = os.stat(csv_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_csv_records(csv_path: str):
+    import pandas as pd
+
+    df = normalize_ids(pd.read_csv(csv_path))
+    return df.to_dict(orient="records")
+
+
+def build_snapshot(csv_path: str, out_path: str = None) -> str:
+    """解析 CSV 並寫出快照 (先寫暫存檔再 rename，避免 Server 讀到一半的檔案)。"""
+    out_path = out_path or snapshot_path(csv_path)
+    records = _read_csv_records(csv_path)
+    _write_snapshot(csv_path, out_path, NgramIndex(records))
+    return out_path
+
+
+def _write_snapshot(csv_path: str, out_path: str, index: NgramIndex) -> None:
+    mtime_ns, size = _source_signature(csv_path)
+    payload = {
+        "version": SNAPSHOT_VERSION,
+        "source_mtime_ns": mtime_ns,
+        "source_size": size,
+        "index": index.to_columns(),
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(out_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _load_snapshot(csv_path: str, path: str):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as f:
+        payload = pickle.load(f)
+    if not isinstance(payload, dict) or payload.get("version") != SNAPSHOT_VERSION:
+        return None
+    if (payload.get("source_mtime_ns"), payload.get("source_size")) != _source_signature(csv_path):
+        return None
+    return NgramIndex.from_columns(payload["index"])
+
+
+def load_catalog(csv_path: str) -> NgramIndex:
+    """載入統計目錄：優先使用快照，快照不存在或過期時才解析 CSV 並重建快照。"""
+    path = snapshot_path(csv_path)
+    try:
+        index = _load_snapshot(csv_path, path)
+        if index is not None:
+            return index
+    except Exception as e:
+        sys.stderr.write(f"Snapshot load failed, falling back to CSV: {e}\n")
+
+    index = NgramIndex(_read_csv_records(csv_path))
+    try:
+        _write_snapshot(csv_path, path, index)
+    except Exception as e:
+        sys.stderr.write(f"Snapshot write failed: {e}\n")
+    return index
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    targets = sys.argv[1:] or [
+        p for p in (os.path.join(base_dir, "data", "statistics_full.csv"), os.path.join(base_dir, "data", "statistics.csv"))
+        if os.path.exists(p)
+    ]
+    for csv_path in targets:
+        print(f"已建立快照: {build_snapshot(csv_path)}")
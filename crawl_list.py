@@ -1,122 +1,442 @@
-import requests
-import pandas as pd
+import argparse
+import asyncio
+import hashlib
+import json
 import os
-import concurrent.futures
-import urllib3
+import tempfile
 import time
 
-# 關閉 SSL 警告
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+import catalog_snapshot
+import upstream_client
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # 原始檔與輸出檔
 ORIGINAL_CSV = os.path.join(BASE_DIR, "data", "statistics.csv")
 OUTPUT_CSV = os.path.join(BASE_DIR, "data", "statistics_full.csv")
+# 探測紀錄 (ledger)：每個組合最後一次探測的時間、狀態與回應雜湊。
+# 掃描途中持續寫入，因此中斷後重新執行也會自動接續。
+LEDGER_FILE = os.path.join(BASE_DIR, "data", "probe_ledger.json")
 
-BASE_URL = "https://statisticsinfo.tycg.gov.tw/TaoyuanSTYB/RestfulAPI/GetStaticData.aspx"
+BASE_URL = upstream_client.TYCG_API_URL
 
 # 設定掃描範圍
 # 根據您的發現，tid=0005 裡面有 cid=0002，所以我們要加強掃描
 TIDS = ["0001", "0002", "0003", "0004", "0005"]
 CIDS = [f"{i:04d}" for i in range(1, 25)]  # 掃描 0001~0024 類別
-SIDS = [f"{i:06d}" for i in range(1, 40)]  # 掃描每個類別的前 40 個項目
+SIDS = [f"{i:06d}" for i in range(1, 40)]  # 每個類別至少掃描前 39 個項目
+SID_EXTEND_WINDOW = 10    # 最後一個有效 sid 之後再往後探測幾個
+SID_HARD_LIMIT = 300      # 動態延伸的上限，避免異常回應導致無限掃描
 
-def check_url(tid, cid, sid):
-    """測試單一組合是否有效"""
+# 搜尋空間剪枝 (預設策略)：
+# 1. 沒有任何已知 sid 的類別，先抽樣前幾個 sid，全部不存在就跳過整個類別
+# 2. 依序往後探測，連續多個 sid 不存在 (且已超過已知的最大 sid) 就停止該類別
+#    (門檻可用 --max-misses 或 TAOYUAN_CRAWL_MAX_MISSES 調整，越大越不會漏掉中間有空缺的序列)
+# 3. statistics.csv 與 ledger 中已知的 sid 作為種子，種子多的類別優先掃描
+CATEGORY_SAMPLE_SIZE = 5
+MAX_CONSECUTIVE_MISSES = int(os.environ.get("TAOYUAN_CRAWL_MAX_MISSES", "10"))
+WALK_BATCH = 5            # 同一類別內一次並行探測幾個 sid
+
+# 增量更新：在有效期限內的探測結果直接沿用，不再重新探測
+FOUND_MAX_AGE = 7 * 24 * 3600     # 有效項目每 7 天確認一次內容是否變更
+EMPTY_MAX_AGE = 30 * 24 * 3600    # 確定不存在的項目每 30 天再確認一次
+
+# 探測只查最近兩年以減少回應大小；已知的項目在這個區間沒有資料時 (例如已停止更新的序列)，
+# 會再以完整期間確認一次。目錄中的項目必須連續 REMOVE_AFTER_EMPTY 次完整期間都沒有資料才移除。
+PROBE_BEGIN, PROBE_END = "2023", "2024"
+FULL_RANGE_BEGIN = "1990"
+REMOVE_AFTER_EMPTY = 2
+
+# 併發控制 (AIMD)：回應正常時慢慢加併發，逾時 / 錯誤 / 延遲過高時減半，避免打爆上游
+MIN_CONCURRENCY = 2
+MAX_CONCURRENCY = upstream_client.POOL_SIZE
+START_CONCURRENCY = 8
+TARGET_LATENCY = 2.0      # 秒，超過視為上游開始吃緊
+REQUEST_TIMEOUT = 10.0    # 單次請求 read timeout
+MAX_ATTEMPTS = 3          # 逾時 / 5xx 的重試次數 (空回應不重試)
+CHECKPOINT_EVERY = 50     # 每完成幾筆寫一次 ledger
+
+FOUND, EMPTY, ERROR = "found", "empty", "error"
+
+
+class AdaptiveLimiter:
+    """AIMD 併發限制器：成功時 limit += 1/limit，壅塞時 limit 減半。"""
+
+    def __init__(self, start=START_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY):
+        self.limit = float(start)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+        self._last_decrease = 0.0
+
+        self.requests = 0
+
+    async def acquire(self):
+        async with self._cond:
+            while self.in_flight >= int(self.limit):
+                await self._cond.wait()
+            self.in_flight += 1
+            self.requests += 1
+
+    async def release(self, latency: float, congested: bool):
+        async with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if congested or latency > TARGET_LATENCY:
+                # 同一波壅塞只減半一次
+                if now - self._last_decrease > TARGET_LATENCY:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def _parse_probe(tid, cid, sid, text, url):
+    """判斷回應內容：有資料回傳紀錄，空陣列 / 空字串視為不存在；
+    非 JSON (維護頁面、WAF 攔截頁) 或格式不符則視為 ERROR，下次再重試。"""
+    text = text.strip()
+    if len(text) <= 5:
+        return EMPTY, None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return ERROR, None
+
+    # 上游有兩種格式：直接回傳陣列，或 {"Header": ..., "Data": [...]}
+    rows = data.get("Data") if isinstance(data, dict) else data
+    if isinstance(data, dict) and rows is None:
+        return EMPTY, None
+    if not isinstance(rows, list):
+        return ERROR, None
+    if len(rows) == 0:
+        return EMPTY, None
+
+    first_row = rows[0]
+    # 簡易拼湊一個名稱，讓您可以搜尋到
+    name_guess = f"[自動發現] 項目_{tid}_{cid}_{sid}"
+    # 嘗試從資料內容找線索 (有些資料會有 'Item' 欄位)
+    if isinstance(first_row, dict) and 'Item' in first_row:
+        name_guess = first_row['Item']
+    elif isinstance(data, dict) and data.get("EffectiveComplexName"):
+        name_guess = data["EffectiveComplexName"]
+
+    print(f"✅ 發現資料: tid={tid} cid={cid} sid={sid} | 預覽: {str(first_row)[:30]}...")
+    return FOUND, {
+        "所屬資料庫": f"資料庫_{tid}",
+        "tid": tid,
+        "所屬類別": f"類別_{cid}",
+        "cid": cid,
+        "資料名稱": name_guess,
+        "sid": sid,
+        "統計資料檔案格式": url,
+    }
+
+
+async def probe(limiter, tid, cid, sid, begin=PROBE_BEGIN, end=PROBE_END):
+    """測試單一組合，回傳 (status, record, 回應雜湊)。
+    逾時與 5xx 會重試，重試用盡回傳 ERROR (而不是當作不存在)；其他 4xx 直接回傳 ERROR。"""
+    import httpx
+
+    client = upstream_client.get_async_client(verify=False)
     params = {
         "tid": tid, "cid": cid, "sid": sid,
-        "begin": "2023", "end": "2024", "type": "JSON"
-    }
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+        "begin": begin, "end": end, "type": "JSON"
     }
-    
+    for attempt in range(MAX_ATTEMPTS):
+        await limiter.acquire()
+        start = time.monotonic()
+        congested = True
+        try:
+            response = await client.get(BASE_URL, params=params, timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=upstream_client.CONNECT_TIMEOUT))
+            if response.status_code == 200:
+                congested = False
+                digest = hashlib.sha1(response.content).hexdigest()
+                status, record = _parse_probe(tid, cid, sid, response.text, str(response.url))
+                return status, record, digest
+            if response.status_code < 500 and response.status_code != 429:
+                # 400 / 403 / 404 等不代表項目不存在 (可能是被攔截或參數錯誤)，不可用來移除目錄
+                congested = False
+                return ERROR, None, None
+        except (httpx.TimeoutException, httpx.TransportError):
+            pass
+        finally:
+            await limiter.release(time.monotonic() - start, congested)
+        await asyncio.sleep(upstream_client.BACKOFF_FACTOR * (2 ** attempt))
+    return ERROR, None, None
+
+
+def _key(tid, cid, sid):
+    return f"{tid}:{cid}:{sid}"
+
+
+def load_ledger():
+    if not os.path.exists(LEDGER_FILE):
+        return {}
     try:
-        # 設定 timeout 為 2 秒，加快掃描速度
-        response = requests.get(BASE_URL, params=params, headers=headers, verify=False, timeout=2)
-        
-        # 只要不是空的且狀態是 200，就視為有效
-        if response.status_code == 200 and len(response.text.strip()) > 5:
-            try:
-                data = response.json()
-                # 排除空陣列 []
-                if isinstance(data, list) and len(data) > 0:
-                    # 嘗試抓取標題，通常是 JSON Key 的一部分，或是我們只能標記它是「未知項目」
-                    first_row = data[0]
-                    # 簡易拼湊一個名稱，讓您可以搜尋到
-                    name_guess = f"[自動發現] 項目_{tid}_{cid}_{sid}"
-                    
-                    # 嘗試從資料內容找線索 (有些資料會有 'Item' 欄位)
-                    if 'Item' in first_row: name_guess = first_row['Item']
-                    
-                    print(f"✅ 發現資料: tid={tid} cid={cid} sid={sid} | 預覽: {str(first_row)[:30]}...")
-                    
-                    return {
-                        "所屬資料庫": f"資料庫_{tid}",
-                        "tid": tid,
-                        "所屬類別": f"類別_{cid}",
-                        "cid": cid,
-                        "資料名稱": name_guess,
-                        "sid": sid,
-                        "統計資料檔案格式": response.url
-                    }
-            except:
-                pass
-    except:
-        pass
-    return None
+        with open(LEDGER_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("entries", {})
+    except Exception as e:
+        print(f"Ledger 讀取失敗，將重新掃描: {e}")
+        return {}
 
-def main():
-    print(f"🚀 開始 Antigravity 爬蟲掃描... (目標: {OUTPUT_CSV})")
-    print("這將會掃描數千個組合，請稍候...")
-    
-    new_records = []
-    
-    # 併發執行掃描
-    with concurrent.futures.ThreadPoolExecutor(max_workers=30) as executor:
-        futures = []
-        for tid in TIDS:
-            for cid in CIDS:
-                for sid in SIDS:
-                    futures.append(executor.submit(check_url, tid, cid, sid))
-        
-        for future in concurrent.futures.as_completed(futures):
-            result = future.result()
-            if result:
-                new_records.append(result)
-
-    print(f"\n✅ 掃描完成！共發現 {len(new_records)} 筆有效資料。")
-
-    # 合併舊資料
-    all_data = []
+
+def save_ledger(ledger):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(LEDGER_FILE), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"updated": time.time(), "entries": ledger}, f, ensure_ascii=False)
+    os.replace(tmp_path, LEDGER_FILE)
+
+
+def needs_probe(entry, now):
+    """沒有紀錄、上次失敗、或紀錄已超過有效期限的組合才需要重新探測。"""
+    if entry is None or entry["status"] == ERROR:
+        return True
+    max_age = FOUND_MAX_AGE if entry["status"] == FOUND else EMPTY_MAX_AGE
+    return now - entry["checked"] > max_age
+
+
+def _extend_sid_ranges(ledger, upper):
+    """若某類別最後一個有效 sid 接近目前掃描上限，就把範圍往後延伸。"""
+    extra = []
+    for (tid, cid), limit in upper.items():
+        found = [int(k.split(":")[2]) for k, e in ledger.items()
+                 if e["status"] == FOUND and k.startswith(f"{tid}:{cid}:")]
+        if not found:
+            continue
+        new_limit = min(max(found) + SID_EXTEND_WINDOW, SID_HARD_LIMIT)
+        if new_limit > limit:
+            extra.extend((tid, cid, f"{i:06d}") for i in range(limit + 1, new_limit + 1))
+            upper[(tid, cid)] = new_limit
+    return extra
+
+
+def load_catalog_keys():
+    """目前 statistics_full.csv 中的組合。"""
+    if not os.path.exists(OUTPUT_CSV):
+        return set()
+    import pandas as pd
+
+    df = catalog_snapshot.normalize_ids(pd.read_csv(OUTPUT_CSV))
+    return {_key(t, c, s) for t, c, s in zip(df["tid"], df["cid"], df["sid"])}
+
+
+def load_seeds(ledger):
+    """種子 sid：原始 statistics.csv 的項目加上 ledger 中已確認有效的項目。"""
+    seeds = {}
     if os.path.exists(ORIGINAL_CSV):
-        try:
-            old_df = pd.read_csv(ORIGINAL_CSV)
-            # 統一欄位型態
-            old_df['tid'] = old_df['tid'].astype(str).str.zfill(4)
-            old_df['cid'] = old_df['cid'].astype(str).str.zfill(4)
-            old_df['sid'] = old_df['sid'].astype(str).str.zfill(6)
-            all_data.append(old_df)
-            print("已載入原始 CSV 資料。")
-        except Exception as e:
-            print(f"原始 CSV 讀取失敗: {e}")
-
-    if new_records:
-        new_df = pd.DataFrame(new_records)
-        all_data.append(new_df)
-
-    if all_data:
-        # 合併並移除重複 (優先保留原本有的)
-        final_df = pd.concat(all_data)
-        # 根據 ID 去除重複
-        final_df.drop_duplicates(subset=['tid', 'cid', 'sid'], keep='first', inplace=True)
-        
-        # 存檔
+        import pandas as pd
+
+        base_df = catalog_snapshot.normalize_ids(pd.read_csv(ORIGINAL_CSV))
+        for tid, cid, sid in zip(base_df["tid"], base_df["cid"], base_df["sid"]):
+            seeds.setdefault((tid, cid), set()).add(int(sid))
+    for key, entry in ledger.items():
+        if entry["status"] == FOUND:
+            tid, cid, sid = key.split(":")
+            seeds.setdefault((tid, cid), set()).add(int(sid))
+    return seeds
+
+
+class CrawlRun:
+    """單次掃描的狀態：共用的 limiter、ledger 與統計數字。"""
+
+    def __init__(self, ledger, full=False, known=None, max_misses=MAX_CONSECUTIVE_MISSES):
+        self.ledger = ledger
+        self.full = full
+        self.max_misses = max(1, max_misses)
+        self.now = time.time()
+        self.limiter = AdaptiveLimiter()
+        # 已在目錄中的組合：探測區間內沒有資料時需以完整期間確認
+        self.known = known if known is not None else load_catalog_keys()
+        self.stats = {"probed": 0, "skipped": 0, "errors": 0, "changed": 0, "discovered": 0, "pruned_categories": 0}
+
+    async def check(self, tid, cid, sid):
+        """回傳組合狀態；ledger 中仍有效的結果直接沿用，不發送請求。"""
+        key = _key(tid, cid, sid)
+        previous = self.ledger.get(key)
+        if previous is not None and previous["checked"] >= self.now and previous["status"] != ERROR:
+            # 本次掃描中已探測過 (例如抽樣階段)
+            return previous["status"]
+        if not self.full and not needs_probe(previous, self.now):
+            self.stats["skipped"] += 1
+            return previous["status"]
+
+        status, record, digest = await probe(self.limiter, tid, cid, sid)
+        full_range = False
+        if status == EMPTY and (key in self.known or (previous is not None and previous.get("record"))):
+            status, record, _ = await probe(self.limiter, tid, cid, sid, FULL_RANGE_BEGIN, str(time.localtime().tm_year))
+            full_range = True
+        self.stats["probed"] += 1
+        if status == ERROR:
+            # 保留上次確定的結果，只標記為待重試
+            self.stats["errors"] += 1
+            self.ledger[key] = {**(previous or {"hash": None, "record": None}), "status": ERROR, "checked": time.time()}
+        else:
+            if previous and previous.get("hash") and previous["hash"] != digest:
+                self.stats["changed"] += 1
+            if status == FOUND and (previous is None or previous.get("record") is None):
+                # 本次掃描新發現的項目 (之前從未確認有資料)
+                self.stats["discovered"] += 1
+            entry = {"status": status, "checked": time.time(), "hash": digest, "record": record}
+            if status == EMPTY:
+                # 保留最後一次的紀錄，連續以完整期間確認沒有資料的次數
+                streak = previous.get("empty_streak", 0) if previous and previous["status"] in (EMPTY, ERROR) else 0
+                entry["record"] = previous.get("record") if previous else None
+                entry["full_range"] = full_range
+                entry["empty_streak"] = streak + 1 if full_range else 0
+            self.ledger[key] = entry
+        if self.stats["probed"] % CHECKPOINT_EVERY == 0:
+            save_ledger(self.ledger)
+            print(f"已探測 {self.stats['probed']} | 請求 {self.limiter.requests} | 併發上限 {int(self.limiter.limit)} | 錯誤 {self.stats['errors']}")
+        return status
+
+    async def check_many(self, tid, cid, sids):
+        return await asyncio.gather(*[self.check(tid, cid, f"{sid:06d}") for sid in sids])
+
+    async def walk_category(self, tid, cid, seeds, max_misses=None):
+        """依序探測一個類別，連續 max_misses (預設為本次掃描的設定) 個不存在就停止。"""
+        max_misses = self.max_misses if max_misses is None else max(1, max_misses)
+        if not seeds:
+            statuses = await self.check_many(tid, cid, range(1, CATEGORY_SAMPLE_SIZE + 1))
+            if FOUND not in statuses and ERROR not in statuses:
+                self.stats["pruned_categories"] += 1
+                return
+
+        max_seed = max(seeds, default=0)
+        sid = 1
+        misses = 0
+        while sid <= SID_HARD_LIMIT:
+            batch = range(sid, min(sid + WALK_BATCH, SID_HARD_LIMIT + 1))
+            for s, status in zip(batch, await self.check_many(tid, cid, batch)):
+                if status == FOUND or s in seeds:
+                    misses = 0
+                elif status == EMPTY:
+                    misses += 1
+            sid = batch[-1] + 1
+            if sid > max_seed and misses >= max_misses:
+                break
+
+    async def run_pruned(self):
+        seeds = load_seeds(self.ledger)
+        categories = [(t, c) for t in TIDS for c in CIDS]
+        # 種子多的 (資料密集) 類別先排入，優先取得併發額度
+        categories.sort(key=lambda k: -len(seeds.get(k, ())))
+        await asyncio.gather(*[self.walk_category(t, c, seeds.get((t, c), set()), self.max_misses) for t, c in categories])
+
+    async def run_exhaustive(self):
+        """舊的窮舉策略 (所有 TIDS × CIDS × SIDS)，保留作為比較基準。"""
+        upper = {(t, c): int(SIDS[-1]) for t in TIDS for c in CIDS}
+        combos = [(t, c, s) for t in TIDS for c in CIDS for s in SIDS]
+        while combos:
+            await asyncio.gather(*[self.check(*combo) for combo in combos])
+            combos = _extend_sid_ranges(self.ledger, upper)
+
+
+async def crawl(ledger, full=False, exhaustive=False, max_misses=MAX_CONSECUTIVE_MISSES):
+    """增量掃描：只探測過期或未確定的組合。結果直接寫回 ledger，回傳本次的統計。"""
+    run = CrawlRun(ledger, full=full, max_misses=max_misses)
+    try:
+        if exhaustive:
+            await run.run_exhaustive()
+        else:
+            await run.run_pruned()
+    finally:
+        save_ledger(ledger)
+        await upstream_client.aclose()
+    run.stats["requests"] = run.limiter.requests
+    run.stats["max_misses"] = run.max_misses
+    run.stats["total_found"] = sum(1 for e in ledger.values() if e["status"] == FOUND)
+    return run.stats
+
+
+def should_remove(entry):
+    """只有連續 REMOVE_AFTER_EMPTY 次以完整期間確認都沒有資料，才從目錄移除。"""
+    return entry["status"] == EMPTY and entry.get("full_range", False) and entry.get("empty_streak", 0) >= REMOVE_AFTER_EMPTY
+
+
+def apply_catalog_diff(ledger):
+    """依 ledger 對 statistics_full.csv 做差異更新 (新增 / 更新 / 移除)，而不是整份重寫合併。
+    原始 statistics.csv 中人工整理的項目一律保留。"""
+    import pandas as pd
+
+    base_keys = set()
+    if os.path.exists(ORIGINAL_CSV):
+        base_df = catalog_snapshot.normalize_ids(pd.read_csv(ORIGINAL_CSV))
+        base_keys = {_key(t, c, s) for t, c, s in zip(base_df["tid"], base_df["cid"], base_df["sid"])}
+    else:
+        base_df = pd.DataFrame()
+
+    if os.path.exists(OUTPUT_CSV):
+        current_df = catalog_snapshot.normalize_ids(pd.read_csv(OUTPUT_CSV))
+    else:
+        current_df = base_df
+    columns = list(current_df.columns) or list(next((e["record"] for e in ledger.values() if e["record"]), {}).keys())
+    rows = {}
+    for row in current_df.to_dict(orient="records"):
+        rows.setdefault(_key(row["tid"], row["cid"], row["sid"]), row)
+
+    diff = {"added": [], "updated": [], "removed": []}
+    for key, entry in ledger.items():
+        if key in base_keys:
+            continue
+        if entry["status"] == FOUND:
+            record = entry["record"]
+            if key not in rows:
+                diff["added"].append(key)
+                rows[key] = record
+            elif any(rows[key].get(c) != record.get(c) for c in record):
+                diff["updated"].append(key)
+                rows[key] = {**rows[key], **record}
+        elif key in rows and should_remove(entry):
+            diff["removed"].append(key)
+            del rows[key]
+
+    if any(diff.values()):
+        final_df = pd.DataFrame(list(rows.values()), columns=columns or None)
         final_df.to_csv(OUTPUT_CSV, index=False, encoding='utf-8-sig')
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="掃描桃園市統計 API 的有效 tid/cid/sid 組合")
+    parser.add_argument("--full", action="store_true", help="忽略 ledger 的有效期限，重新探測所有組合")
+    parser.add_argument("--exhaustive", action="store_true", help="停用剪枝，窮舉所有 TIDS × CIDS × SIDS 組合")
+    parser.add_argument("--max-misses", type=int, default=MAX_CONSECUTIVE_MISSES,
+                        help=f"類別內連續幾個 sid 不存在就停止探測 (預設 {MAX_CONSECUTIVE_MISSES}，可用 TAOYUAN_CRAWL_MAX_MISSES 設定)")
+    args = parser.parse_args()
+    if args.max_misses < 1:
+        parser.error("--max-misses 必須大於 0")
+
+    print(f"🚀 開始 Antigravity 爬蟲掃描... (目標: {OUTPUT_CSV})")
+    print("預設為增量模式，只探測過期或尚未確定的組合...")
+
+    ledger = load_ledger()
+    try:
+        stats = asyncio.run(crawl(ledger, full=args.full, exhaustive=args.exhaustive, max_misses=args.max_misses))
+    except KeyboardInterrupt:
+        print(f"\n⏸️ 掃描中斷，已探測的結果已儲存至 {LEDGER_FILE}，重新執行即可接續。")
+        return
+
+    print(f"\n✅ 掃描完成！本次探測 {stats['probed']} 個、沿用 {stats['skipped']} 個，目前共 {stats['total_found']} 筆有效資料 (內容變更 {stats['changed']} 筆)。")
+    exhaustive_size = len(TIDS) * len(CIDS) * len(SIDS)
+    print(f"📊 HTTP 請求 {stats['requests']} 次 (含重試)，本次新發現 {stats['discovered']} 筆；"
+          f"窮舉掃描至少需 {exhaustive_size} 次。跳過空類別 {stats['pruned_categories']} 個。")
+    if not args.exhaustive:
+        print(f"🔎 停止門檻: 類別內連續 {stats['max_misses']} 個 sid 不存在即停止 (--max-misses)。")
+    if stats["errors"]:
+        print(f"⚠️ 有 {stats['errors']} 個組合因逾時 / 伺服器錯誤未能確認，重新執行即可只補掃這些組合。")
+
+    diff = apply_catalog_diff(ledger)
+    print(f"目錄差異: 新增 {len(diff['added'])}、更新 {len(diff['updated'])}、移除 {len(diff['removed'])}")
+    if not os.path.exists(OUTPUT_CSV):
+        print("沒有發現新的項目，未產生完整清單。")
+    elif any(diff.values()) or not os.path.exists(catalog_snapshot.snapshot_path(OUTPUT_CSV)):
         print(f"🎉 完整清單已儲存至: {OUTPUT_CSV}")
+        # 同時輸出二進位快照，讓 Server 啟動時不必重新解析 CSV
+        print(f"📦 目錄快照已儲存至: {catalog_snapshot.build_snapshot(OUTPUT_CSV)}")
         print("現在請重新啟動您的 MCP Server (server.py)，它將會讀取這個新檔案。")
     else:
-        print("⚠️ 沒發現任何資料，請檢查網路。")
+        print("目錄沒有變更。")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
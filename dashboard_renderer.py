@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Dashboard 產生器
+# index.html 只在第一次使用 (或檔案 mtime 改變) 時讀取並「編譯」：
+# style.css / script.js 直接內嵌，並在資料注入點切成前後兩段，
+# 之後每次產生 dashboard 只需 前段 + 資料 + 後段，不必再對整份文件做 replace。
+# 內嵌後的 HTML 不依賴相對路徑，可放在獨立的輸出目錄，也可以直接由 API 回傳。
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_FILE = "index.html"
+DASHBOARD_DIR = os.environ.get("TAOYUAN_DASHBOARD_DIR", os.path.join(BASE_DIR, "dashboards"))
+DASHBOARD_CACHE_SIZE = int(os.environ.get("TAOYUAN_DASHBOARD_CACHE_SIZE", "32"))
+
+DATA_MARKER = "window.DASHBOARD_DATA = null;"
+STYLE_TAG = '<link rel="stylesheet" href="style.css">'
+SCRIPT_TAG = '<script src="script.js"></script>'
+_SCRIPT_CLOSE = re.compile(r"</(script)", re.IGNORECASE)
+
+
+def _script_safe(text: str) -> str:
+    # 避免內容中的 "</script" 提早結束 <script> 區塊 (字串內的 "<\/" 在 JS 中等同 "</")
+    return _SCRIPT_CLOSE.sub(r"<\\/\1", text)
+
+
+class DashboardTemplate:
+    """預先切割好的 index.html，樣板或內嵌檔案的 mtime 改變時自動重新編譯。"""
+
+    def __init__(self, base_dir: str = BASE_DIR):
+        self.paths = [os.path.join(base_dir, name) for name in (TEMPLATE_FILE, "style.css", "script.js")]
+        self._lock = threading.Lock()
+        self._compiled: Optional[Tuple[tuple, str, str]] = None
+
+    def _signature(self) -> tuple:
+        return tuple(os.stat(p).st_mtime_ns if os.path.exists(p) else None for p in self.paths)
+
+    def _read(self, path: str) -> Optional[str]:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _compile(self) -> Tuple[str, str]:
+        html_path, css_path, js_path = self.paths
+        html = self._read(html_path)
+        if html is None:
+            raise FileNotFoundError("Dashboard template (index.html) not found.")
+        css, js = self._read(css_path), self._read(js_path)
+        if css is not None:
+            html = html.replace(STYLE_TAG, f"<style>\n{css}\n</style>")
+        if DATA_MARKER not in html:
+            html = html.replace(SCRIPT_TAG, f"<script>{DATA_MARKER}</script>{SCRIPT_TAG}")
+        if js is not None:
+            html = html.replace(SCRIPT_TAG, f"<script>\n{_script_safe(js)}\n</script>")
+        head, marker, tail = html.partition(DATA_MARKER)
+        if not marker:
+            raise ValueError("Dashboard template has no data injection point.")
+        return head, tail
+
+    def compiled(self) -> Tuple[tuple, str, str]:
+        signature = self._signature()
+        compiled = self._compiled
+        if compiled is None or compiled[0] != signature:
+            with self._lock:
+                if self._compiled is None or self._compiled[0] != signature:
+                    self._compiled = (signature, *self._compile())
+                compiled = self._compiled
+        return compiled
+
+    def version(self) -> str:
+        return hashlib.sha1(repr(self.compiled()[0]).encode("utf-8")).hexdigest()[:12]
+
+    def render(self, data: Any) -> str:
+        _, head, tail = self.compiled()
+        return f"{head}window.DASHBOARD_DATA = {_script_safe(json.dumps(data, ensure_ascii=False))};{tail}"
+
+
+def data_digest(data: Any) -> str:
+    return hashlib.sha1(json.dumps(data, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:20]
+
+
+def _write_atomic(path: str, content: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        # mkstemp 建立的檔案權限為 0600，改回一般 HTML 檔的權限
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class DashboardStore:
+    """已產生的 dashboard：記憶體保留最近 N 份 (LRU)，輸出檔只在資料或樣板改變時重寫。"""
+
+    def __init__(
+        self,
+        template: DashboardTemplate = None,
+        out_dir: str = DASHBOARD_DIR,
+        max_entries: int = DASHBOARD_CACHE_SIZE,
+        prepare: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.template = template or DashboardTemplate()
+        # prepare: 注入前將上游資料轉成 dashboard 使用的格式 (只在需要重新產生時執行)
+        self.prepare = prepare
+        self.out_dir = out_dir
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._rendered: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._written: Dict[str, str] = {}
+        self.renders = 0
+        self.writes = 0
+        self.skipped_writes = 0
+
+    def render(self, key: str, data: Any, etag: Optional[str] = None) -> Tuple[str, bytes]:
+        """回傳 (digest, html)；etag 為上游資料的雜湊 (沒有時自行計算)。"""
+        digest = f"{etag or data_digest(data)}-{self.template.version()}"
+        with self._lock:
+            cached = self._rendered.get(key)
+            if cached is not None and cached[0] == digest:
+                self._rendered.move_to_end(key)
+                return cached
+        injected = self.prepare(data) if self.prepare else data
+        html = self.template.render(injected).encode("utf-8")
+        with self._lock:
+            self.renders += 1
+            self._rendered[key] = (digest, html)
+            self._rendered.move_to_end(key)
+            while len(self._rendered) > self.max_entries:
+                self._rendered.popitem(last=False)
+        return digest, html
+
+    def write(self, filename: str, key: str, data: Any, etag: Optional[str] = None) -> str:
+        digest, html = self.render(key, data, etag)
+        path = os.path.join(self.out_dir, filename)
+        with self._lock:
+            unchanged = self._written.get(path) == digest and os.path.exists(path)
+            if unchanged:
+                self.skipped_writes += 1
+        if not unchanged:
+            os.makedirs(self.out_dir, exist_ok=True)
+            _write_atomic(path, html)
+            with self._lock:
+                self._written[path] = digest
+                self.writes += 1
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cached": len(self._rendered),
+                "renders": self.renders,
+                "writes": self.writes,
+                "skipped_writes": self.skipped_writes,
+                "out_dir": self.out_dir,
+            }
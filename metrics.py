@@ -0,0 +1,263 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 執行時間 / 大小的量測 (Prometheus 格式)
+# 不依賴 prometheus_client：histogram 與 counter 以固定 bucket 在記憶體累計，
+# /metrics 路由輸出 Prometheus text exposition format，MCP 工具則回傳 JSON 摘要。
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = tuple(float(1024 * 4 ** i) for i in range(10))  # 1 KB ~ 256 MB
+
+# 單次呼叫的耗時明細 (profiling 使用)：trace() 期間每個 Histogram.time() 區塊都會記錄一筆
+_trace: "ContextVar[Optional[list]]" = ContextVar("metrics_trace", default=None)
+
+
+@contextmanager
+def trace():
+    """收集 with 區塊內 (含 asyncio.to_thread 執行的部分) 所有計時區塊的 (metric, labels, 秒數)。"""
+    records = []
+    token = _trace.set(records)
+    try:
+        yield records
+    finally:
+        _trace.reset(token)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 6)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items]
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {",".join(k) or "total": v for k, v in sorted(self._values.items())}
+
+
+class _HistogramState:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)  # 最後一格為 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._states: Dict[Tuple[str, ...], _HistogramState] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _HistogramState(len(self.buckets))
+            state.counts[index] += 1
+            state.count += 1
+            state.sum += value
+
+    @contextmanager
+    def time(self, **labels):
+        """量測 with 區塊的耗時 (秒)；區塊內發生例外也會記錄。"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(elapsed, **labels)
+            records = _trace.get()
+            if records is not None:
+                records.append((self.name, labels, elapsed))
+
+    def _quantile(self, state: _HistogramState, q: float) -> Optional[float]:
+        # 與 Prometheus histogram_quantile 相同：在所屬 bucket 內線性內插
+        if state.count == 0:
+            return None
+        rank = q * state.count
+        cumulative = 0
+        for i, c in enumerate(state.counts):
+            if cumulative + c >= rank and c > 0:
+                if i == len(self.buckets):
+                    return self.buckets[-1] if self.buckets else None
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / c
+            cumulative += c
+        return None
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(s.counts), s.count, s.sum) for k, s in self._states.items())
+        lines = []
+        for key, counts, count, total in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            states = sorted(self._states.items())
+            return {
+                ",".join(key) or "total": {
+                    "count": s.count,
+                    "sum": round(s.sum, 6),
+                    "avg": round(s.sum / s.count, 6) if s.count else None,
+                    "p50": _round(self._quantile(s, 0.5)),
+                    "p95": _round(self._quantile(s, 0.95)),
+                    "p99": _round(self._quantile(s, 0.99)),
+                }
+                for key, s in states
+            }
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labels, buckets)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: m.snapshot() for m in metrics}
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+
+def timed(metric: Histogram, **labels):
+    """裝飾器：記錄函式 (同步或 async) 的執行時間，保留原本的簽章供 FastAPI / FastMCP 解析參數。"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with metric.time(**labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metric.time(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MetricsMiddleware:
+    """ASGI middleware：依路徑與狀態碼記錄 HTTP 請求耗時 (不存在的路徑合併為 "unmatched"，避免 label 無限增加)。"""
+
+    def __init__(self, app, metric: Histogram):
+        self.app = app
+        self.metric = metric
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path = scope["path"] if status[0] != 404 else "unmatched"
+            self.metric.observe(time.perf_counter() - start, path=path, status=str(status[0]))
@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import catalog_snapshot
+import upstream_client
+from response_cache import CACHE_TTL, CacheEntry, payload_etag
+
+# 離線鏡像 (offline mirror)
+# 將目錄中每一組 (tid, cid, sid) 的完整歷史資料一次抓下來，壓縮後存入單一 SQLite 檔。
+# Server 以 --mirror 啟動時直接由鏡像回答，begin / end 的期間篩選在本機完成，
+# 上游 API 緩慢或停機時仍可正常服務；鏡像沒有的項目才退回一般的快取 / 上游流程
+# (--mirror-only 則完全不連線上游)。
+#
+# 建立 / 更新鏡像：python offline_mirror.py [--full] [--begin 1990]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MIRROR_PATH = os.environ.get("TAOYUAN_MIRROR_PATH", os.path.join(BASE_DIR, "data", "mirror.sqlite3"))
+MIRROR_BEGIN = os.environ.get("TAOYUAN_MIRROR_BEGIN", "1990")                              # 匯出的起始年
+MIRROR_REFRESH_AGE = int(os.environ.get("TAOYUAN_MIRROR_REFRESH_AGE", str(7 * 24 * 3600)))  # 增量匯出時多久以上才重抓
+MIRROR_MEMORY_SERIES = int(os.environ.get("TAOYUAN_MIRROR_MEMORY_SERIES", "64"))            # 記憶體中保留幾組已解壓的資料
+MIRROR_RECHECK = float(os.environ.get("TAOYUAN_MIRROR_RECHECK", "30"))                      # 多久檢查一次鏡像檔是否被更新
+# "0" 關閉；"1" 鏡像優先，沒有的項目再問上游；"only" 完全不連線上游
+MIRROR_MODE = os.environ.get("TAOYUAN_MIRROR", "0").lower()
+
+SLICE_CACHE_SIZE = 8      # 每組資料保留幾個最近使用的期間切片
+LIST_YEAR_HINTS = ("年", "月", "期")
+
+# 3–4 位數字，或後面接「年」、「/」、「-」的數字才視為年份 ("10月" 這類只有月份的標籤不算)
+_YEAR = re.compile(r"(?<!\d)(\d{3,4})(?!\d)|(?<!\d)(\d{1,2})(?=\s*[年/-])")
+
+
+def mirror_key(tid: str, cid: str, sid: str) -> str:
+    return f"{tid}:{cid}:{sid}"
+
+
+def row_year(label: Any) -> Optional[int]:
+    """從日期標籤取出西元年 ("2023"、"2023/01"、"112年"、"民國99年" 皆可)；無法判斷 (例如 "10月") 時回傳 None。"""
+    if label is None:
+        return None
+    m = _YEAR.search(str(label))
+    if m is None:
+        return None
+    year = int(m.group(1) or m.group(2))
+    return year + 1911 if year < 1911 else year
+
+
+class _SeriesView:
+    """單一組鏡像資料：各列的年份預先算好，期間切片只需一次線性篩選，最近的切片另外快取。"""
+
+    def __init__(self, data: Any, etag: str):
+        self.data = data
+        self.etag = etag
+        if isinstance(data, dict) and isinstance(data.get("Data"), list):
+            self.rows = data["Data"]
+            self.years = [row_year(r.get("DataDate")) if isinstance(r, dict) else None for r in self.rows]
+        elif isinstance(data, list) and data and isinstance(data[0], dict):
+            column = next((c for c in data[0] if any(h in str(c) for h in LIST_YEAR_HINTS)), None)
+            self.rows = data
+            self.years = [row_year(r.get(column)) if column and isinstance(r, dict) else None for r in data]
+        else:
+            self.rows, self.years = None, []
+        known = [y for y in self.years if y is not None]
+        self.min_year = min(known) if known else None
+        self.max_year = max(known) if known else None
+        self._slices: "OrderedDict[tuple, Any]" = OrderedDict()
+
+    def _slice(self, lo: int, hi: int) -> Any:
+        # 無法判斷年份的列 (例如備註) 一律保留
+        rows = [row for row, y in zip(self.rows, self.years) if y is None or lo <= y <= hi]
+        return {**self.data, "Data": rows} if isinstance(self.data, dict) else rows
+
+    def slice(self, begin: str, end: str) -> Any:
+        lo, hi = row_year(begin), row_year(end)
+        if self.rows is None or self.min_year is None or lo is None or hi is None:
+            return self.data
+        if lo <= self.min_year and hi >= self.max_year:
+            return self.data
+        key = (lo, hi)
+        cached = self._slices.get(key)
+        if cached is None:
+            cached = self._slices[key] = self._slice(lo, hi)
+            while len(self._slices) > SLICE_CACHE_SIZE:
+                self._slices.popitem(last=False)
+        else:
+            self._slices.move_to_end(key)
+        return cached
+
+
+class OfflineMirror:
+    """以 SQLite 儲存每組 (tid, cid, sid) 完整歷史資料 (zlib 壓縮 JSON) 的唯讀鏡像。"""
+
+    def __init__(
+        self,
+        path: str = MIRROR_PATH,
+        memory_series: int = MIRROR_MEMORY_SERIES,
+        max_age: int = CACHE_TTL,
+        recheck: float = MIRROR_RECHECK,
+        on_reload: Optional[Callable[[], None]] = None,
+    ):
+        self.path = path
+        self.memory_series = memory_series
+        # 回應的 Cache-Control max-age (鏡像資料不會自行過期)
+        self.max_age = max_age
+        self.recheck = recheck
+        # 鏡像檔被更新時呼叫 (例如讓 Server 清掉由舊資料算出的 cube)
+        self.on_reload = on_reload
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._views: "OrderedDict[str, _SeriesView]" = OrderedDict()
+        self._data_version = None
+        self._checked = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS series ("
+                " key TEXT PRIMARY KEY,"
+                " begin TEXT NOT NULL,"
+                " end TEXT NOT NULL,"
+                " fetched REAL NOT NULL,"
+                " etag TEXT NOT NULL,"
+                " row_count INTEGER NOT NULL,"
+                " data BLOB NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _check_version(self, conn: sqlite3.Connection) -> bool:
+        # 鏡像檔可能在 Server 執行中被匯出程式更新，定期檢查並清掉記憶體中的舊資料；有更新時回傳 True
+        now = time.monotonic()
+        if now - self._checked < self.recheck:
+            return False
+        self._checked = now
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = self._data_version is not None and version != self._data_version
+        if changed:
+            self._views.clear()
+        self._data_version = version
+        return changed
+
+    def put(self, tid: str, cid: str, sid: str, data: Any, begin: str, end: str) -> str:
+        blob = zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        etag = payload_etag(blob)
+        rows = data.get("Data") if isinstance(data, dict) else data
+        key = mirror_key(tid, cid, sid)
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO series (key, begin, end, fetched, etag, row_count, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, begin, end, time.time(), etag, len(rows) if isinstance(rows, list) else 0, blob),
+            )
+            self._views.pop(key, None)
+        return etag
+
+    def fetched_times(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._connect().execute("SELECT key, fetched FROM series").fetchall())
+
+    def _view(self, key: str) -> Optional[_SeriesView]:
+        with self._lock:
+            conn = self._connect()
+            reloaded = self._check_version(conn)
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+                return view
+            row = conn.execute("SELECT data, etag FROM series WHERE key = ?", (key,)).fetchone()
+        if reloaded and self.on_reload is not None:
+            self.on_reload()
+        if row is None:
+            return None
+        view = _SeriesView(json.loads(zlib.decompress(row[0]).decode("utf-8")), row[1])
+        with self._lock:
+            self._views[key] = view
+            while len(self._views) > self.memory_series:
+                self._views.popitem(last=False)
+        return view
+
+    def get_entry(self, tid: str, cid: str, sid: str, begin: str, end: str) -> Optional[CacheEntry]:
+        """回傳指定期間的資料 (CacheEntry，ETag 由鏡像版本與期間組成)；鏡像中沒有此項目時回傳 None。"""
+        view = self._view(mirror_key(tid, cid, sid))
+        with self._lock:
+            if view is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        etag = payload_etag(f"{view.etag}:{begin}:{end}".encode("utf-8"))
+        return CacheEntry(view.slice(begin, end), etag, time.time() + self.max_age)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            series, total_bytes, oldest = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0), MIN(fetched) FROM series"
+            ).fetchone()
+            return {
+                "series": series,
+                "total_bytes": total_bytes,
+                "oldest_fetch": datetime.fromtimestamp(oldest).isoformat(timespec="seconds") if oldest else None,
+                "in_memory": len(self._views),
+                "hits": self.hits,
+                "misses": self.misses,
+                "path": self.path,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._views.clear()
+
+
+# --- 匯出 (bulk export) ---
+
+# 回應內容有問題 (上游有回應但無法使用) 的失敗類型，不視為壅塞
+CONTENT_FAILURES = ("empty_body", "bad_json")
+
+
+async def _fetch_upstream(params: Dict[str, str]) -> Any:
+    # 與 Server 使用相同的 headers 與回應檢查 (失敗時拋出 UpstreamError，kind 區分失敗類型)
+    import server
+
+    response = await upstream_client.async_get(upstream_client.TYCG_API_URL, params=params, headers=server.get_headers(), verify=False)
+    return server._parse_upstream_response(response.status_code, response.text)
+
+
+async def export_catalog(
+    records: List[Dict[str, Any]],
+    mirror: OfflineMirror,
+    begin: str = MIRROR_BEGIN,
+    end: Optional[str] = None,
+    full: bool = False,
+    max_age: int = MIRROR_REFRESH_AGE,
+    fetch: Callable[[Dict[str, str]], Awaitable[Any]] = _fetch_upstream,
+) -> Dict[str, int]:
+    """並行抓取目錄中每一組項目的完整期間並寫入鏡像。
+    預設為增量模式：鏡像中 max_age 內抓過的項目略過 (full=True 則全部重抓)。"""
+    from crawl_list import AdaptiveLimiter
+    from server import _failure_type
+
+    end = end or str(datetime.now().year)
+    combos = sorted({(r["tid"], r["cid"], r["sid"]) for r in records})
+    fetched = {} if full else mirror.fetched_times()
+    now = time.time()
+    todo = [c for c in combos if now - fetched.get(mirror_key(*c), 0) > max_age]
+    stats = {"total": len(combos), "skipped": len(combos) - len(todo), "exported": 0, "empty": 0, "errors": 0}
+    limiter = AdaptiveLimiter()
+
+    async def export_one(tid: str, cid: str, sid: str):
+        params = {"tid": tid, "cid": cid, "sid": sid, "begin": begin, "end": end, "type": "JSON"}
+        await limiter.acquire()
+        start = time.monotonic()
+        congested = True
+        try:
+            data = await fetch(params)
+            congested = False
+        except Exception as e:
+            kind = _failure_type(e)
+            congested = kind not in CONTENT_FAILURES
+            if kind == "empty_body":
+                stats["empty"] += 1
+            else:
+                stats["errors"] += 1
+                sys.stderr.write(f"Export failed for {mirror_key(tid, cid, sid)} ({kind}): {e}\n")
+            return
+        finally:
+            await limiter.release(time.monotonic() - start, congested)
+        if data is None:
+            stats["empty"] += 1
+            return
+        mirror.put(tid, cid, sid, data, begin, end)
+        stats["exported"] += 1
+
+    await asyncio.gather(*[export_one(*c) for c in todo])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="將目錄中所有統計項目的完整歷史資料匯出為離線鏡像")
+    parser.add_argument("--full", action="store_true", help="忽略上次匯出時間，重新抓取所有項目")
+    parser.add_argument("--begin", default=MIRROR_BEGIN, help=f"起始年 (預設 {MIRROR_BEGIN})")
+    parser.add_argument("--end", default=None, help="結束年 (預設今年)")
+    parser.add_argument("--catalog", default=None, help="目錄 CSV (預設 data/statistics_full.csv，不存在時用 statistics.csv)")
+    parser.add_argument("--out", default=MIRROR_PATH, help="鏡像檔路徑")
+    args = parser.parse_args()
+
+    catalog = args.catalog
+    if catalog is None:
+        full_csv = os.path.join(BASE_DIR, "data", "statistics_full.csv")
+        catalog = full_csv if os.path.exists(full_csv) else os.path.join(BASE_DIR, "data", "statistics.csv")
+    records = catalog_snapshot.load_catalog(catalog).records
+    mirror = OfflineMirror(args.out)
+
+    async def run():
+        try:
+            return await export_catalog(records, mirror, begin=args.begin, end=args.end, full=args.full)
+        finally:
+            await upstream_client.aclose()
+
+    print(f"開始匯出 {len(records)} 筆目錄項目至 {args.out} ...")
+    started = time.monotonic()
+    try:
+        stats = asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n匯出中斷，已完成的項目已寫入鏡像，重新執行即可接續。")
+        return
+    print(f"完成 ({time.monotonic() - started:.1f}s)：匯出 {stats['exported']}、沿用 {stats['skipped']}、"
+          f"無資料 {stats['empty']}、失敗 {stats['errors']}")
+    summary = mirror.stats()
+    print(f"鏡像共 {summary['series']} 組，{summary['total_bytes'] / 1024 / 1024:.1f} MB")
+    if stats["errors"]:
+        print("有項目因逾時 / 伺服器錯誤未能匯出，重新執行即可只補抓這些項目。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# 熱門資料的背景預取
+# 記錄每組 (tid, cid, sid, begin, end) 的請求頻率 (指數衰減計數)，
+# 背景 thread 定期把「熱門且快要過期」的項目提早向上游更新，
+# 讓使用者幾乎不會遇到快取剛過期、必須等上游 API 的那一次請求。
+# 已過期但仍在保留期內的資料被請求時，先回傳舊資料並在背景更新 (stale-while-revalidate)。
+# 所有更新共用一個小型 thread pool，上游同時最多只有 PREFETCH_CONCURRENCY 個預取請求。
+# 更新失敗的項目在 PREFETCH_FAILURE_BACKOFF 秒內不再重試，避免上游故障時每次請求都再打一次。
+
+PREFETCH_INTERVAL = float(os.environ.get("TAOYUAN_PREFETCH_INTERVAL", "60"))          # 掃描間隔 (秒)
+PREFETCH_CONCURRENCY = int(os.environ.get("TAOYUAN_PREFETCH_CONCURRENCY", "2"))       # 同時進行的預取數
+PREFETCH_MAX_PER_CYCLE = int(os.environ.get("TAOYUAN_PREFETCH_MAX_PER_CYCLE", "20"))  # 每輪最多預取幾組
+PREFETCH_AHEAD = float(os.environ.get("TAOYUAN_PREFETCH_AHEAD", str(12 * 3600)))      # 剩餘有效時間低於此值就更新
+PREFETCH_MIN_SCORE = float(os.environ.get("TAOYUAN_PREFETCH_MIN_SCORE", "2"))         # 視為熱門的最低分數
+PREFETCH_HALF_LIFE = float(os.environ.get("TAOYUAN_PREFETCH_HALF_LIFE", str(24 * 3600)))  # 請求計數的半衰期
+PREFETCH_MAX_TRACKED = int(os.environ.get("TAOYUAN_PREFETCH_MAX_TRACKED", "1000"))
+PREFETCH_FAILURE_BACKOFF = float(os.environ.get("TAOYUAN_PREFETCH_FAILURE_BACKOFF", "300"))  # 更新失敗後暫停重試 (秒)
+PREFETCH_ENABLED = os.environ.get("TAOYUAN_PREFETCH", "1") != "0"
+
+
+class _Tracked:
+    __slots__ = ("score", "last_seen", "params")
+
+    def __init__(self, params: Any):
+        self.score = 0.0
+        self.last_seen = time.time()
+        self.params = params
+
+
+class Prefetcher:
+    """refresh(key, params) 負責向上游抓取並寫入快取；expiry(key) 回傳快取到期時間 (不存在為 None)。"""
+
+    def __init__(
+        self,
+        refresh: Callable[[Hashable, Any], Any],
+        expiry: Callable[[Hashable], Optional[float]],
+        interval: float = PREFETCH_INTERVAL,
+        concurrency: int = PREFETCH_CONCURRENCY,
+        max_per_cycle: int = PREFETCH_MAX_PER_CYCLE,
+        ahead: float = PREFETCH_AHEAD,
+        min_score: float = PREFETCH_MIN_SCORE,
+        half_life: float = PREFETCH_HALF_LIFE,
+        max_tracked: int = PREFETCH_MAX_TRACKED,
+        failure_backoff: float = PREFETCH_FAILURE_BACKOFF,
+    ):
+        self._refresh = refresh
+        self._expiry = expiry
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self.max_per_cycle = max_per_cycle
+        self.ahead = ahead
+        self.min_score = min_score
+        self.half_life = half_life
+        self.max_tracked = max_tracked
+        self.failure_backoff = failure_backoff
+        self._lock = threading.Lock()
+        self._tracked: Dict[Hashable, _Tracked] = {}
+        self._in_flight = set()
+        self._failed: Dict[Hashable, float] = {}  # key -> 最近一次更新失敗的時間
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.refreshed = 0
+        self.failures = 0
+        self.revalidations = 0
+        self.skipped = 0
+        self.cycles = 0
+
+    # --- 請求頻率 ---
+
+    def _decayed(self, item: _Tracked, now: float) -> float:
+        return item.score * 0.5 ** ((now - item.last_seen) / self.half_life)
+
+    def record(self, key: Hashable, params: Any) -> None:
+        now = time.time()
+        with self._lock:
+            item = self._tracked.get(key)
+            if item is None:
+                if len(self._tracked) >= self.max_tracked:
+                    coldest = min(self._tracked, key=lambda k: self._decayed(self._tracked[k], now))
+                    del self._tracked[coldest]
+                item = self._tracked[key] = _Tracked(params)
+            item.score = self._decayed(item, now) + 1.0
+            item.last_seen = now
+
+    def hot_keys(self, limit: Optional[int] = None):
+        now = time.time()
+        with self._lock:
+            scored = [(self._decayed(item, now), key, item.params) for key, item in self._tracked.items()]
+        scored = [s for s in scored if s[0] >= self.min_score]
+        scored.sort(key=lambda s: s[0], reverse=True)
+        return scored[:limit] if limit else scored
+
+    # --- 背景更新 ---
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="prefetch")
+            return self._executor
+
+    def _run_refresh(self, key: Hashable, params: Any) -> None:
+        try:
+            ok = self._refresh(key, params) is not None
+        except Exception as e:
+            ok = False
+            sys.stderr.write(f"Prefetch failed for {key}: {e}\n")
+        now = time.time()
+        with self._lock:
+            self._in_flight.discard(key)
+            if ok:
+                self.refreshed += 1
+                self._failed.pop(key, None)
+            else:
+                self.failures += 1
+                self._failed[key] = now
+                if len(self._failed) > self.max_tracked:
+                    self._failed = {k: t for k, t in self._failed.items() if now - t < self.failure_backoff}
+
+    def _backing_off(self, key: Hashable, now: float) -> bool:
+        """呼叫端必須持有 self._lock"""
+        failed_at = self._failed.get(key)
+        if failed_at is None:
+            return False
+        if now - failed_at < self.failure_backoff:
+            return True
+        del self._failed[key]
+        return False
+
+    def schedule(self, key: Hashable, params: Any) -> bool:
+        """排入背景更新；同一個 key 已在更新中，或最近更新失敗仍在暫停期間則略過。"""
+        with self._lock:
+            if key in self._in_flight:
+                return False
+            if self._backing_off(key, time.time()):
+                self.skipped += 1
+                return False
+            self._in_flight.add(key)
+        self._get_executor().submit(self._run_refresh, key, params)
+        return True
+
+    def revalidate(self, key: Hashable, params: Any) -> None:
+        """請求命中已過期 (stale) 的資料時呼叫：呼叫端直接使用舊資料，更新在背景進行。"""
+        if self.schedule(key, params):
+            with self._lock:
+                self.revalidations += 1
+
+    def run_once(self) -> int:
+        """掃描一次熱門項目，將即將過期 (或已被淘汰) 的項目排入更新；回傳排入數量。"""
+        now = time.time()
+        scheduled = 0
+        for _, key, params in self.hot_keys():
+            if scheduled >= self.max_per_cycle:
+                break
+            expires = self._expiry(key)
+            if expires is not None and expires - now > self.ahead:
+                continue
+            if self.schedule(key, params):
+                scheduled += 1
+        with self._lock:
+            self.cycles += 1
+        return scheduled
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                sys.stderr.write(f"Prefetch cycle failed: {e}\n")
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="prefetcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        hot = self.hot_keys()
+        now = time.time()
+        with self._lock:
+            return {
+                "tracked": len(self._tracked),
+                "hot": len(hot),
+                "in_flight": len(self._in_flight),
+                "backing_off": sum(1 for t in self._failed.values() if now - t < self.failure_backoff),
+                "refreshed": self.refreshed,
+                "failures": self.failures,
+                "revalidations": self.revalidations,
+                "skipped": self.skipped,
+                "cycles": self.cycles,
+                "running": self._thread is not None and not self._stop.is_set(),
+            }
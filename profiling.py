@@ -0,0 +1,119 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+import metrics
+
+# 單次工具呼叫的效能剖析 (opt-in)
+# 以 cProfile (deterministic profiler) 執行一次工具呼叫，回傳：
+# - stages：此次呼叫各計時區塊 (上游請求、JSON 解析、分析、報告產生…) 的耗時
+# - top_functions：依累計時間排序的函式 (可看出是 DataFrame 建構、polyfit 還是字串格式化)
+# - profile_path：完整的 .prof 檔 (可用 snakeviz / pstats 開啟)
+# 觸發方式：API 路由加上 ?profile=true (需設定 TAOYUAN_PROFILE_ALLOW=1，否則回 403)、MCP 工具 profile_tool_call，
+# 或設定 TAOYUAN_PROFILE=1 讓工具呼叫都剖析並存檔 (回應內容不變)。
+# 同一時間只能有一個 cProfile 在執行 (Python 3.12 起 profiler 為整個 process 共用)，
+# 因此 TAOYUAN_PROFILE=1 時若已有其他呼叫正在剖析，這次呼叫直接執行、不剖析，而不是排隊等待。
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.environ.get("TAOYUAN_PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_ALL = os.environ.get("TAOYUAN_PROFILE", "0") == "1"
+PROFILE_ALLOW = os.environ.get("TAOYUAN_PROFILE_ALLOW", "0") == "1"   # 允許公開 API 以 ?profile=true 剖析
+PROFILE_KEEP = int(os.environ.get("TAOYUAN_PROFILE_KEEP", "50"))       # 目錄中最多保留幾份 .prof
+PROFILE_TOP = int(os.environ.get("TAOYUAN_PROFILE_TOP", "25"))         # 回傳前幾個函式
+
+# cProfile 同一時間只剖析一個呼叫，避免不同呼叫的統計混在一起
+_profile_lock = threading.Lock()
+
+
+def _stage_name(metric: str, labels: Dict[str, Any]) -> str:
+    if "stage" in labels:
+        return labels["stage"]
+    name = metric.removeprefix("taoyuan_").removesuffix("_seconds")
+    return f"{name}[{','.join(str(v) for v in labels.values())}]" if labels else name
+
+
+def _short_path(path: str) -> str:
+    if path.startswith(BASE_DIR):
+        return os.path.relpath(path, BASE_DIR)
+    parts = path.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+def _top_functions(stats: pstats.Stats, limit: int) -> List[Dict[str, Any]]:
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{_short_path(filename)}:{line}({name})" if line else name,
+            "calls": nc,
+            "tottime": round(tt, 6),
+            "cumtime": round(ct, 6),
+        }
+        for (filename, line, name), (cc, nc, tt, ct, callers) in rows
+    ]
+
+
+def _save(profiler: cProfile.Profile, tool: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{tool}.prof")
+    profiler.dump_stats(path)
+    existing = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".prof"))
+    for name in existing[:max(0, len(existing) - PROFILE_KEEP)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+    return path
+
+
+def profile_call(tool: str, fn: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """在 cProfile 下執行 fn，回傳 (原本的結果, 剖析報告)；其他呼叫正在剖析時會等待。"""
+    with _profile_lock:
+        return _profile_locked(tool, fn, *args, **kwargs)
+
+
+def _profile_locked(tool: str, fn: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    with metrics.trace() as records:
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            wall = time.perf_counter() - start
+
+    stages: Dict[str, float] = {}
+    for metric, labels, seconds in records:
+        key = _stage_name(metric, labels)
+        stages[key] = stages.get(key, 0.0) + seconds
+    report = {
+        "tool": tool,
+        "wall_seconds": round(wall, 6),
+        "stages": {k: round(v, 6) for k, v in sorted(stages.items(), key=lambda kv: kv[1], reverse=True)},
+        "top_functions": _top_functions(pstats.Stats(profiler), PROFILE_TOP),
+    }
+    try:
+        report["profile_path"] = _save(profiler, tool)
+    except OSError as e:
+        report["profile_path"] = None
+        sys.stderr.write(f"Failed to save profile: {e}\n")
+    return result, report
+
+
+def maybe_profile(tool: str, fn: Callable, *args, **kwargs) -> Any:
+    """TAOYUAN_PROFILE=1 時剖析並存檔 (只記錄 log，不改變回傳內容)，否則直接執行。
+    已有其他呼叫正在剖析時不等待，直接執行這次呼叫。"""
+    if not PROFILE_ALL or not _profile_lock.acquire(blocking=False):
+        return fn(*args, **kwargs)
+    try:
+        result, report = _profile_locked(tool, fn, *args, **kwargs)
+    finally:
+        _profile_lock.release()
+    stages = ", ".join(f"{k}={v * 1000:.1f}ms" for k, v in report["stages"].items())
+    sys.stderr.write(f"Profiled {tool}: {report['wall_seconds'] * 1000:.1f}ms ({stages}) -> {report['profile_path']}\n")
+    return result
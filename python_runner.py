@@ -1,10 +1,13 @@
-import sys
-import io
+import asyncio
 import re
 from mcp.server.fastmcp import FastMCP
 
+from sandbox_pool import CPU_LIMIT, CRASHED, MEMORY_LIMIT, OK, TIMEOUT, WorkerPool
+
 mcp = FastMCP("Python Runner (Safe Mode)")
-GLOBAL_STATE = {}
+# 程式碼在獨立的 worker process 執行 (已預先匯入 numpy / pandas)，變數保存在 worker 內
+pool = WorkerPool()
+DEFAULT_SESSION = "default"
 
 # 1. 定義危險關鍵字黑名單
 FORBIDDEN_KEYWORDS = [
@@ -29,11 +32,16 @@ def check_security(code: str):
         raise ValueError("Security Alert: 禁止匯入系統模組！")
 
 @mcp.tool()
-def run_python_cell(code: str) -> str:
+async def run_python_cell(code: str, session: str = DEFAULT_SESSION) -> str:
     """
     執行 Python 程式碼 (安全限制版)。
     可以進行運算、字串處理、邏輯判斷。
     ❌ 禁止：檔案讀寫、系統指令、刪除檔案。
+
+    Args:
+        code: 要執行的程式碼
+        session: Session 名稱 (英數字、底線、點與連字號)，不同 session 的變數互相隔離；
+                 閒置過久或 session 過多時，最久未使用的 session 會被回收
     """
     
     try:
@@ -41,47 +49,53 @@ def run_python_cell(code: str) -> str:
     except ValueError as e:
         return f"🚫 {str(e)}"
     
-    output_buffer = io.StringIO()
-    original_stdout = sys.stdout
-    
-    # 🔧 修正：正確處理 __builtins__
-    if isinstance(__builtins__, dict):
-        safe_builtins = __builtins__.copy()
-    else:
-        safe_builtins = __builtins__.__dict__.copy()
-    
-    # 移除危險函式
-    safe_builtins.pop('open', None)
-    safe_builtins.pop('exit', None)
-    safe_builtins.pop('quit', None)
-    
-    execution_globals = GLOBAL_STATE.copy()
-    execution_globals['__builtins__'] = safe_builtins
-    
+    # 等待 worker 時不卡住 MCP 的 event loop
     try:
-        sys.stdout = output_buffer
-        
-        exec(code, execution_globals)
-        
-        for key, value in execution_globals.items():
-            if key != '__builtins__':
-                GLOBAL_STATE[key] = value
-        
-        result = output_buffer.getvalue()
-        if not result:
+        result = await asyncio.to_thread(pool.run, session, code)
+    except ValueError as e:
+        return f"🚫 {str(e)}"
+    except RuntimeError as e:
+        return f"❌ 執行環境錯誤: {str(e)}"
+    
+    if result.status == OK:
+        if not result.output:
             return "✅ 執行成功 (無輸出內容)"
-        return result.strip()
-        
-    except Exception as e:
-        return f"❌ 執行錯誤: {str(e)}"
-        
-    finally:
-        sys.stdout = original_stdout
+        return result.output.strip()
+    if result.status in (TIMEOUT, CRASHED):
+        return f"⏱️ {result.error}，已重新啟動執行環境，先前的變數已清除。"
+    if result.status in (CPU_LIMIT, MEMORY_LIMIT):
+        return f"⛔ {result.error} (變數保留)。"
+    return f"❌ 執行錯誤: {result.error}"
 
 @mcp.tool()
-def clear_memory() -> str:
-    GLOBAL_STATE.clear()
+async def clear_memory(session: str = DEFAULT_SESSION) -> str:
+    await asyncio.to_thread(pool.reset, session)
     return "記憶體已清除。"
 
+@mcp.tool()
+async def close_session(session: str) -> str:
+    """結束 session 並釋放其執行環境 (變數全部清除)。"""
+    if await asyncio.to_thread(pool.close_session, session):
+        return f"Session '{session}' 已關閉。"
+    return f"Session '{session}' 不存在。"
+
+@mcp.tool()
+def list_sessions() -> str:
+    """
+    列出目前的 session 與記憶體用量 (最近使用的在前)。
+    memory_mb 為最後一次執行後 worker 的常駐記憶體。
+    """
+    sessions = pool.list_sessions()
+    stats = pool.stats()
+    if not sessions:
+        return "目前沒有 session。"
+    lines = [f"Session 數: {stats['sessions']} / {stats['max_sessions']} (閒置 {stats['idle_timeout']:g} 秒後回收)"]
+    for s in sessions:
+        memory = f"{s['memory_mb']} MB" if s["memory_mb"] is not None else "未知"
+        busy = " (執行中)" if s["busy"] else ""
+        lines.append(f"- {s['session']}{busy}: 記憶體 {memory}, 變數 {s['variables']} 個, 已執行 {s['cells']} 個 cell, 閒置 {s['idle_seconds']:g} 秒")
+    return "\n".join(lines)
+
 if __name__ == "__main__":
+    pool.start()  # 不等第一個 cell，先在背景啟動備用 worker
     mcp.run()
\ No newline at end of file
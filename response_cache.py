@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, NamedTuple, Optional
+
+# 上游統計資料的本機快取 (SQLite)
+# 年報資料一年只會更新幾次，因此將每一組 (tid, cid, sid, begin, end) 的回應
+# 壓縮後存入 SQLite，重新啟動 Server 後仍然有效。
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.environ.get("TAOYUAN_CACHE_PATH", os.path.join(BASE_DIR, "data", "cache.sqlite3"))
+CACHE_TTL = int(os.environ.get("TAOYUAN_CACHE_TTL", str(7 * 24 * 3600)))           # 預設 7 天
+CACHE_MAX_BYTES = int(os.environ.get("TAOYUAN_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 預設 256 MB
+# 過期後仍保留一段時間，期間內可先回傳舊資料並在背景更新 (stale-while-revalidate)
+CACHE_STALE_TTL = int(os.environ.get("TAOYUAN_CACHE_STALE_TTL", str(24 * 3600)))        # 預設 1 天
+
+
+def make_key(tid: str, cid: str, sid: str, begin: str, end: str) -> str:
+    return f"{tid}:{cid}:{sid}:{begin}:{end}"
+
+
+class CacheEntry(NamedTuple):
+    data: Any
+    etag: str       # 壓縮後內容的雜湊，內容不變則 ETag 不變
+    expires: float
+    stale: bool = False
+
+
+def payload_etag(payload: bytes) -> str:
+    return hashlib.sha1(payload).hexdigest()[:20]
+
+
+class ResponseCache:
+    """以 SQLite 儲存壓縮 JSON 的持久化快取，支援 TTL 與總容量上限 (LRU 淘汰)。"""
+
+    def __init__(self, path: str = CACHE_PATH, ttl: int = CACHE_TTL, max_bytes: int = CACHE_MAX_BYTES, stale_ttl: int = CACHE_STALE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " payload BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " expires REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """取得快取資料；不存在或已過期時回傳 None。"""
+        entry = self.get_entry(key)
+        return None if entry is None else entry.data
+
+    def get_entry(self, key: str, allow_stale: bool = False) -> Optional[CacheEntry]:
+        """同 get()，另外附上 ETag 與到期時間 (供 HTTP 快取標頭使用)。
+
+        allow_stale=True 時，已過期但仍在 stale_ttl 保留期內的資料也會回傳 (stale=True)。
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT payload, expires FROM entries WHERE key = ?", (key,)).fetchone()
+                stale = row is not None and row[1] <= now
+                if row is None or (stale and not (allow_stale and row[1] + self.stale_ttl > now)):
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+                if stale:
+                    self.stale_hits += 1
+                else:
+                    self.hits += 1
+            return CacheEntry(json.loads(zlib.decompress(row[0]).decode("utf-8")), payload_etag(row[0]), row[1], stale)
+        except Exception as e:
+            sys.stderr.write(f"Cache read error: {e}\n")
+            return None
+
+    def expiry(self, key: str) -> Optional[float]:
+        """只查詢到期時間 (不解壓縮內容，也不計入命中率)；不存在時回傳 None。"""
+        try:
+            with self._lock:
+                row = self._connect().execute("SELECT expires FROM entries WHERE key = ?", (key,)).fetchone()
+            return None if row is None else row[0]
+        except Exception as e:
+            sys.stderr.write(f"Cache read error: {e}\n")
+            return None
+
+    def set(self, key: str, data: Any, ttl: Optional[int] = None) -> CacheEntry:
+        """寫入快取，必要時依最後存取時間淘汰舊資料；回傳寫入的 entry (含 ETag)。"""
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        payload = zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        entry = CacheEntry(data, payload_etag(payload), now + ttl)
+        if len(payload) > self.max_bytes:
+            return entry
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, payload, size, created, expires, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), now, entry.expires, now),
+                )
+                self._evict(conn)
+        except Exception as e:
+            sys.stderr.write(f"Cache write error: {e}\n")
+        return entry
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        # 先清掉超過保留期的過期資料，再依 LRU 淘汰直到總容量低於上限
+        cur = conn.execute("DELETE FROM entries WHERE expires <= ?", (time.time() - self.stale_ttl,))
+        self.evictions += max(cur.rowcount, 0)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "total_bytes": total,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "stale_ttl_seconds": self.stale_ttl,
+            "path": self.path,
+        }
@@ -0,0 +1,510 @@
+import atexit
+import builtins
+import contextlib
+import importlib
+import io
+import math
+import multiprocessing
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+try:
+    import resource  # Unix only：CPU 時間 / 記憶體上限
+except ImportError:
+    resource = None
+
+# python_runner 的執行環境 (worker process pool)
+# 程式碼不在 MCP Server 的 process 內 exec，而是交給預先啟動、已匯入 numpy / pandas 的 worker：
+# - 每個 session 綁定一個 worker，變數直接保存在 worker 內，不必每次複製進出
+# - 每個 cell 有 CPU 時間與記憶體上限 (RLIMIT_CPU / RLIMIT_AS，僅 Unix)，超過時只中止該 cell
+# - 超過實際時間上限 (例如 while True + sleep) 時直接終止 worker，session 改用備用的 worker
+# 平時保留 RUNNER_POOL_SIZE 個閒置 worker，逾時重啟或新 session 不必等待匯入套件。
+# 多個 agent 同時使用時以 session 名稱區隔：每個 session 有記憶體總量上限，
+# 閒置超過 SESSION_IDLE_TIMEOUT 或 session 數超過 MAX_SESSIONS 時，最久未使用的 session 會被回收。
+
+RUNNER_POOL_SIZE = int(os.environ.get("TAOYUAN_RUNNER_POOL_SIZE", "2"))         # 閒置備用的 worker 數
+CELL_TIMEOUT = float(os.environ.get("TAOYUAN_CELL_TIMEOUT", "30"))              # 實際時間上限 (秒)
+CELL_CPU_SECONDS = int(os.environ.get("TAOYUAN_CELL_CPU_SECONDS", "20"))        # CPU 時間上限 (秒)
+CELL_MEMORY_MB = int(os.environ.get("TAOYUAN_CELL_MEMORY_MB", "1024"))          # 單一 cell 可額外使用的記憶體
+SESSION_MEMORY_MB = int(os.environ.get("TAOYUAN_SESSION_MEMORY_MB", "2048"))    # 單一 session 累計可使用的記憶體
+SESSION_IDLE_TIMEOUT = float(os.environ.get("TAOYUAN_SESSION_IDLE_TIMEOUT", "1800"))  # 閒置多久回收 (秒)
+MAX_SESSIONS = int(os.environ.get("TAOYUAN_MAX_SESSIONS", "8"))
+MAX_OUTPUT_CHARS = int(os.environ.get("TAOYUAN_CELL_MAX_OUTPUT", "100000"))
+PRELOAD_MODULES = ("numpy", "pandas")
+
+# 從 builtins 移除的函式 (檔案讀寫 / 結束 process)
+REMOVED_BUILTINS = ("open", "exit", "quit")
+
+OK, ERROR, CPU_LIMIT, MEMORY_LIMIT, TIMEOUT, CRASHED = "ok", "error", "cpu_limit", "memory_limit", "timeout", "crashed"
+
+_SESSION_NAME = re.compile(r"^[\w.-]{1,64}$")
+_MB = 1024 * 1024
+
+
+class CellResult(NamedTuple):
+    status: str
+    output: str
+    error: Optional[str] = None
+    rss: Optional[int] = None        # 執行後 worker 的常駐記憶體 (bytes)
+    variables: Optional[int] = None  # 執行後 namespace 中的變數數量
+
+
+# --- Worker process ---
+
+class _CpuLimitExceeded(BaseException):  # 避免被 cell 內的 except Exception 吞掉
+    pass
+
+
+def _on_cpu_limit(signum, frame):
+    raise _CpuLimitExceeded()
+
+
+def _new_namespace() -> Dict[str, Any]:
+    safe_builtins = dict(vars(builtins))
+    for name in REMOVED_BUILTINS:
+        safe_builtins.pop(name, None)
+    return {"__builtins__": safe_builtins}
+
+
+def _statm(field: int) -> Optional[int]:
+    # /proc/self/statm：0 = 虛擬記憶體 (address space)，1 = 常駐記憶體 (RSS)，單位為 page
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[field]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+def _address_space() -> Optional[int]:
+    return _statm(0)
+
+
+def _resident() -> Optional[int]:
+    rss = _statm(1)
+    if rss is None and resource is not None:
+        # 沒有 /proc 時以峰值代替 (macOS 單位為 bytes，Linux 為 KB)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss = peak if sys.platform == "darwin" else peak * 1024
+    return rss
+
+
+def _footprint(namespace: Dict[str, Any]) -> Dict[str, Any]:
+    return {"rss": _resident(), "variables": sum(1 for k in namespace if not k.startswith("__"))}
+
+
+def _apply_limits(cpu_seconds: int, memory_mb: int, ceiling: Optional[int] = None):
+    """以目前用量為基準設定本次 cell 的上限 (不超過 session 的總上限 ceiling)，回傳原本的 soft limit 以便還原。"""
+    if resource is None:
+        return None
+    saved = {}
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    target = math.ceil(usage.ru_utime + usage.ru_stime + cpu_seconds)
+    if hard == resource.RLIM_INFINITY or target <= hard:
+        saved[resource.RLIMIT_CPU] = (soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (target, hard))
+    current = _address_space()
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if current is not None:
+        target = current + memory_mb * _MB
+        if ceiling is not None:
+            target = max(current, min(target, ceiling))
+        if hard == resource.RLIM_INFINITY or target <= hard:
+            saved[resource.RLIMIT_AS] = (soft, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (target, hard))
+    return saved
+
+
+def _restore_limits(saved) -> None:
+    for kind, limits in (saved or {}).items():
+        resource.setrlimit(kind, limits)
+
+
+def _truncate(text: str) -> str:
+    if len(text) <= MAX_OUTPUT_CHARS:
+        return text
+    return text[:MAX_OUTPUT_CHARS] + f"\n... (輸出過長，已截斷，共 {len(text)} 字元)"
+
+
+def _run_cell(namespace: Dict[str, Any], code: str, cpu_seconds: int, memory_mb: int, ceiling: Optional[int] = None) -> CellResult:
+    buffer = io.StringIO()
+    saved = None
+    try:
+        saved = _apply_limits(cpu_seconds, memory_mb, ceiling)
+        with contextlib.redirect_stdout(buffer):
+            exec(code, namespace)
+        return CellResult(OK, _truncate(buffer.getvalue()))
+    except _CpuLimitExceeded:
+        return CellResult(CPU_LIMIT, _truncate(buffer.getvalue()), f"CPU 時間超過 {cpu_seconds} 秒，已中止")
+    except MemoryError:
+        return CellResult(MEMORY_LIMIT, _truncate(buffer.getvalue()), f"記憶體使用超過上限 (單一 cell {memory_mb} MB / 整個 session 另有總量上限)，已中止")
+    except BaseException as e:  # SystemExit / KeyboardInterrupt 也只結束這個 cell
+        return CellResult(ERROR, _truncate(buffer.getvalue()), str(e) or type(e).__name__)
+    finally:
+        _restore_limits(saved)
+
+
+def _worker_main(conn, cpu_seconds: int, memory_mb: int, session_mb: int, preload) -> None:
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    if resource is not None and hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    # session 的記憶體上限以套件載入完成後的用量為基準
+    baseline = _address_space()
+    ceiling = baseline + session_mb * _MB if baseline is not None else None
+    namespace = _new_namespace()
+    conn.send(CellResult(OK, "ready", **_footprint(namespace)))
+    while True:
+        try:
+            op, payload = conn.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            return
+        if op == "run":
+            result = _run_cell(namespace, payload, cpu_seconds, memory_mb, ceiling)
+            conn.send(result._replace(**_footprint(namespace)))
+        elif op == "reset":
+            namespace = _new_namespace()
+            conn.send(CellResult(OK, "", **_footprint(namespace)))
+        else:
+            return
+
+
+# --- Parent side ---
+
+def _get_context():
+    # forkserver：server process 先匯入 numpy / pandas，之後的 worker 由它 fork 出來，啟動幾乎不需時間；
+    # 不支援 forkserver 的平台 (Windows) 退回 spawn，由 worker 自行匯入。
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__, *PRELOAD_MODULES])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class _Worker:
+    def __init__(self, ctx, cpu_seconds: int, memory_mb: int, session_mb: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, cpu_seconds, memory_mb, session_mb, PRELOAD_MODULES),
+            name="python-runner-worker", daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: float) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            try:
+                self.ready = self.conn.recv().status == OK
+            except (EOFError, OSError):
+                return False
+        return self.ready
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def call(self, op: str, payload: Any, timeout: float) -> CellResult:
+        try:
+            self.conn.send((op, payload))
+            if not self.conn.poll(timeout):
+                return CellResult(TIMEOUT, "", f"執行超過 {timeout:g} 秒")
+            return self.conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            return CellResult(CRASHED, "", "執行環境意外結束 (可能超過記憶體上限)")
+
+    def kill(self) -> None:
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+
+
+class _Session:
+    __slots__ = ("name", "lock", "worker", "created", "last_used", "cells", "rss", "variables", "closed")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.worker: Optional[_Worker] = None
+        self.created = self.last_used = time.time()
+        self.cells = 0
+        self.rss = None
+        self.variables = 0
+        self.closed = False
+
+    def info(self, now: float) -> Dict[str, Any]:
+        return {
+            "session": self.name,
+            "memory_mb": round(self.rss / _MB, 1) if self.rss is not None else None,
+            "variables": self.variables,
+            "cells": self.cells,
+            "idle_seconds": round(now - self.last_used, 1),
+            "age_seconds": round(now - self.created, 1),
+            "busy": self.lock.locked(),
+        }
+
+
+class WorkerPool:
+    """session 名稱 -> 專屬 worker (LRU 順序)；另外保留 size 個已就緒的備用 worker。"""
+
+    def __init__(
+        self,
+        size: int = RUNNER_POOL_SIZE,
+        cell_timeout: float = CELL_TIMEOUT,
+        cpu_seconds: int = CELL_CPU_SECONDS,
+        memory_mb: int = CELL_MEMORY_MB,
+        session_memory_mb: int = SESSION_MEMORY_MB,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+        max_sessions: int = MAX_SESSIONS,
+        startup_timeout: float = 120.0,
+    ):
+        self.size = max(0, size)
+        self.cell_timeout = cell_timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.session_memory_mb = session_memory_mb
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max(1, max_sessions)
+        self.startup_timeout = startup_timeout
+        self._ctx = None
+        self._lock = threading.Lock()
+        self._spares: List[_Worker] = []
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._closed = False
+        self._stop = threading.Event()
+        self._reaper = None
+        self._started = False
+        self.cells = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.spawned = 0
+        self.evicted = 0
+
+    # --- 備用 worker ---
+
+    def _spawn(self) -> _Worker:
+        with self._lock:
+            if self._ctx is None:
+                self._ctx = _get_context()
+            self.spawned += 1
+        return _Worker(self._ctx, self.cpu_seconds, self.memory_mb, self.session_memory_mb)
+
+    def _replenish(self) -> None:
+        while True:
+            with self._lock:
+                if self._closed or len(self._spares) >= self.size:
+                    return
+            worker = self._spawn()
+            if not worker.wait_ready(self.startup_timeout):
+                worker.kill()
+                return
+            with self._lock:
+                # 另一個補充 thread 可能已補滿
+                keep = not self._closed and len(self._spares) < self.size
+                if keep:
+                    self._spares.append(worker)
+            if not keep:
+                worker.kill()
+                return
+
+    def _replenish_async(self) -> None:
+        threading.Thread(target=self._replenish, name="python-runner-pool", daemon=True).start()
+
+    def start(self) -> None:
+        """在背景預先啟動備用 worker，並定期回收閒置的 session (不阻塞呼叫端)。
+
+        第一次建立 session 時會自動呼叫；重複呼叫不會有作用。結束 process 時自動關閉所有 worker。
+        """
+        with self._lock:
+            if self._started or self._closed:
+                return
+            self._started = True
+            if self.idle_timeout > 0:
+                self._reaper = threading.Thread(target=self._reap_loop, name="python-runner-reaper", daemon=True)
+                self._reaper.start()
+        atexit.register(self.shutdown)
+        self._replenish_async()
+
+    def _take(self) -> _Worker:
+        with self._lock:
+            while self._spares:
+                worker = self._spares.pop()
+                if worker.alive():
+                    break
+                worker.kill()
+            else:
+                worker = None
+        self._replenish_async()
+        if worker is None:
+            worker = self._spawn()
+            if not worker.wait_ready(self.startup_timeout):
+                worker.kill()
+                raise RuntimeError("Python worker failed to start")
+        return worker
+
+    # --- session 管理 ---
+
+    def _get_session(self, name: str) -> _Session:
+        if not _SESSION_NAME.match(name or ""):
+            raise ValueError("Session 名稱只能包含英數字、底線、點與連字號 (最長 64 字元)")
+        self.start()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("WorkerPool is shut down")
+            session = self._sessions.get(name)
+            if session is None:
+                session = self._sessions[name] = _Session(name)
+            self._sessions.move_to_end(name)
+        self._evict_over_limit(keep=session)
+        return session
+
+    def _close(self, session: _Session) -> None:
+        """呼叫端必須持有 session.lock"""
+        session.closed = True
+        with self._lock:
+            if self._sessions.get(session.name) is session:
+                del self._sessions[session.name]
+        if session.worker is not None:
+            session.worker.kill()
+            session.worker = None
+
+    def _try_evict(self, session: _Session) -> bool:
+        # 正在執行的 session 不回收
+        if not session.lock.acquire(blocking=False):
+            return False
+        try:
+            if session.closed:
+                return False
+            self._close(session)
+        finally:
+            session.lock.release()
+        with self._lock:
+            self.evicted += 1
+        return True
+
+    def _evict_over_limit(self, keep: _Session) -> None:
+        with self._lock:
+            excess = len(self._sessions) - self.max_sessions
+            candidates = [s for s in self._sessions.values() if s is not keep]  # 由最久未使用開始
+        for session in candidates:
+            if excess <= 0:
+                break
+            if self._try_evict(session):
+                excess -= 1
+
+    def reap_idle(self) -> int:
+        """回收閒置超過 idle_timeout 的 session，回傳回收數量。"""
+        now = time.time()
+        with self._lock:
+            idle = [s for s in self._sessions.values() if now - s.last_used > self.idle_timeout]
+        return sum(1 for s in idle if self._try_evict(s))
+
+    def _reap_loop(self) -> None:
+        interval = max(1.0, min(60.0, self.idle_timeout / 2))
+        while not self._stop.wait(interval):
+            self.reap_idle()
+
+    # --- 執行 ---
+
+    def run(self, session: str, code: str) -> CellResult:
+        """在 session 的 worker 執行程式碼；逾時或 worker 結束時該 session 的變數會被清除。"""
+        while True:
+            current = self._get_session(session)
+            with current.lock:
+                if current.closed:
+                    continue  # 剛好被回收，重新建立
+                if current.worker is None or not current.worker.alive():
+                    current.worker = self._take()
+                result = current.worker.call("run", code, self.cell_timeout)
+                current.last_used = time.time()
+                current.cells += 1
+                with self._lock:
+                    self.cells += 1
+                    if result.status == TIMEOUT:
+                        self.timeouts += 1
+                    elif result.status == CRASHED:
+                        self.crashes += 1
+                if result.status in (TIMEOUT, CRASHED):
+                    current.worker.kill()
+                    current.worker = None
+                    current.rss, current.variables = None, 0
+                else:
+                    current.rss, current.variables = result.rss, result.variables
+                return result
+
+    def reset(self, session: str) -> None:
+        """清除 session 的變數 (worker 保留，不必重新啟動)。"""
+        with self._lock:
+            current = self._sessions.get(session)
+        if current is None:
+            return
+        with current.lock:
+            if current.closed or current.worker is None:
+                return
+            result = current.worker.call("reset", None, self.cell_timeout)
+            current.last_used = time.time()
+            if result.status == OK:
+                current.rss, current.variables = result.rss, result.variables
+            else:
+                current.worker.kill()
+                current.worker = None
+                current.rss, current.variables = None, 0
+
+    def close_session(self, session: str) -> bool:
+        with self._lock:
+            current = self._sessions.get(session)
+        if current is None:
+            return False
+        with current.lock:
+            if current.closed:
+                return False
+            self._close(current)
+        return True
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """各 session 的記憶體用量 (最後一次執行後的 worker RSS)、變數數量與閒置時間，最近使用的在前。"""
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [s.info(now) for s in reversed(sessions)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "spare_workers": len(self._spares),
+                "cells": self.cells,
+                "timeouts": self.timeouts,
+                "crashes": self.crashes,
+                "evicted": self.evicted,
+                "spawned": self.spawned,
+                "cell_timeout": self.cell_timeout,
+                "idle_timeout": self.idle_timeout,
+                "cpu_seconds": self.cpu_seconds if resource is not None else None,
+                "memory_mb": self.memory_mb if resource is not None else None,
+                "session_memory_mb": self.session_memory_mb if resource is not None else None,
+            }
+
+    def shutdown(self) -> None:
+        atexit.unregister(self.shutdown)
+        self._stop.set()
+        with self._lock:
+            self._closed = True
+            workers = self._spares + [s.worker for s in self._sessions.values() if s.worker is not None]
+            self._spares, self._sessions = [], OrderedDict()
+        for worker in workers:
+            worker.kill()
@@ -13,60 +13,141 @@ function initDashboard() {
         return;
     }
 
+    // Server 端已預先彙整成欄式資料 (columnar-v1)；舊格式 (原始資料列) 在瀏覽器端轉換
+    const model = dataObj.format === 'columnar-v1' ? dataObj : toColumnar(dataObj);
+
     // 1. Process Metadata
-    const title = dataObj.EffectiveComplexName || dataObj.Header || "統計資料";
+    const title = model.title || "統計資料";
     document.getElementById('page-title').textContent = title;
 
-    const rawData = dataObj.Data || [];
-    if (rawData.length === 0) {
+    if (model.totalRecords === 0) {
         document.getElementById('table-body').innerHTML = '<tr><td colspan="5">無詳細資料</td></tr>';
         return;
     }
 
-    document.getElementById('total-records').textContent = rawData.length.toLocaleString();
+    document.getElementById('total-records').textContent = model.totalRecords.toLocaleString();
 
     // Get Year Range
-    const years = [...new Set(rawData.map(d => d.DataDate))].sort();
+    const years = model.years;
     if (years.length > 0) {
         document.getElementById('year-range').textContent = years.length > 1
             ? `${years[0]} - ${years[years.length - 1]}`
             : years[0];
     }
 
-    // 2. Identify Metrics (ComplexName1)
-    // Sometimes ComplexName1 is the Metric, ComplexName2 is the District/Category.
-    const metrics = [...new Set(rawData.map(d => d.ComplexName1))].filter(Boolean);
+    // 2. Metrics (ComplexName1), already deduplicated by the server
+    const metrics = model.metrics;
 
     // Setup Dropdown if multiple metrics
     const metricSelect = document.getElementById('metric-select');
     const controlsPanel = document.getElementById('controls-panel');
 
-    let currentMetric = metrics[0] || "Value";
-
     if (metrics.length > 1) {
         controlsPanel.style.display = 'block';
         metricSelect.innerHTML = '';
-        metrics.forEach(m => {
+        metrics.forEach((m, index) => {
             const opt = document.createElement('option');
-            opt.value = m;
+            opt.value = index;
             opt.textContent = m;
             metricSelect.appendChild(opt);
         });
         metricSelect.addEventListener('change', (e) => {
-            currentMetric = e.target.value;
-            renderView(rawData, currentMetric, years);
+            renderView(model, Number(e.target.value));
         });
     }
 
     // Initial Render
-    renderView(rawData, currentMetric, years);
+    if (metrics.length > 0) {
+        renderView(model, 0);
+    }
+}
+
+// 將原始資料列 ({Data: [...]}) 轉成與 server 端相同的欄式結構
+function toColumnar(dataObj) {
+    const rawData = dataObj.Data || [];
+    const valueName = (dataObj.Header && dataObj.Header.FValueHeaderName) || '數值';
+    const encode = (values) => {
+        const labels = [];
+        const lookup = new Map();
+        const codes = values.map(v => {
+            if (!lookup.has(v)) {
+                lookup.set(v, labels.length);
+                labels.push(v);
+            }
+            return lookup.get(v);
+        });
+        return { labels, codes };
+    };
+    const text = (v) => (v === null || v === undefined) ? '' : String(v);
+
+    const years = [...new Set(rawData.map(d => text(d.DataDate)))].sort();
+    const yearIndex = new Map(years.map((y, i) => [y, i]));
+    const metric = encode(rawData.map(d => text(d.ComplexName1) || valueName));
+    const district = encode(rawData.map(d => text(d.ComplexName2)));
+    const place = encode(rawData.map(d => text(d.PlaceName)));
+
+    // 依指標分組 (保持原順序)
+    const order = rawData.map((_, i) => i).sort((a, b) => metric.codes[a] - metric.codes[b] || a - b);
+    const toNumber = (v) => (v === null || v === '' || isNaN(Number(v))) ? null : Number(v);
+    const columns = {
+        year: order.map(i => yearIndex.get(text(rawData[i].DataDate))),
+        district: order.map(i => district.codes[i]),
+        place: order.map(i => place.codes[i]),
+        value: order.map(i => toNumber(rawData[i].FValue)),
+    };
+
+    const metricOffsets = [0];
+    const stats = [];
+    const series = [];
+    metric.labels.forEach((_, m) => {
+        let end = metricOffsets[m];
+        while (end < order.length && metric.codes[order[end]] === m) end++;
+        metricOffsets.push(end);
+
+        const rows = [];
+        for (let r = metricOffsets[m]; r < end; r++) rows.push(r);
+        const valid = rows.filter(r => columns.value[r] !== null);
+        const sum = valid.reduce((acc, r) => acc + columns.value[r], 0);
+        const top = [...valid].sort((a, b) => columns.value[b] - columns.value[a]).slice(0, 10);
+        stats.push({ sum, avg: valid.length ? sum / valid.length : null, count: valid.length, top });
+
+        const grid = district.labels.map(() => years.map(() => undefined));
+        rows.forEach(r => {
+            const cell = grid[columns.district[r]];
+            if (cell[columns.year[r]] === undefined) cell[columns.year[r]] = columns.value[r];
+        });
+        series.push(grid.map(row => row.map(v => v === undefined ? null : v)));
+    });
+
+    return {
+        format: 'columnar-v1',
+        title: dataObj.EffectiveComplexName || '',
+        header: dataObj.Header || {},
+        totalRecords: rawData.length,
+        years,
+        metrics: metric.labels,
+        districts: district.labels,
+        places: place.labels,
+        metricOffsets,
+        columns,
+        stats,
+        series,
+    };
 }
 
 let chartInstance = null;
 
-function renderView(allData, metric, years) {
-    // Filter data for current metric
-    const filteredData = allData.filter(d => d.ComplexName1 === metric);
+function formatValue(v) {
+    return v === null || v === undefined ? '-' : v.toLocaleString();
+}
+
+function renderView(model, metricIndex) {
+    const metric = model.metrics[metricIndex];
+    const cols = model.columns;
+    const start = model.metricOffsets[metricIndex];
+    const end = model.metricOffsets[metricIndex + 1];
+    const stats = model.stats[metricIndex];
+    const years = model.years;
 
     // Update Chart Title
     document.getElementById('chart-title').textContent = metric;
@@ -75,48 +156,34 @@ function renderView(allData, metric, years) {
     const tableHead = document.getElementById('table-header');
     const tableBody = document.getElementById('table-body');
 
-    // Dynamic Columns
-    const columns = [
-        { key: 'DataDate', label: '年度' },
-        { key: 'PlaceName', label: '地點' },
-        { key: 'ComplexName2', label: '細項/地區' },
-        { key: 'FValue', label: '數值' }
-    ];
-
-    tableHead.innerHTML = columns.map(c => `<th>${c.label}</th>`).join('');
+    const columns = ['年度', '地點', '細項/地區', '數值'];
+    tableHead.innerHTML = columns.map(c => `<th>${c}</th>`).join('');
 
-    tableBody.innerHTML = filteredData.map(row => `
+    const rowsHtml = [];
+    for (let r = start; r < end; r++) {
+        rowsHtml.push(`
         <tr>
-            ${columns.map(c => `<td>${row[c.key] || '-'}</td>`).join('')}
-        </tr>
-    `).join('');
-
-    // --- Stats & Ranking Calculation ---
-    // Calculate based on the filtered data set
-
-    // 1. Sort by Value for Ranking
-    // Create a copy to avoid affecting other views if needed, though here we want mostly sorted data
-    const sortedData = [...filteredData].sort((a, b) => b.FValue - a.FValue);
-
-    // 2. Calculate Stats
-    const totalVal = sortedData.reduce((acc, curr) => acc + curr.FValue, 0);
-    const avgVal = sortedData.length > 0 ? totalVal / sortedData.length : 0;
-    const maxItem = sortedData.length > 0 ? sortedData[0] : null;
-
-    // Render Stats
-    document.getElementById('stat-sum').textContent = totalVal.toLocaleString(undefined, { maximumFractionDigits: 1 });
-    document.getElementById('stat-avg').textContent = avgVal.toLocaleString(undefined, { maximumFractionDigits: 1 });
-    if (maxItem) {
-        document.getElementById('stat-max').textContent = `${maxItem.FValue.toLocaleString()} (${maxItem.ComplexName2} - ${maxItem.DataDate})`;
+            <td>${years[cols.year[r]] || '-'}</td>
+            <td>${model.places[cols.place[r]] || '-'}</td>
+            <td>${model.districts[cols.district[r]] || '-'}</td>
+            <td>${formatValue(cols.value[r])}</td>
+        </tr>`);
+    }
+    tableBody.innerHTML = rowsHtml.join('');
+
+    // --- Stats & Ranking (precomputed) ---
+    document.getElementById('stat-sum').textContent = stats.sum === null ? '-' : stats.sum.toLocaleString(undefined, { maximumFractionDigits: 1 });
+    document.getElementById('stat-avg').textContent = stats.avg === null ? '-' : stats.avg.toLocaleString(undefined, { maximumFractionDigits: 1 });
+    if (stats.top.length > 0) {
+        const r = stats.top[0];
+        document.getElementById('stat-max').textContent = `${formatValue(cols.value[r])} (${model.districts[cols.district[r]]} - ${years[cols.year[r]]})`;
     } else {
         document.getElementById('stat-max').textContent = '-';
     }
 
     // Render Ranking Table (Top 10)
     const rankingBody = document.getElementById('ranking-body');
-    const top10 = sortedData.slice(0, 10);
-
-    rankingBody.innerHTML = top10.map((d, index) => {
+    rankingBody.innerHTML = stats.top.map((r, index) => {
         // Highlight top 3
         let icon = '';
         if (index === 0) icon = '🥇 ';
@@ -126,8 +193,8 @@ function renderView(allData, metric, years) {
         return `
             <tr>
                 <td>${icon}${index + 1}</td>
-                <td>${d.ComplexName2} <span style="font-size:0.8em; color:#64748b">(${d.DataDate})</span></td>
-                <td style="text-align: right; font-family: monospace;">${d.FValue.toLocaleString()}</td>
+                <td>${model.districts[cols.district[r]]} <span style="font-size:0.8em; color:#64748b">(${years[cols.year[r]]})</span></td>
+                <td style="text-align: right; font-family: monospace;">${formatValue(cols.value[r])}</td>
             </tr>
         `;
     }).join('');
@@ -141,34 +208,23 @@ function renderView(allData, metric, years) {
     // If single year, use Bar chart of distribution (ComplexName2)
 
     const isMultiYear = years.length > 1;
+    const grid = model.series[metricIndex];
 
     if (isMultiYear) {
         // Line Chart: X = Year, Series = ComplexName2 (District)
-        const districts = [...new Set(filteredData.map(d => d.ComplexName2))];
-
-        // Limit series to top 10 to avoid clutter? Or show all.
-        // Let's show all for now, maybe filteredData is not too huge.
-
-        const datasets = districts.map((dist, index) => {
-            const distData = filteredData.filter(d => d.ComplexName2 === dist);
-            // Sort by date
-            distData.sort((a, b) => a.DataDate.localeCompare(b.DataDate));
-
-            // Map years to values
-            const dataPoints = years.map(y => {
-                const record = distData.find(d => d.DataDate === y);
-                return record ? record.FValue : null;
-            });
-
-            const color = getChartColor(index);
-            return {
-                label: dist,
-                data: dataPoints,
+        // 只畫出這個指標有資料的地區
+        const datasets = [];
+        grid.forEach((points, districtIndex) => {
+            if (points.every(v => v === null)) return;
+            const color = getChartColor(datasets.length);
+            datasets.push({
+                label: model.districts[districtIndex],
+                data: points,
                 borderColor: color,
                 backgroundColor: color,
                 tension: 0.1,
                 fill: false
-            };
+            });
         });
 
         chartInstance = new Chart(ctx, {
@@ -203,20 +259,19 @@ function renderView(allData, metric, years) {
 
     } else {
         // Bar Chart: X = District (ComplexName2), Y = Value
-        // Sort by Value DESC
-        // Note: sortedData is already sorted, but filteredData might not be. 
-        // Let's use sortedData for the chart to match the ranking table order.
-
-        const labels = sortedData.map(d => d.ComplexName2);
-        const values = sortedData.map(d => d.FValue);
+        // Sort by Value DESC to match the ranking table order.
+        const bars = grid
+            .map((points, districtIndex) => ({ label: model.districts[districtIndex], value: points[0] }))
+            .filter(b => b.value !== null)
+            .sort((a, b) => b.value - a.value);
 
         chartInstance = new Chart(ctx, {
             type: 'bar',
             data: {
-                labels: labels,
+                labels: bars.map(b => b.label),
                 datasets: [{
                     label: metric,
-                    data: values,
+                    data: bars.map(b => b.value),
                     backgroundColor: 'rgba(59, 130, 246, 0.7)',
                     borderColor: '#3b82f6',
                     borderWidth: 1,
@@ -0,0 +1,132 @@
+import re
+from typing import Any, Dict, Iterable, List, Set
+
+# 統計目錄的 n-gram 倒排索引
+# 中文沒有斷詞邊界，因此以「字元 unigram + bigram」為索引單位：
+# 查詢字串拆成 bigram 後取 posting list 交集得到候選，再以子字串比對確認，
+# 最後依比對品質排序，而不是依 CSV 的原始順序。
+
+SEARCH_FIELDS = ("資料名稱", "所屬類別")
+NAME_FIELD = "資料名稱"
+CATEGORY_FIELD = "所屬類別"
+
+_OR_TOKENS = {"or", "|", "或"}
+
+
+def normalize(text: Any) -> str:
+    if text is None or (isinstance(text, float) and text != text):  # NaN
+        return ""
+    return str(text).strip().casefold()
+
+
+def ngrams(text: str) -> Set[str]:
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def parse_query(query: str) -> List[List[str]]:
+    """將查詢字串拆成 OR 群組，每個群組內為 AND 關鍵字。
+
+    "交通 事故"        -> [["交通", "事故"]]
+    "人口 OR 戶數"     -> [["人口"], ["戶數"]]
+    "人口|戶數 桃園"   -> [["人口"], ["戶數", "桃園"]]
+    """
+    groups: List[List[str]] = [[]]
+    for token in re.split(r"(\s+|\|)", query):
+        token = token.strip()
+        if not token:
+            continue
+        if normalize(token) in _OR_TOKENS:
+            if groups[-1]:
+                groups.append([])
+            continue
+        groups[-1].append(normalize(token))
+    return [g for g in groups if g]
+
+
+class NgramIndex:
+    def __init__(self, records: List[Dict[str, Any]], fields: Iterable[str] = SEARCH_FIELDS):
+        self.records = records
+        self.fields = tuple(fields)
+        self.names = [normalize(r.get(NAME_FIELD)) for r in records]
+        self.categories = [normalize(r.get(CATEGORY_FIELD)) for r in records]
+        self.postings: Dict[str, Set[int]] = {}
+        for doc_id, record in enumerate(records):
+            for field in self.fields:
+                for gram in ngrams(normalize(record.get(field))):
+                    self.postings.setdefault(gram, set()).add(doc_id)
+
+    def to_columns(self) -> Dict[str, Any]:
+        """以內建型別 (欄位 -> list、gram -> 排序後的 doc id list) 表示索引，供快照儲存。"""
+        keys = list(dict.fromkeys(k for r in self.records for k in r))
+        return {
+            "fields": list(self.fields),
+            "columns": {k: [r.get(k) for r in self.records] for k in keys},
+            "postings": {gram: sorted(ids) for gram, ids in self.postings.items()},
+        }
+
+    @classmethod
+    def from_columns(cls, state: Dict[str, Any]) -> "NgramIndex":
+        """由 to_columns() 的內容還原索引，不必重新切 n-gram。"""
+        index = cls.__new__(cls)
+        columns = state["columns"]
+        index.records = [dict(zip(columns, row)) for row in zip(*columns.values())]
+        index.fields = tuple(state["fields"])
+        index.names = [normalize(r.get(NAME_FIELD)) for r in index.records]
+        index.categories = [normalize(r.get(CATEGORY_FIELD)) for r in index.records]
+        index.postings = {gram: set(ids) for gram, ids in state["postings"].items()}
+        return index
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _candidates(self, term: str) -> Set[int]:
+        grams = [term] if len(term) == 1 else [term[i:i + 2] for i in range(len(term) - 1)]
+        lists = []
+        for gram in set(grams):
+            posting = self.postings.get(gram)
+            if not posting:
+                return set()
+            lists.append(posting)
+        lists.sort(key=len)
+        result = set(lists[0])
+        for posting in lists[1:]:
+            result &= posting
+            if not result:
+                break
+        # bigram 交集只是候選，需再確認整個關鍵字確實出現
+        return {d for d in result if term in self.names[d] or term in self.categories[d]}
+
+    def _score(self, doc_id: int, terms: List[str]) -> int:
+        name = self.names[doc_id]
+        score = 0
+        for term in terms:
+            if name == term:
+                score += 100
+            elif name.startswith(term):
+                score += 60
+            elif term in name:
+                score += 40
+            elif term in self.categories[doc_id]:
+                score += 10
+        return score
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        groups = parse_query(query)
+        if not groups:
+            return self.records[:limit]
+
+        scores: Dict[int, int] = {}
+        for terms in groups:
+            matched = None
+            for term in sorted(terms, key=len, reverse=True):
+                hits = self._candidates(term)
+                matched = hits if matched is None else matched & hits
+                if not matched:
+                    break
+            for doc_id in matched or ():
+                scores[doc_id] = max(scores.get(doc_id, 0), self._score(doc_id, terms))
+
+        ranked = sorted(scores, key=lambda d: (-scores[d], len(self.names[d]), d))
+        return [self.records[d] for d in ranked[:limit]]
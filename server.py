@@ -1,43 +1,78 @@
-import pandas as pd
-import requests
+import asyncio
+import concurrent.futures
+import hashlib
 import json
 import os
 import sys
-import numpy as np
-import argparse
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-
-# Conditional imports for Dual Mode
-try:
-    from mcp.server.fastmcp import FastMCP
-except ImportError:
-    FastMCP = None
-
-import urllib3
-
-# 1. 關閉 SSL 警告
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from typing import Optional, List, Dict, Any, Literal
+
+# 重量級模組 (pandas / numpy / requests / mcp / fastapi) 一律延後到第一次使用時才匯入，
+# 讓 MCP client 啟動 Server 時不必等整個科學運算套件載入完成。
+import catalog_snapshot
+import metrics
+import profiling
+import upstream_client
+from dashboard_renderer import DashboardStore
+from offline_mirror import MIRROR_MODE, OfflineMirror
+from prefetcher import PREFETCH_ENABLED, Prefetcher
+from response_cache import ResponseCache, make_key
+from search_index import NgramIndex
+from singleflight import SingleFlight
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FULL_CSV = os.path.join(BASE_DIR, "data", "statistics_full.csv")
 ORIG_CSV = os.path.join(BASE_DIR, "data", "statistics.csv")
 DATA_FILE = FULL_CSV if os.path.exists(FULL_CSV) else ORIG_CSV
 
-df = pd.DataFrame()
-
-# 載入資料庫 (Global)
-try:
-    if os.path.exists(DATA_FILE):
-        df = pd.read_csv(DATA_FILE)
-        df['tid'] = df['tid'].astype(str).str.zfill(4)
-        df['cid'] = df['cid'].astype(str).str.zfill(4)
-        df['sid'] = df['sid'].astype(str).str.zfill(6)
-        sys.stderr.write(f"Loaded {len(df)} records from {DATA_FILE}\n")
-    else:
-        sys.stderr.write(f"Warning: Data file not found at {DATA_FILE}\n")
-except Exception as e:
-    sys.stderr.write(f"Error loading data: {e}\n")
+response_cache = ResponseCache()
+upstream_flight = SingleFlight()
+dashboard_store = DashboardStore(prepare=lambda data: _prepare_dashboard_payload(data))
+# 熱門資料在快取過期前由背景 thread 提早更新 (api / mcp 模式皆啟用，TAOYUAN_PREFETCH=0 可關閉)
+prefetcher = Prefetcher(refresh=lambda key, params: _refresh_entry(key, params), expiry=response_cache.expiry)
+# 離線鏡像 (python offline_mirror.py 產生)：--mirror 時鏡像優先，--mirror-only 時完全不連線上游
+# 鏡像檔在執行中被更新時，由舊資料算出的 cube 一併清除
+mirror = OfflineMirror(on_reload=lambda: _clear_cube_cache())
+mirror_mode = MIRROR_MODE
+
+# 長表資料 pivot 後的 (日期 × 指標 × 地區) 陣列，與上游回應共用同一個 cache key，並以資料的 ETag 驗證；
+# 批次分析的 process pool worker 各有一份，收不到作廢通知，因此內容是否相同一律以 ETag 判斷。
+CUBE_CACHE_SIZE = int(os.environ.get("TAOYUAN_CUBE_CACHE_SIZE", "32"))
+_cube_cache: "OrderedDict[str, Any]" = OrderedDict()
+_cube_cache_lock = threading.Lock()
+
+# 各階段耗時與上游失敗類型 (GET /metrics 或 get_metrics 工具查詢)
+UPSTREAM_SECONDS = metrics.histogram("taoyuan_upstream_request_seconds", "Upstream API request latency", ("client",))
+UPSTREAM_BYTES = metrics.histogram("taoyuan_upstream_payload_bytes", "Upstream response body size", buckets=metrics.SIZE_BUCKETS)
+UPSTREAM_FAILURES = metrics.counter("taoyuan_upstream_failures_total", "Failed upstream fetches by type", ("type",))
+STAGE_SECONDS = metrics.histogram("taoyuan_stage_seconds", "Time spent in each processing stage", ("stage",))
+TOOL_SECONDS = metrics.histogram("taoyuan_tool_seconds", "MCP tool call duration", ("tool",))
+HTTP_SECONDS = metrics.histogram("taoyuan_http_request_seconds", "API request duration", ("path", "status"))
+
+# 載入資料庫 (Global, 第一次使用時才載入)
+# 優先讀取爬蟲產生的二進位快照 (已補零 + 已建好索引)，快照不存在或過期時才解析 CSV
+_search_index = None
+_search_index_lock = threading.Lock()
+
+def get_search_index() -> NgramIndex:
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                index = NgramIndex([])
+                try:
+                    if os.path.exists(DATA_FILE):
+                        index = catalog_snapshot.load_catalog(DATA_FILE)
+                        sys.stderr.write(f"Loaded {len(index)} records from {DATA_FILE}\n")
+                    else:
+                        sys.stderr.write(f"Warning: Data file not found at {DATA_FILE}\n")
+                except Exception as e:
+                    sys.stderr.write(f"Error loading data: {e}\n")
+                _search_index = index
+    return _search_index
 
 # --- Core Logic Functions (Independent of MCP/FastAPI) ---
 
@@ -53,42 +88,156 @@ def get_default_period():
     begin_year = end_year - 4 # 例如 2025 -> 2021~2025 (5年)
     return str(begin_year), str(end_year)   
 
-def _fetch_data_internal(tid: str, cid: str, sid: str, begin: Optional[str], end: Optional[str]):
+def _resolve_period(begin: Optional[str], end: Optional[str]):
     # 若無指定日期，則使用預設區間
     if not begin or not end:
         def_begin, def_end = get_default_period()
         begin = begin or def_begin
         end = end or def_end
+    return begin, end
+
+class UpstreamError(Exception):
+    """上游回應無法使用；kind 為 http_status / empty_body / bad_json"""
+    def __init__(self, kind: str, detail: str = ""):
+        super().__init__(f"{kind} {detail}".strip())
+        self.kind = kind
+
+def _parse_upstream_response(status_code: int, text: str):
+    if status_code != 200: raise UpstreamError("http_status", str(status_code))
+    text = text.strip()
+    if not text: raise UpstreamError("empty_body")
+    with STAGE_SECONDS.time(stage="json_parse"):
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            raise UpstreamError("bad_json", str(e)) from e
+
+def _failure_type(error: Exception) -> str:
+    if isinstance(error, UpstreamError):
+        return error.kind
+    # requests 重試用盡時 read timeout 會包成 ConnectionError，因此也檢查訊息；
+    # 類別名稱含父類別 (例如 httpx.RemoteProtocolError 屬於 TransportError)
+    names = " ".join(cls.__name__ for cls in type(error).__mro__)
+    if "Timeout" in names or "timed out" in str(error):
+        return "timeout"
+    if "Connect" in names or "Transport" in names or "Network" in names:
+        return "connection"
+    return "other"
+
+def _record_upstream_failure(cache_key: str, error: Exception):
+    UPSTREAM_FAILURES.inc(type=_failure_type(error))
+    sys.stderr.write(f"Upstream fetch failed for {cache_key}: {type(error).__name__}: {error}\n")
+
+def _store_response(cache_key: str, response):
+    UPSTREAM_BYTES.observe(len(response.content))
+    data = _parse_upstream_response(response.status_code, response.text)
+    entry = response_cache.set(cache_key, data)
+    _invalidate_cube(cache_key)
+    return entry
+
+def _download_data(cache_key: str, params: Dict[str, str]):
+    try:
+        with UPSTREAM_SECONDS.time(client="sync"):
+            response = upstream_client.get(upstream_client.TYCG_API_URL, params=params, headers=get_headers(), verify=False)
+        return _store_response(cache_key, response)
+    except Exception as e:
+        _record_upstream_failure(cache_key, e)
+        return None
 
-    url = "https://statisticsinfo.tycg.gov.tw/TaoyuanSTYB/RestfulAPI/GetStaticData.aspx"
-    params = {"tid": tid, "cid": cid, "sid": sid, "begin": begin, "end": end, "type": "JSON"}
+async def _download_data_async(cache_key: str, params: Dict[str, str]):
     try:
-        response = requests.get(url, params=params, headers=get_headers(), timeout=30, verify=False)
-        if response.status_code != 200: return None
-        text = response.text.strip()
-        if not text: return None
-        data = response.json()
-        return data
-    except:
+        with UPSTREAM_SECONDS.time(client="async"):
+            response = await upstream_client.async_get(upstream_client.TYCG_API_URL, params=params, headers=get_headers(), verify=False)
+        # JSON 解析 / 壓縮寫入 SQLite 都是同步操作，不在 event loop 上執行
+        return await asyncio.to_thread(_store_response, cache_key, response)
+    except Exception as e:
+        _record_upstream_failure(cache_key, e)
         return None
 
+def _fetch_entry_internal(tid: str, cid: str, sid: str, begin: Optional[str], end: Optional[str]):
+    """取得資料與其快取資訊 (CacheEntry: data / etag / expires)；失敗時回傳 None。"""
+    begin, end = _resolve_period(begin, end)
+    if mirror_mode != "0":
+        entry = mirror.get_entry(tid, cid, sid, begin, end)
+        if entry is not None or mirror_mode == "only": return entry
+    cache_key = make_key(tid, cid, sid, begin, end)
+    params = {"tid": tid, "cid": cid, "sid": sid, "begin": begin, "end": end, "type": "JSON"}
+    prefetcher.record(cache_key, params)
+
+    # 先查本機快取，避免每次都打到政府 API；已過期但仍在保留期內的資料先回傳，背景再更新
+    cached = response_cache.get_entry(cache_key, allow_stale=True)
+    if cached is not None:
+        if cached.stale: prefetcher.revalidate(cache_key, params)
+        return cached
+
+    # 同一組參數同時被多個呼叫者請求時，只打一次上游
+    return upstream_flight.do(cache_key, lambda: _download_data(cache_key, params))
+
+async def _fetch_entry_internal_async(tid: str, cid: str, sid: str, begin: Optional[str], end: Optional[str]):
+    """_fetch_entry_internal 的非同步版本 (API 模式使用，等待上游時不佔用 threadpool worker)。
+    鏡像與快取的讀取 (SQLite + 解壓縮，且會等待其他寫入的 lock) 放到 thread 執行，避免卡住 event loop。"""
+    begin, end = _resolve_period(begin, end)
+    if mirror_mode != "0":
+        entry = await asyncio.to_thread(mirror.get_entry, tid, cid, sid, begin, end)
+        if entry is not None or mirror_mode == "only": return entry
+    cache_key = make_key(tid, cid, sid, begin, end)
+    params = {"tid": tid, "cid": cid, "sid": sid, "begin": begin, "end": end, "type": "JSON"}
+    prefetcher.record(cache_key, params)
+
+    cached = await asyncio.to_thread(response_cache.get_entry, cache_key, allow_stale=True)
+    if cached is not None:
+        if cached.stale: prefetcher.revalidate(cache_key, params)
+        return cached
+
+    return await upstream_flight.do_async(cache_key, lambda: _download_data_async(cache_key, params))
+
+def _refresh_entry(cache_key: str, params: Dict[str, str]):
+    """背景預取 / stale-while-revalidate 使用：與前景請求共用 single-flight"""
+    return upstream_flight.do(cache_key, lambda: _download_data(cache_key, params))
+
+def _fetch_data_internal(tid: str, cid: str, sid: str, begin: Optional[str], end: Optional[str]):
+    entry = _fetch_entry_internal(tid, cid, sid, begin, end)
+    return None if entry is None else entry.data
+
+async def _fetch_data_internal_async(tid: str, cid: str, sid: str, begin: Optional[str], end: Optional[str]):
+    entry = await _fetch_entry_internal_async(tid, cid, sid, begin, end)
+    return None if entry is None else entry.data
+
+def _get_fetch_stats() -> Dict[str, Any]:
+    stats = {"cache": response_cache.stats(), "singleflight": upstream_flight.stats(), "dashboard": dashboard_store.stats(), "prefetch": prefetcher.stats()}
+    if mirror_mode != "0":
+        stats["mirror"] = {"mode": mirror_mode, **mirror.stats()}
+    return stats
+
+def _get_cache_stats_internal() -> str:
+    return json.dumps(_get_fetch_stats(), ensure_ascii=False, indent=2)
+
+def _get_metrics_internal() -> str:
+    return json.dumps(metrics.REGISTRY.snapshot(), ensure_ascii=False, indent=2)
+
 def _search_statistics_internal(keyword: str) -> str:
-    if df.empty: return "Error: Database not loaded."
-    mask = df['資料名稱'].astype(str).str.contains(keyword, case=False, na=False) | \
-           df['所屬類別'].astype(str).str.contains(keyword, case=False, na=False)
-    results = df[mask].copy()
+    search_index = get_search_index()
+    if len(search_index) == 0: return "Error: Database not loaded."
+    # 支援多關鍵字：空白分隔為 AND，OR / | 分隔為 OR；結果依比對品質排序
+    with STAGE_SECONDS.time(stage="search"):
+        results = search_index.search(keyword, limit=20)
     if len(results) == 0: return "No results found."
     columns = ['所屬資料庫', '所屬類別', '資料名稱', 'tid', 'cid', 'sid']
-    display_cols = [c for c in columns if c in results.columns]
-    return json.dumps(results[display_cols].head(20).to_dict(orient='records'), ensure_ascii=False, indent=2)
+    return json.dumps([{c: r[c] for c in columns if c in r} for r in results], ensure_ascii=False, indent=2)
 
 def _get_statistics_data_internal(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None) -> str:
     # 1. 取得完整資料
     data = _fetch_data_internal(tid, cid, sid, begin, end)
-    
+    return _render_statistics_data(data)
+
+def _render_statistics_data(data) -> str:
     if data is None:
-        return "Error: Unable to fetch data or empty response."
-    
+        return FETCH_FAILED_MSG
+    with STAGE_SECONDS.time(stage="serialize"):
+        return json.dumps(_statistics_data_payload(data), ensure_ascii=False, indent=2)
+
+def _statistics_data_payload(data):
+    """回傳給呼叫端的資料物件 (API 直接交給 FastAPI 序列化，不再經過 dumps -> loads)"""
     # 2. 檢查資料類型與大小
     if isinstance(data, list):
         count = len(data)
@@ -98,219 +247,554 @@ def _get_statistics_data_internal(tid: str, cid: str, sid: str, begin: Optional[
             preview = data[:5] # 只取前 5 筆
             
             non_ascii_msg = f"⚠️ 資料量過大 (共 {count} 筆)，為避免對話崩潰，僅顯示前 5 筆預覽。"
-            safe_response = {
+            return {
                 "status": "success",
                 "message": non_ascii_msg,
                 "instruction": "請使用 'analyze_statistics_report' 工具來進行完整數據的統計分析，不要直接讀取原始資料。",
                 "preview_data": preview
             }
-            return json.dumps(safe_response, ensure_ascii=False, indent=2)
 
     # 3. 如果資料量很小，就正常回傳全部
-    return json.dumps(data, ensure_ascii=False, indent=2)
+    return data
+
+# --- Paged / Streaming Output (API) ---
+# 大型資料不受 50 筆預覽限制：可用 limit / offset 分頁取得，或以 NDJSON 逐列串流。
+# 兩者都直接從已解析的資料切片輸出，不會先把整份資料序列化成字串再解析回來。
+
+FETCH_FAILED_MSG = "Error: Unable to fetch data or empty response."
+PAGE_MAX_LIMIT = int(os.environ.get("TAOYUAN_PAGE_MAX_LIMIT", "5000"))
+PAGE_DEFAULT_LIMIT = int(os.environ.get("TAOYUAN_PAGE_DEFAULT_LIMIT", "500"))  # 只指定 offset 時的每頁筆數
+NDJSON_CHUNK_ROWS = int(os.environ.get("TAOYUAN_NDJSON_CHUNK_ROWS", "500"))
+
+def _payload_rows(data) -> List[Any]:
+    """資料列：上游長表格式取 Data，舊格式本身就是 list。"""
+    if isinstance(data, dict):
+        rows = data.get("Data")
+        return rows if isinstance(rows, list) else []
+    return data if isinstance(data, list) else []
+
+def _page_statistics_data(data, limit: int, offset: int = 0) -> Dict[str, Any]:
+    rows = _payload_rows(data)
+    page = rows[offset:offset + limit]
+    next_offset = offset + len(page)
+    result = {
+        "total": len(rows),
+        "offset": offset,
+        "limit": limit,
+        "next_offset": next_offset if next_offset < len(rows) else None,
+        "rows": page,
+    }
+    if isinstance(data, dict):
+        # 長表格式的表頭資訊 (欄位名稱等) 一併回傳，方便 client 顯示
+        result["meta"] = {k: v for k, v in data.items() if k != "Data"}
+    return result
+
+def _iter_ndjson(rows: List[Any], offset: int = 0, limit: Optional[int] = None):
+    """每列一行 JSON；每次產出 NDJSON_CHUNK_ROWS 列，避免逐列 yield 的額外負擔。"""
+    stop = len(rows) if limit is None else min(len(rows), offset + limit)
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    for start in range(offset, stop, NDJSON_CHUNK_ROWS):
+        end = min(start + NDJSON_CHUNK_ROWS, stop)
+        yield "".join(dumps(row) + "\n" for row in rows[start:end]).encode("utf-8")
 
 def _generate_dashboard_html_internal(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None) -> str:
-    data = _fetch_data_internal(tid, cid, sid, begin, end)
+    entry = _fetch_entry_internal(tid, cid, sid, begin, end)
+    if entry is None: return _render_dashboard_html(tid, cid, sid, None)
+    return _render_dashboard_html(tid, cid, sid, entry.data, begin, end, entry.etag)
+
+def _prepare_dashboard_payload(data):
+    """長表資料在 server 端先彙整成欄式格式再注入 dashboard，其他格式維持原樣。"""
+    import analysis_engine
+
+    if analysis_engine.is_long_format(data):
+        with STAGE_SECONDS.time(stage="dashboard_payload"):
+            return analysis_engine.build_dashboard_payload(data)
+    return data
+
+def _render_dashboard_html(tid: str, cid: str, sid: str, data, begin: Optional[str] = None, end: Optional[str] = None, etag: Optional[str] = None) -> str:
     if not data: return "Error: No Data Found from API."
     
     try:
-        html_path = os.path.join(BASE_DIR, "index.html")
-        if not os.path.exists(html_path):
-            return "Error: Dashboard template (index.html) not found."
-            
-        with open(html_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
-            
-        injection = f"window.DASHBOARD_DATA = {json.dumps(data, ensure_ascii=False)};"
-        
-        if "window.DASHBOARD_DATA = null;" in html_content:
-            final_html = html_content.replace("window.DASHBOARD_DATA = null;", injection)
-        else:
-            final_html = html_content.replace('<script src="script.js"></script>', f'<script>{injection}</script><script src="script.js"></script>')
-
+        # 樣板只在變更時重新編譯；資料與樣板都沒變時不重寫輸出檔
         output_filename = f"dashboard_{tid}_{cid}_{sid}.html"
-        output_path = os.path.join(BASE_DIR, output_filename)
-        
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(final_html)
-            
+        cache_key = make_key(tid, cid, sid, *_resolve_period(begin, end))
+        with STAGE_SECONDS.time(stage="dashboard_render"):
+            output_path = dashboard_store.write(output_filename, cache_key, data, etag)
         return f"Dashboard generated. Open this file to view: {output_path}"
 
     except Exception as e:
         return f"Error creating dashboard: {str(e)}"
 
+def _get_cube(cache_key: str, payload: Dict[str, Any], etag: Optional[str] = None):
+    import analysis_engine
+
+    if etag is None:
+        # 無法確認資料版本時不快取
+        return analysis_engine.pivot_long_format(payload)
+    with _cube_cache_lock:
+        cached = _cube_cache.get(cache_key)
+        if cached is not None and cached[0] == etag:
+            _cube_cache.move_to_end(cache_key)
+            return cached[1]
+    cube = analysis_engine.pivot_long_format(payload)
+    with _cube_cache_lock:
+        _cube_cache[cache_key] = (etag, cube)
+        _cube_cache.move_to_end(cache_key)
+        while len(_cube_cache) > CUBE_CACHE_SIZE:
+            _cube_cache.popitem(last=False)
+    return cube
+
+def _invalidate_cube(cache_key: str):
+    with _cube_cache_lock:
+        _cube_cache.pop(cache_key, None)
+
+def _clear_cube_cache():
+    with _cube_cache_lock:
+        _cube_cache.clear()
+
 def _analyze_statistics_report_internal(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None) -> str:
-    data = _fetch_data_internal(tid, cid, sid, begin, end)
-    
+    entry = _fetch_entry_internal(tid, cid, sid, begin, end)
+    if entry is None: return ANALYSIS_FAILED_MSG
+    return _render_analysis_report(tid, cid, sid, begin, end, entry.data, entry.etag)
+
+def _render_analysis_report(tid: str, cid: str, sid: str, begin: Optional[str], end: Optional[str], data, etag: Optional[str] = None) -> str:
+    # 分析引擎會匯入 pandas / numpy，因此延後到第一次分析時才載入
+    import analysis_engine
+
+    # 上游 API 的長表格式 ({"Header", "Data": [...]})：pivot 後 (並快取) 依指標 / 地區批次分析
+    if analysis_engine.is_long_format(data) and data["Data"]:
+        try:
+            with STAGE_SECONDS.time(stage="analysis"):
+                cube = _get_cube(make_key(tid, cid, sid, *_resolve_period(begin, end)), data, etag)
+                analysis = analysis_engine.analyze_cube(cube)
+        except Exception as e:
+            return analysis_engine.render_error_report(tid, cid, sid, begin, end, data["Data"], e)
+        with STAGE_SECONDS.time(stage="report_render"):
+            return analysis_engine.render_cube_report(analysis, tid, cid, sid, begin, end, data)
+
     if not data or not isinstance(data, list) or len(data) == 0:
-        return "無法獲取數據，無法進行分析。"
+        return ANALYSIS_FAILED_MSG
 
-    section_2_info = "" 
-    section_3_info = "" 
-    section_4_info = "" 
-    total_count = len(data)
+    try:
+        with STAGE_SECONDS.time(stage="analysis"):
+            result = analysis_engine.analyze_records(data)
+    except Exception as e:
+        return analysis_engine.render_error_report(tid, cid, sid, begin, end, data, e)
+    with STAGE_SECONDS.time(stage="report_render"):
+        return analysis_engine.render_report(result, tid, cid, sid, begin, end, data)
+
+# --- Batch Analysis ---
+# 一次分析多組統計資料 (例如月報)：上游抓取以有上限的 worker 並行，
+# CPU 密集的分析 / 報告產生丟到 process pool，單一項目失敗只記錄在該項目，不影響整批。
+
+BATCH_MAX_ITEMS = int(os.environ.get("TAOYUAN_BATCH_MAX_ITEMS", "50"))
+BATCH_FETCH_WORKERS = int(os.environ.get("TAOYUAN_BATCH_FETCH_WORKERS", "8"))
+# 0 表示不使用 process pool，直接在 thread 內分析
+BATCH_PROCESS_WORKERS = int(os.environ.get("TAOYUAN_BATCH_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+ANALYSIS_FAILED_MSG = "無法獲取數據，無法進行分析。"
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def _get_process_pool():
+    global _process_pool
+    if BATCH_PROCESS_WORKERS <= 0:
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            import multiprocessing
+            # Server 本身有背景 thread，使用 spawn 避免 fork 後繼承到鎖住的 lock
+            _process_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=BATCH_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+def _shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _parse_series_ids(series: List[str]) -> List[Dict[str, str]]:
+    """"tid-cid-sid" (與報告中的「資料來源」格式相同) -> {"tid", "cid", "sid"}，數字會補零。"""
+    if not series:
+        raise ValueError("series 不可為空")
+    if len(series) > BATCH_MAX_ITEMS:
+        raise ValueError(f"一次最多分析 {BATCH_MAX_ITEMS} 組資料 (收到 {len(series)} 組)")
+    items = []
+    for raw in series:
+        parts = [p.strip() for p in str(raw).replace("/", "-").split("-")]
+        if len(parts) != 3 or not all(p.isdigit() for p in parts):
+            items.append({"series": str(raw), "error": "格式錯誤，應為 tid-cid-sid (例如 0001-0001-000001)"})
+            continue
+        tid, cid, sid = parts[0].zfill(4), parts[1].zfill(4), parts[2].zfill(6)
+        items.append({"series": f"{tid}-{cid}-{sid}", "tid": tid, "cid": cid, "sid": sid})
+    return items
+
+def _analyze_in_pool(tid: str, cid: str, sid: str, begin: Optional[str], end: Optional[str], data, etag: Optional[str] = None) -> str:
+    # etag 一併傳給 worker，worker 內的 cube 快取才能判斷資料是否已更新
+    pool = _get_process_pool()
+    if pool is None:
+        return _render_analysis_report(tid, cid, sid, begin, end, data, etag)
+    try:
+        future = pool.submit(_render_analysis_report, tid, cid, sid, begin, end, data, etag)
+    except (RuntimeError, concurrent.futures.process.BrokenProcessPool):
+        # process pool 無法使用 (例如 worker 被系統終止) 時退回目前 thread 執行
+        _shutdown_process_pool()
+        return _render_analysis_report(tid, cid, sid, begin, end, data, etag)
+    return future.result()
+
+async def _analyze_in_pool_async(tid: str, cid: str, sid: str, begin: Optional[str], end: Optional[str], data, etag: Optional[str] = None) -> str:
+    pool = _get_process_pool()
+    if pool is not None:
+        try:
+            return await asyncio.wrap_future(pool.submit(_render_analysis_report, tid, cid, sid, begin, end, data, etag))
+        except (RuntimeError, concurrent.futures.process.BrokenProcessPool):
+            _shutdown_process_pool()
+    return await asyncio.to_thread(_render_analysis_report, tid, cid, sid, begin, end, data, etag)
 
+def _batch_item_result(item: Dict[str, str], data, report: Optional[str], started: float) -> Dict[str, Any]:
+    result = {k: item[k] for k in ("series", "tid", "cid", "sid")}
+    if data is None:
+        result.update(status="error", error="Unable to fetch data or empty response.")
+    elif report is None or report == ANALYSIS_FAILED_MSG:
+        result.update(status="error", error=ANALYSIS_FAILED_MSG)
+    else:
+        result.update(status="ok", report=report)
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def _batch_summary(begin: Optional[str], end: Optional[str], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    begin, end = _resolve_period(begin, end)
+    ok = sum(1 for r in results if r["status"] == "ok")
+    return {"begin": begin, "end": end, "total": len(results), "succeeded": ok, "failed": len(results) - ok, "results": results}
+
+def _analyze_batch(series: List[str], begin: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    items = _parse_series_ids(series)
+
+    def run(item):
+        if "error" in item:
+            return {"series": item["series"], "status": "error", "error": item["error"]}
+        started = time.perf_counter()
+        try:
+            entry = _fetch_entry_internal(item["tid"], item["cid"], item["sid"], begin, end)
+            data = None if entry is None else entry.data
+            report = None if data is None else _analyze_in_pool(item["tid"], item["cid"], item["sid"], begin, end, data, entry.etag)
+            return _batch_item_result(item, data, report, started)
+        except Exception as e:
+            return {"series": item["series"], "status": "error", "error": str(e)}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, BATCH_FETCH_WORKERS)) as executor:
+        results = list(executor.map(run, items))
+    return _batch_summary(begin, end, results)
+
+async def _analyze_batch_async(series: List[str], begin: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    items = _parse_series_ids(series)
+    semaphore = asyncio.Semaphore(max(1, BATCH_FETCH_WORKERS))
+
+    async def run(item):
+        if "error" in item:
+            return {"series": item["series"], "status": "error", "error": item["error"]}
+        started = time.perf_counter()
+        try:
+            async with semaphore:
+                entry = await _fetch_entry_internal_async(item["tid"], item["cid"], item["sid"], begin, end)
+            data = None if entry is None else entry.data
+            # 分析不佔用抓取名額：前一項在分析時，下一項就可以開始抓
+            report = None if data is None else await _analyze_in_pool_async(item["tid"], item["cid"], item["sid"], begin, end, data, entry.etag)
+            return _batch_item_result(item, data, report, started)
+        except Exception as e:
+            return {"series": item["series"], "status": "error", "error": str(e)}
+
+    results = await asyncio.gather(*(run(item) for item in items))
+    return _batch_summary(begin, end, list(results))
+
+def _analyze_batch_internal(series: List[str], begin: Optional[str] = None, end: Optional[str] = None) -> str:
     try:
-        df_temp = pd.DataFrame(data)
-        cols = df_temp.columns.tolist()
-        label_col = next((c for c in cols if '年' in c or '月' in c or '別' in c or '名稱' in c or '區' in c), cols[0])
-        
-        numeric_cols = []
-        for c in cols:
-            if c == label_col: continue
-            try:
-                df_temp[c] = pd.to_numeric(df_temp[c])
-                numeric_cols.append(c)
-            except: pass
-            
-        target_col = numeric_cols[0] if numeric_cols else None
+        return json.dumps(_analyze_batch(series, begin, end), ensure_ascii=False, indent=2)
+    except ValueError as e:
+        return f"Error: {e}"
+
+# --- Cross-Series Comparison ---
+# 比較多組資料 (例如交通事故 vs 人口 / 機動車輛數)：每組只經由快取抓一次，
+# 依共同的日期 / 地區對齊後計算相關矩陣、落差相關與多元迴歸。
+
+COMPARE_LEVELS = ("auto", "district", "date")
+COMPARE_MAX_LAG_LIMIT = int(os.environ.get("TAOYUAN_COMPARE_MAX_LAG_LIMIT", "24"))
+
+def _check_compare_options(level: str, max_lag: int):
+    if level not in COMPARE_LEVELS:
+        raise ValueError(f"level 必須為 {' / '.join(COMPARE_LEVELS)} (收到 '{level}')")
+    if not 0 <= max_lag <= COMPARE_MAX_LAG_LIMIT:
+        raise ValueError(f"max_lag 必須介於 0 ~ {COMPARE_MAX_LAG_LIMIT} (收到 {max_lag})")
+
+def _split_series_spec(spec: str):
+    """"tid-cid-sid" 或 "tid-cid-sid:指標名稱" -> (id, 指標)"""
+    series_id, _, metric = str(spec).partition(":")
+    return series_id, metric.strip() or None
+
+def _build_keyed_series(item: Dict[str, str], metric: Optional[str], begin: Optional[str], end: Optional[str], entry):
+    import analysis_engine
+
+    data = None if entry is None else entry.data
+    if analysis_engine.is_long_format(data) and data["Data"]:
+        cube = _get_cube(make_key(item["tid"], item["cid"], item["sid"], *_resolve_period(begin, end)), data, entry.etag)
+        keyed = analysis_engine.series_from_cube(cube, item["series"], metric)
+    elif isinstance(data, list) and data:
+        keyed = analysis_engine.series_from_records(data, item["series"], metric)
+    else:
+        raise ValueError("Unable to fetch data or empty response.")
+    if keyed.values.empty:
+        raise ValueError(f"{keyed.name} 沒有可用的數值資料")
+    return keyed
+
+def _compare_from_payloads(items, metrics, entries, begin, end, level: str, max_lag: int) -> str:
+    """可用的資料不足 2 組時拋出 ValueError (API 回 400)"""
+    import analysis_engine
+
+    series_list, errors = [], {}
+    for item, metric, entry in zip(items, metrics, entries):
+        if "error" in item:
+            errors[item["series"]] = item["error"]
+            continue
+        try:
+            series_list.append(_build_keyed_series(item, metric, begin, end, entry))
+        except Exception as e:
+            errors[item["series"]] = str(e)
+    if len(series_list) < 2:
+        detail = "；".join(f"{k}: {v}" for k, v in errors.items())
+        raise ValueError(f"至少需要 2 組可用的資料才能比較。{detail}")
+    with STAGE_SECONDS.time(stage="analysis"):
+        result = analysis_engine.compare_series(series_list, level=level, max_lag=max_lag)
+    with STAGE_SECONDS.time(stage="report_render"):
+        return analysis_engine.render_comparison(result, *_resolve_period(begin, end), errors=errors)
+
+def _compare_statistics_internal(series: List[str], begin: Optional[str] = None, end: Optional[str] = None, level: str = "auto", max_lag: int = 3) -> str:
+    try:
+        _check_compare_options(level, max_lag)
+        specs = [_split_series_spec(s) for s in series]
+        items = _parse_series_ids([s for s, _ in specs])
+    except ValueError as e:
+        return f"Error: {e}"
+
+    def fetch(item):
+        if "error" in item:
+            return None
+        return _fetch_entry_internal(item["tid"], item["cid"], item["sid"], begin, end)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, BATCH_FETCH_WORKERS)) as executor:
+        entries = list(executor.map(fetch, items))
+    try:
+        return _compare_from_payloads(items, [m for _, m in specs], entries, begin, end, level, max_lag)
+    except ValueError as e:
+        return f"Error: {e}"
+
+async def _compare_statistics_internal_async(series: List[str], begin: Optional[str] = None, end: Optional[str] = None, level: str = "auto", max_lag: int = 3) -> str:
+    """輸入或資料不足以比較時拋出 ValueError"""
+    _check_compare_options(level, max_lag)
+    specs = [_split_series_spec(s) for s in series]
+    items = _parse_series_ids([s for s, _ in specs])
+    semaphore = asyncio.Semaphore(max(1, BATCH_FETCH_WORKERS))
+
+    async def fetch(item):
+        if "error" in item:
+            return None
+        async with semaphore:
+            return await _fetch_entry_internal_async(item["tid"], item["cid"], item["sid"], begin, end)
+
+    entries = await asyncio.gather(*(fetch(item) for item in items))
+    return await asyncio.to_thread(_compare_from_payloads, items, [m for _, m in specs], entries, begin, end, level, max_lag)
+
+def _warm_up():
+    """背景預熱：載入統計目錄並匯入分析用套件，不阻塞 Server 啟動與 MCP 握手。"""
+    try:
+        get_search_index()
+        import analysis_engine  # noqa: F401  (會一併匯入 numpy / pandas)
+        dashboard_store.template.compiled()
+        upstream_client.get_session()
+    except Exception as e:
+        sys.stderr.write(f"Warm-up failed: {e}\n")
 
-        if target_col:
-            is_total = df_temp[label_col].astype(str).str.strip() == '桃園市'
-            
-            if is_total.any():
-                total_row = df_temp[is_total].iloc[0]
-                sum_val = total_row[target_col]
-                df_calc = df_temp[~is_total].copy()
-                total_msg = "(已自動排除「桃園市」總計列)"
-            else:
-                sum_val = df_temp[target_col].sum()
-                df_calc = df_temp.copy()
-                total_msg = ""
-            
-            if df_calc.empty:
-                df_calc = df_temp.copy()
+def _start_warm_up():
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    if PREFETCH_ENABLED and mirror_mode != "only":
+        prefetcher.start()
 
-            mean_val = df_calc[target_col].mean()
-            max_row = df_calc.loc[df_calc[target_col].idxmax()]
-            min_row = df_calc.loc[df_calc[target_col].idxmin()]
-            
-            growth_txt = ""
-            if len(df_calc) >= 2 and ('年' in label_col or '月' in label_col):
-                start_val = df_calc[target_col].iloc[0]
-                end_val = df_calc[target_col].iloc[-1]
-                if start_val != 0:
-                    growth = ((end_val - start_val) / start_val) * 100
-                    growth_txt = f"本期間總體成長率為 {growth:.2f}%"
-            
-            section_2_info = f"""
-            - 資料總筆數: {total_count} 筆 {total_msg}
-            - 分析主體欄位: {target_col}
-            - 數值總計: {sum_val:,.0f}
-            - 平均水準: {mean_val:,.2f}
-            - 極值: 最高為 {max_row[label_col]} ({max_row[target_col]})，最低為 {min_row[label_col]} ({min_row[target_col]})
-            - {growth_txt}
-            """
-
-            if len(df_calc) >= 3:
-                x = np.arange(len(df_calc))
-                y = df_calc[target_col].values
-                slope, intercept = np.polyfit(x, y, 1)
-                
-                p = np.poly1d([slope, intercept])
-                yhat = p(x)
-                ybar = np.sum(y)/len(y)
-                ssreg = np.sum((yhat-ybar)**2)
-                sstot = np.sum((y - ybar)**2)
-                r_squared = ssreg / sstot if sstot != 0 else 0
-                
-                trend_desc = "呈現上升趨勢" if slope > 0 else "呈現下降趨勢"
-                
-                section_3_info += f"""
-                1. 趨勢檢定 (Trend Analysis)：
-                   - 統計方法：採用簡單線性迴歸模型 (Simple Linear Regression)。
-                   - 分析結果：迴歸斜率 (Slope) 為 {slope:.4f}，決定係數 (R-squared) 為 {r_squared:.4f}。
-                   - 解讀：數據整體{trend_desc} (R平方值越接近1代表趨勢越明顯)。
-                """
-            
-            if len(numeric_cols) >= 2:
-                corr_matrix = df_calc[numeric_cols].corr(method='pearson')
-                corr_target = corr_matrix[target_col].drop(target_col)
-                if not corr_target.empty:
-                    best_corr_col = corr_target.abs().idxmax()
-                    best_corr_val = corr_target[best_corr_col]
-                    section_3_info += f"""
-                2. 相關係數分析 (Correlation Analysis)：
-                   - 統計方法：採用皮爾森積動差相關係數。
-                   - 分析結果：'{target_col}' 與 '{best_corr_col}' 之相關係數為 {best_corr_val:.4f}。
-                   """
-
-            top10 = df_calc.nlargest(10, target_col)
-            top10_str = "\\n".join([f"   - 第{i+1}名: {row[label_col]} (數值: {row[target_col]})" for i, row in top10.iterrows()])
-            section_4_info = f"數值最高的熱點區域/時間 (前10名):\\n{top10_str}"
+# --- HTTP Caching (API) ---
+# 回應的 ETag 由上游資料的雜湊 (快取內容) 加上路由與查詢參數組成，資料沒變就不必重送；
+# Cache-Control 的 max-age 為該筆快取剩餘的有效時間。
 
-    except Exception as e:
-        section_2_info = f"計算錯誤: {str(e)}"
+ETAG_VERSION = "1"  # 回應格式變更時遞增，讓 client 端的舊快取失效
 
-    data_sample = data[:5] if len(data) > 5 else data
-    data_sample_str = json.dumps(data_sample, ensure_ascii=False)
+def _http_cache_headers(entry, path: str, query_items: List[Any]) -> Dict[str, str]:
+    variant = "&".join(f"{k}={v}" for k, v in sorted(query_items))
+    digest = hashlib.sha1(f"{ETAG_VERSION}|{entry.etag}|{path}?{variant}".encode("utf-8")).hexdigest()[:20]
+    max_age = max(0, int(entry.expires - time.time()))
+    # 回應可能被壓縮，因此使用 weak ETag
+    return {"ETag": f'W/"{digest}"', "Cache-Control": f"public, max-age={max_age}"}
 
-    summary = f"""
-### 數據統計摘要 (Statistical Summary)
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
 
-**1. 基本資訊 (Basic Info)**
-- 資料來源: {tid}-{cid}-{sid}
-- 時間範圍: {begin} ~ {end}
-- 總筆數: {total_count}
+# --- Profiling ---
+# 單次工具呼叫的剖析：一律執行同步版的工具函式 (與 MCP 模式相同的程式路徑)，
+# 讓 cProfile 能在同一個 thread 內看到完整的呼叫過程。
 
-**2. 現況描述 (Descriptive Stats)**
-- 分析主體: {section_2_info.strip()}
+def _profilable_tools() -> Dict[str, Any]:
+    return {
+        "search_statistics": _search_statistics_internal,
+        "get_statistics_data": _get_statistics_data_internal,
+        "generate_dashboard_html": _generate_dashboard_html_internal,
+        "analyze_statistics_report": _analyze_statistics_report_internal,
+        "analyze_statistics_batch": _analyze_batch_internal,
+        "compare_statistics": _compare_statistics_internal,
+    }
 
-**3. 統計檢定 (Statistical Analysis)**
-{section_3_info.strip() if section_3_info else "- 無足夠數據進行趨勢/相關性分析。"}
+def _profile_tool(tool: str, arguments: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    import inspect
 
-**4. 熱點排行 (Top 10 Hotspots)**
-{section_4_info.strip()}
+    tools = _profilable_tools()
+    if tool not in tools:
+        raise ValueError(f"Unknown tool '{tool}'. Available: {', '.join(tools)}")
+    fn = tools[tool]
+    try:
+        bound = inspect.signature(fn).bind(**(arguments or {}))
+    except TypeError as e:
+        raise ValueError(f"Invalid arguments for {tool}: {e}")
+    result, report = profiling.profile_call(tool, fn, *bound.args, **bound.kwargs)
+    # 工具回傳的 JSON 字串還原成物件，與剖析報告一起回傳
+    try:
+        result = json.loads(result)
+    except (TypeError, ValueError):
+        pass
+    return {"result": result, "profile": report}
 
-**5. 原始資料範例 (Sample Data - Top 5)**
-{data_sample_str}
-    """
-    
-    return summary
+def _profile_tool_call_internal(tool: str, arguments: Optional[Dict[str, Any]] = None) -> str:
+    try:
+        return json.dumps(_profile_tool(tool, arguments), ensure_ascii=False, indent=2)
+    except ValueError as e:
+        return f"Error: {e}"
 
 # --- Mode 1: MCP Server Setup ---
 
 def run_mcp_server():
-    if not FastMCP:
+    try:
+        from mcp.server.fastmcp import FastMCP
+    except ImportError:
         print("Error: 'mcp' package not installed. Cannot run in MCP mode.")
         sys.exit(1)
 
     mcp = FastMCP("Taoyuan Statistics")
 
+    # 同步工具會卡住 MCP 的 event loop，因此放到 thread 執行，
+    # 讓同時進來的呼叫可以並行，並由 single-flight 合併相同的上游請求。
     @mcp.tool()
+    @metrics.timed(TOOL_SECONDS, tool="search_statistics")
     def search_statistics(keyword: str) -> str:
-        return _search_statistics_internal(keyword)
+        return profiling.maybe_profile("search_statistics", _search_statistics_internal, keyword)
+
+    @mcp.tool()
+    @metrics.timed(TOOL_SECONDS, tool="get_statistics_data")
+    async def get_statistics_data(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None) -> str:
+        return await asyncio.to_thread(profiling.maybe_profile, "get_statistics_data", _get_statistics_data_internal, tid, cid, sid, begin, end)
+
+    @mcp.tool()
+    @metrics.timed(TOOL_SECONDS, tool="generate_dashboard_html")
+    async def generate_dashboard_html(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None) -> str:
+        return await asyncio.to_thread(profiling.maybe_profile, "generate_dashboard_html", _generate_dashboard_html_internal, tid, cid, sid, begin, end)
+
+    @mcp.tool()
+    @metrics.timed(TOOL_SECONDS, tool="analyze_statistics_report")
+    async def analyze_statistics_report(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None) -> str:
+        return await asyncio.to_thread(profiling.maybe_profile, "analyze_statistics_report", _analyze_statistics_report_internal, tid, cid, sid, begin, end)
+
+    @mcp.tool()
+    @metrics.timed(TOOL_SECONDS, tool="analyze_statistics_batch")
+    async def analyze_statistics_batch(series: List[str], begin: Optional[str] = None, end: Optional[str] = None) -> str:
+        """一次分析多組資料。series 為 "tid-cid-sid" 字串列表 (例如 ["0001-0001-000001", "0002-0003-000010"])，
+        所有項目共用同一個期間；回傳每一項的報告或錯誤訊息。"""
+        return await asyncio.to_thread(profiling.maybe_profile, "analyze_statistics_batch", _analyze_batch_internal, series, begin, end)
+
+    @mcp.tool()
+    @metrics.timed(TOOL_SECONDS, tool="compare_statistics")
+    async def compare_statistics(series: List[str], begin: Optional[str] = None, end: Optional[str] = None, level: str = "auto", max_lag: int = 3) -> str:
+        """比較多組資料的關聯性。series 為 "tid-cid-sid" 或 "tid-cid-sid:指標名稱" 列表，第一組為迴歸目標；
+        level 可為 auto / district / date。回傳相關係數矩陣、時間落差相關與多元迴歸結果。"""
+        return await asyncio.to_thread(profiling.maybe_profile, "compare_statistics", _compare_statistics_internal, series, begin, end, level, max_lag)
 
     @mcp.tool()
-    def get_statistics_data(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None) -> str:
-        return _get_statistics_data_internal(tid, cid, sid, begin, end)
+    @metrics.timed(TOOL_SECONDS, tool="get_cache_stats")
+    def get_cache_stats() -> str:
+        return _get_cache_stats_internal()
 
     @mcp.tool()
-    def generate_dashboard_html(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None) -> str:
-        return _generate_dashboard_html_internal(tid, cid, sid, begin, end)
+    async def profile_tool_call(tool: str, arguments: Optional[Dict[str, Any]] = None) -> str:
+        """以 profiler 執行一次工具呼叫 (例如 tool="analyze_statistics_report", arguments={"tid": ..., "cid": ..., "sid": ...})，
+        回傳原本的結果、各階段耗時與最耗時的函式。"""
+        return await asyncio.to_thread(_profile_tool_call_internal, tool, arguments)
 
     @mcp.tool()
-    def analyze_statistics_report(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None) -> str:
-        return _analyze_statistics_report_internal(tid, cid, sid, begin, end)
+    def get_metrics() -> str:
+        """各階段耗時 (p50 / p95 / p99) 與上游失敗次數 (依類型)。"""
+        return _get_metrics_internal()
 
     print("Starting MCP Server...", file=sys.stderr)
+    _start_warm_up()
     mcp.run()
 
 # --- Mode 2: FastAPI Server Setup ---
 
 def run_api_server():
     try:
-        from fastapi import FastAPI, Response
-        from fastapi.responses import PlainTextResponse
+        from contextlib import asynccontextmanager
+        from fastapi import FastAPI, HTTPException, Query, Request, Response
+        from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+        from pydantic import BaseModel, Field
         import uvicorn
+        from http_compression import CompressionMiddleware
     except ImportError:
         print("Error: fastapi or uvicorn not installed. Please run 'pip install fastapi uvicorn'")
         sys.exit(1)
 
-    app = FastAPI(title="Taoyuan Statistics API")
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await upstream_client.aclose()
+        _shutdown_process_pool()
+        prefetcher.stop()
+
+    app = FastAPI(title="Taoyuan Statistics API", lifespan=lifespan)
+    # gzip / br 壓縮 (小於 TAOYUAN_COMPRESS_MIN_SIZE 的回應不壓縮)
+    app.add_middleware(CompressionMiddleware)
+    # 最外層：量測含壓縮在內的完整回應時間
+    app.add_middleware(metrics.MetricsMiddleware, metric=HTTP_SECONDS)
+
+    def cache_validators(request: Request, entry, version: Optional[str] = None):
+        """回傳 (快取標頭, 是否可直接回 304)；version 為輸出樣板等會影響內容的額外版本資訊"""
+        query_items = request.query_params.multi_items()
+        if version:
+            query_items.append(("_version", version))
+        headers = _http_cache_headers(entry, request.url.path, query_items)
+        return headers, _etag_matches(request.headers.get("if-none-match"), headers["ETag"])
+
+    def profiled_response(tool: str, **arguments):
+        """?profile=true：以 profiler 執行同一個工具，回傳 {"result", "profile"} (async 路由以 to_thread 呼叫)。
+        剖析會寫檔且同一時間只能執行一個，因此預設關閉，需設定 TAOYUAN_PROFILE_ALLOW=1。"""
+        if not profiling.PROFILE_ALLOW:
+            raise HTTPException(status_code=403, detail="Profiling is disabled (set TAOYUAN_PROFILE_ALLOW=1 to enable ?profile=true)")
+        try:
+            return JSONResponse(_profile_tool(tool, arguments))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     @app.get("/search_statistics")
-    def api_search_statistics(keyword: str):
+    def api_search_statistics(keyword: str, profile: bool = False):
+        if profile:
+            return profiled_response("search_statistics", keyword=keyword)
         result = _search_statistics_internal(keyword)
         # Parse JSON string back to object for proper API JSON response
         try:
@@ -318,22 +802,124 @@ def run_api_server():
         except:
             return result
 
+    # 以下路由皆為 async：等待上游 API 時不佔用 threadpool worker，
+    # 只有 CPU 密集的分析 / 檔案寫入才丟到 thread 執行。
     @app.get("/get_statistics_data")
-    def api_get_statistics_data(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None):
-        result = _get_statistics_data_internal(tid, cid, sid, begin, end)
-        try:
-            return json.loads(result)
-        except:
-            return result
+    async def api_get_statistics_data(
+        request: Request,
+        tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None,
+        format: str = Query("json", pattern="^(json|ndjson)$"),
+        limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT),
+        offset: int = Query(0, ge=0),
+        profile: bool = False,
+    ):
+        if profile:
+            return await asyncio.to_thread(profiled_response, "get_statistics_data", tid=tid, cid=cid, sid=sid, begin=begin, end=end)
+        entry = await _fetch_entry_internal_async(tid, cid, sid, begin, end)
+        if entry is None:
+            return FETCH_FAILED_MSG
+        headers, not_modified = cache_validators(request, entry)
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+        data = entry.data
+        # format=ndjson：完整資料逐列串流；有 limit 或 offset 時：分頁 JSON (只給 offset 時每頁 PAGE_DEFAULT_LIMIT 筆)；
+        # 否則維持原本的回應 (大型資料只給預覽)
+        if format == "ndjson":
+            rows = _payload_rows(data)
+            return StreamingResponse(
+                _iter_ndjson(rows, offset, limit),
+                media_type="application/x-ndjson",
+                headers={**headers, "X-Total-Count": str(len(rows))},
+            )
+        with STAGE_SECONDS.time(stage="serialize"):
+            if limit is not None or offset:
+                page_size = limit if limit is not None else min(PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT)
+                return JSONResponse(_page_statistics_data(data, page_size, offset), headers=headers)
+            return JSONResponse(_statistics_data_payload(data), headers=headers)
 
     @app.get("/generate_dashboard_html")
-    def api_generate_dashboard_html(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None):
-        return {"message": _generate_dashboard_html_internal(tid, cid, sid, begin, end)}
+    async def api_generate_dashboard_html(request: Request, tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None, profile: bool = False):
+        if profile:
+            return await asyncio.to_thread(profiled_response, "generate_dashboard_html", tid=tid, cid=cid, sid=sid, begin=begin, end=end)
+        entry = await _fetch_entry_internal_async(tid, cid, sid, begin, end)
+        if entry is None:
+            return {"message": _render_dashboard_html(tid, cid, sid, None)}
+        # 輸出檔由資料與樣板決定：兩者都沒變就回 304，不必重新產生
+        try:
+            headers, not_modified = cache_validators(request, entry, dashboard_store.template.version())
+        except (FileNotFoundError, ValueError) as e:
+            return {"message": f"Error creating dashboard: {e}"}
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+        message = await asyncio.to_thread(_render_dashboard_html, tid, cid, sid, entry.data, begin, end, entry.etag)
+        return JSONResponse({"message": message}, headers=headers)
+
+    @app.get("/dashboard", response_class=HTMLResponse)
+    async def api_dashboard(request: Request, tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None):
+        # 直接由記憶體回傳 dashboard (樣板已內嵌 CSS / JS)，不寫檔也不必回傳檔案路徑
+        entry = await _fetch_entry_internal_async(tid, cid, sid, begin, end)
+        if not entry or not entry.data:
+            return HTMLResponse("Error: No Data Found from API.", status_code=404)
+        try:
+            headers, not_modified = cache_validators(request, entry, dashboard_store.template.version())
+        except (FileNotFoundError, ValueError) as e:
+            return HTMLResponse(f"Error creating dashboard: {e}", status_code=500)
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+        cache_key = make_key(tid, cid, sid, *_resolve_period(begin, end))
+        with STAGE_SECONDS.time(stage="dashboard_render"):
+            _, html = await asyncio.to_thread(dashboard_store.render, cache_key, entry.data, entry.etag)
+        return HTMLResponse(html, headers=headers)
 
     @app.get("/analyze_statistics_report", response_class=PlainTextResponse)
-    def api_analyze_statistics_report(tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None):
+    async def api_analyze_statistics_report(request: Request, tid: str, cid: str, sid: str, begin: Optional[str] = None, end: Optional[str] = None, profile: bool = False):
+        if profile:
+            return await asyncio.to_thread(profiled_response, "analyze_statistics_report", tid=tid, cid=cid, sid=sid, begin=begin, end=end)
         # 重要：回傳純文字，不要被 JSON 再次跳脫
-        return _analyze_statistics_report_internal(tid, cid, sid, begin, end)
+        entry = await _fetch_entry_internal_async(tid, cid, sid, begin, end)
+        if entry is None:
+            return ANALYSIS_FAILED_MSG
+        # 報告完全由資料決定：資料沒變就回 304，連分析都不用重跑
+        headers, not_modified = cache_validators(request, entry)
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+        report = await asyncio.to_thread(_render_analysis_report, tid, cid, sid, begin, end, entry.data, entry.etag)
+        return PlainTextResponse(report, headers=headers)
+
+    class BatchRequest(BaseModel):
+        series: List[str]
+        begin: Optional[str] = None
+        end: Optional[str] = None
+
+    @app.post("/analyze_statistics_batch")
+    async def api_analyze_statistics_batch(request: BatchRequest):
+        try:
+            return await _analyze_batch_async(request.series, request.begin, request.end)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    class CompareRequest(BaseModel):
+        series: List[str]
+        begin: Optional[str] = None
+        end: Optional[str] = None
+        level: Literal["auto", "district", "date"] = "auto"
+        max_lag: int = Field(3, ge=0, le=COMPARE_MAX_LAG_LIMIT)
+
+    @app.post("/compare_statistics", response_class=PlainTextResponse)
+    async def api_compare_statistics(request: CompareRequest):
+        try:
+            return await _compare_statistics_internal_async(request.series, request.begin, request.end, request.level, request.max_lag)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.get("/cache_stats")
+    def api_cache_stats():
+        return _get_fetch_stats()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def api_metrics():
+        # Prometheus text exposition format
+        return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
     # Health check for ngrok
     @app.get("/")
@@ -341,11 +927,18 @@ def run_api_server():
         return {"status": "ok", "service": "Taoyuan Statistics API"}
 
     print("Starting FastAPI Server via Uvicorn...", file=sys.stderr)
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    _start_warm_up()
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8000")))
 
 # --- Entry Point ---
 
 if __name__ == "__main__":
+    # --mirror / --mirror-only：由離線鏡像回答 (可與 api / mcp 模式併用)
+    if "--mirror-only" in sys.argv:
+        mirror_mode = "only"
+    elif "--mirror" in sys.argv:
+        mirror_mode = "1"
+    sys.argv = [a for a in sys.argv if a not in ("--mirror", "--mirror-only")]
     # Check for arguments
     if len(sys.argv) > 1:
         mode = sys.argv[1].lower()
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Single-flight 請求合併
+# 同一時間有多個呼叫者要抓同一組 (tid, cid, sid, begin, end) 時，
+# 只讓第一個 (leader) 真的打上游 API，其餘呼叫者等待並共用同一份結果。
+# thread 與 asyncio 的呼叫者登記在同一份表中，彼此也會合併。
+
+
+def _settle(future: Future, result: Any = None, error: BaseException = None) -> None:
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass  # 已被取消 (leader 被取消) 時不再寫入結果
+
+
+class SingleFlight:
+    """同時支援 thread (MCP / 同步路徑) 與 asyncio (FastAPI 非同步路徑) 的請求合併。
+
+    兩條路徑共用同一份進行中的呼叫 (concurrent.futures.Future)：背景預取 (thread) 與前景的非同步請求
+    同時要求同一個 key 時也只打一次上游。do() 會阻塞等待，不可在 event loop 的 thread 上呼叫。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def _join(self, key: Hashable):
+        """回傳 (future, 是否為 leader)；沒有進行中的呼叫時登記一個新的。"""
+        with self._lock:
+            self.calls += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.executions += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """執行 fn()；若同一個 key 已有進行中的呼叫 (同步或非同步)，則等待其結果。"""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            _settle(future, error=e)
+            raise
+        else:
+            _settle(future, result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """do() 的非同步版本；leader 可能是另一個 thread 或 event loop，以 asyncio.wrap_future 等待。"""
+        future, leader = self._join(key)
+        if not leader:
+            waiter = asyncio.wrap_future(future)
+            # 等待者被取消後 leader 才失敗時，避免 "exception was never retrieved" 警告
+            waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+            # shield: 單一等待者被取消時不影響 leader 與其他等待者
+            return await asyncio.shield(waiter)
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            _settle(future, error=e)
+            raise
+        else:
+            _settle(future, result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "calls": self.calls,
+            "upstream_executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": in_flight,
+        }
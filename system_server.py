@@ -1,4 +1,4 @@
-import requests
+import upstream_client
 import json
 import socket
 from mcp.server.fastmcp import FastMCP
@@ -39,7 +39,7 @@ def get_ip_address() -> str:
         }
         
         # 這是 akamai 提供的節點，回傳純文字 IP，非常乾淨快速
-        response = requests.get("http://whatismyip.akamai.com/", headers=headers, timeout=10)
+        response = upstream_client.get("http://whatismyip.akamai.com/", headers=headers, connect_timeout=5, read_timeout=10)
         
         if response.status_code == 200:
             result["external_ip"] = response.text.strip()
@@ -0,0 +1,98 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import analysis_engine
+
+def _payload():
+    rows = []
+    for year in ("2021", "2022", "2023"):
+        for metric, base in (("人口數", 100), ("戶數", 40)):
+            values = {"桃園區": base, "中壢區": base * 2 + int(year) - 2021}
+            for district, value in values.items():
+                rows.append({"DataDate": year, "PlaceName": "", "ComplexName1": metric, "ComplexName2": district, "FValue": value})
+            rows.append({"DataDate": year, "PlaceName": "", "ComplexName1": metric, "ComplexName2": "桃園市", "FValue": sum(values.values())})
+    return {"EffectiveComplexName": "人口", "Header": {"ComplexHeaderName2": "行政區"}, "Data": rows}
+
+def test_pivot_long_format():
+    print("=" * 60)
+    print("長表 pivot 測試")
+    print("=" * 60)
+    cube = analysis_engine.pivot_long_format(_payload())
+    assert cube.shape == (3, 2, 3)
+    assert cube.dates == ["2021", "2022", "2023"]
+    assert cube.metrics == ["人口數", "戶數"]
+    assert cube.values[2, 0, cube.districts.index("中壢區")] == 202
+    print("   ✓ 轉成 (日期 × 指標 × 地區) 陣列")
+
+    # 同一儲存格重複出現時加總，無法轉成數字的值視為缺值
+    cube = analysis_engine.pivot_long_format({"Data": [
+        {"DataDate": "2023", "ComplexName1": "A", "ComplexName2": "x", "FValue": 1},
+        {"DataDate": "2023", "ComplexName1": "A", "ComplexName2": "x", "FValue": "2"},
+        {"DataDate": "2023", "ComplexName1": "A", "PlaceName": "y", "FValue": "-"},
+    ]})
+    assert cube.districts == ["x", "y"]
+    assert cube.values[0, 0, 0] == 3 and np.isnan(cube.values[0, 0, 1])
+    print("   ✓ 重複儲存格加總、ComplexName2 空白時使用 PlaceName")
+
+def test_analyze_cube():
+    analysis = analysis_engine.analyze_cube(analysis_engine.pivot_long_format(_payload()))
+    assert analysis.total_row_excluded and analysis.district_count == 2
+    people = analysis.metrics["人口數"]
+    assert people.per_date == [300.0, 301.0, 302.0]
+    assert people.max_at == ("中壢區", "2023") and people.max_value == 202
+    assert abs(people.slope - 1.0) < 1e-9
+    assert people.top10[0] == ("中壢區", "2023", 202.0)
+    assert analysis.correlation[:2] == ("人口數", "戶數")
+    print("   ✓ 各指標總計 / 極值 / 趨勢 / 排行正確，並排除總計列")
+
+    report = analysis_engine.render_cube_report(analysis, "0001", "0001", "000001", "2021", "2023", _payload())
+    assert "3 期 × 2 個指標 × 2 個行政區" in report
+    print("   ✓ 報告產生成功")
+
+def test_compare_series():
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=(40, 4))
+    y[rng.random((40, 4)) < 0.2] = np.nan
+    corr, _ = analysis_engine.correlation_matrix(y)
+    expected = pd.DataFrame(y).corr().to_numpy()
+    assert np.allclose(corr, expected, equal_nan=True)
+    print("   ✓ 相關係數矩陣與 pandas corr 一致 (含缺值)")
+
+    # b 比 a 領先 1 期；人口資料使用民國年，仍可與西元年對齊
+    years = list(range(2010, 2022))
+    driver = rng.normal(size=len(years) + 1).cumsum()
+    a = [{"年別": str(y), "事故": float(driver[i])} for i, y in enumerate(years)]
+    b = [{"年別": f"{y - 1911}年", "人口": float(driver[i + 1])} for i, y in enumerate(years)]
+    result = analysis_engine.compare_series([
+        analysis_engine.series_from_records(a, "A"),
+        analysis_engine.series_from_records(b, "B"),
+    ])
+    assert result.level == "date" and result.key_count == len(years)
+    lag, r = result.lagged["B:人口"]
+    assert lag == 1 and r > 0.999
+    print("   ✓ 依年份對齊並找出落差期數")
+
+def test_dashboard_payload():
+    payload = _payload()
+    model = analysis_engine.build_dashboard_payload(payload)
+    assert model["format"] == "columnar-v1" and model["totalRecords"] == len(payload["Data"])
+    assert model["metrics"] == ["人口數", "戶數"] and model["years"] == ["2021", "2022", "2023"]
+    start, end = model["metricOffsets"][0], model["metricOffsets"][1]
+    assert end - start == 9
+    stats = model["stats"][0]
+    assert stats["sum"] == sum(r["FValue"] for r in payload["Data"] if r["ComplexName1"] == "人口數")
+    top = stats["top"][0]
+    assert model["districts"][model["columns"]["district"][top]] == "桃園市" and model["columns"]["value"][top] == 302
+    assert model["series"][0][model["districts"].index("中壢區")] == [200, 201, 202]
+    print("   ✓ dashboard 欄式資料 (分組 / 統計 / 排行 / 趨勢矩陣) 正確")
+
+if __name__ == "__main__":
+    test_pivot_long_format()
+    test_analyze_cube()
+    test_compare_series()
+    test_dashboard_payload()
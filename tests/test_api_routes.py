@@ -0,0 +1,160 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Server 匯入時會開啟快取檔，測試時改用暫存目錄
+os.environ.setdefault("TAOYUAN_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "cache.sqlite3"))
+
+import json
+
+import uvicorn
+from fastapi.testclient import TestClient
+
+import server
+from response_cache import CacheEntry, payload_etag
+
+def _long_payload(scale=1, rows=9):
+    data = []
+    for i in range(rows):
+        year = str(2015 + i)
+        data.append({"DataDate": year, "PlaceName": "", "ComplexName1": "人口數", "ComplexName2": "桃園區", "FValue": (100 + i) * scale})
+        data.append({"DataDate": year, "PlaceName": "", "ComplexName1": "人口數", "ComplexName2": "中壢區", "FValue": (200 + i * i) * scale})
+    return {"Header": {"ComplexHeaderName2": "行政區"}, "Data": data}
+
+CATALOG_CSV = "所屬資料庫,tid,所屬類別,cid,資料名稱,sid\n桃園市統計年報,1,人口,1,現住人口數,1\n"
+
+PAYLOADS = {
+    "000001": _long_payload(),
+    "000002": _long_payload(scale=2),
+    "000003": {"Header": {}, "Data": [{"DataDate": str(2015 + i), "ComplexName1": "人口數", "ComplexName2": "桃園區", "FValue": "-"} for i in range(9)]},
+    "000004": [{"年別": str(2000 + i), "數量": i} for i in range(120)],
+}
+
+async def _fake_fetch(tid, cid, sid, begin, end):
+    data = PAYLOADS.get(sid)
+    if data is None:
+        return None
+    return CacheEntry(data, payload_etag(repr(data).encode("utf-8")), 4102444800.0)
+
+@contextmanager
+def _client():
+    """啟動 API 模式 (不實際監聽)，上游改由 PAYLOADS 回應。"""
+    captured = {}
+    saved = (uvicorn.run, server._start_warm_up, server._fetch_entry_internal_async)
+    uvicorn.run = lambda app, **kwargs: captured.setdefault("app", app)
+    server._start_warm_up = lambda: None
+    server._fetch_entry_internal_async = _fake_fetch
+    try:
+        server.run_api_server()
+        yield TestClient(captured["app"], raise_server_exceptions=False)
+    finally:
+        uvicorn.run, server._start_warm_up, server._fetch_entry_internal_async = saved
+
+def test_compare_validation():
+    print("=" * 60)
+    print("測試 API 路由")
+    print("=" * 60)
+
+    with _client() as client:
+        response = client.post("/compare_statistics", json={"series": ["1-1-1", "1-1-2"], "level": "date"})
+        assert response.status_code == 200 and "跨資料集比較" in response.text
+
+        for body in ({"series": ["1-1-1", "1-1-2"], "level": "city"}, {"series": ["1-1-1", "1-1-2"], "max_lag": -1}):
+            assert client.post("/compare_statistics", json=body).status_code == 422
+        print("   ✓ level 只接受 auto / district / date，max_lag 不可為負")
+
+        for series in (["1-1-1", "1-1-3"], ["1-1-1", "1-1-9"], ["1-1-1:不存在", "1-1-2"], []):
+            response = client.post("/compare_statistics", json={"series": series})
+            assert response.status_code == 400, (series, response.status_code, response.text)
+        assert "沒有可用的數值資料" in client.post("/compare_statistics", json={"series": ["1-1-1", "1-1-3"]}).json()["detail"]
+        assert server._compare_statistics_internal(["1-1-1", "1-1-2"], level="city").startswith("Error:")
+    print("   ✓ 沒有數值 / 抓取失敗 / 指標不存在時回 400，MCP 工具回傳錯誤訊息")
+
+def test_generate_dashboard_conditional_get():
+    with tempfile.TemporaryDirectory() as tmp, _client() as client:
+        saved = server.dashboard_store.out_dir
+        server.dashboard_store.out_dir = tmp
+        try:
+            params = {"tid": "0001", "cid": "0001", "sid": "000001", "begin": "2015", "end": "2023"}
+            first = client.get("/generate_dashboard_html", params=params)
+            assert first.status_code == 200 and "Dashboard generated" in first.json()["message"]
+            assert first.headers["ETag"].startswith('W/"') and "max-age=" in first.headers["Cache-Control"]
+            again = client.get("/generate_dashboard_html", params=params, headers={"If-None-Match": first.headers["ETag"]})
+            assert again.status_code == 304 and again.headers["ETag"] == first.headers["ETag"]
+            # 其他資料的 ETag 不同，不會誤回 304
+            other = client.get("/generate_dashboard_html", params={**params, "sid": "000002"}, headers={"If-None-Match": first.headers["ETag"]})
+            assert other.status_code == 200 and other.headers["ETag"] != first.headers["ETag"]
+            # /dashboard 的 ETag 不可混用 (路徑不同)
+            assert client.get("/dashboard", params=params).headers["ETag"] != first.headers["ETag"]
+        finally:
+            server.dashboard_store.out_dir = saved
+    print("   ✓ /generate_dashboard_html 回傳 ETag / Cache-Control，資料未變時回 304")
+
+def test_paging_and_ndjson():
+    rows = PAYLOADS["000004"]
+    page = server._page_statistics_data(rows, 50, 100)
+    assert (page["total"], page["offset"], page["limit"], page["next_offset"]) == (120, 100, 50, None)
+    assert page["rows"] == rows[100:] and "meta" not in page
+    page = server._page_statistics_data(PAYLOADS["000001"], 5)
+    assert page["next_offset"] == 5 and page["rows"] == PAYLOADS["000001"]["Data"][:5]
+    assert page["meta"] == {"Header": {"ComplexHeaderName2": "行政區"}}
+    assert server._page_statistics_data({"Data": None}, 5)["total"] == 0
+    print("   ✓ 分頁：total / next_offset 正確，長表格式附上表頭資訊")
+
+    saved = server.NDJSON_CHUNK_ROWS
+    server.NDJSON_CHUNK_ROWS = 7
+    try:
+        chunks = list(server._iter_ndjson(rows, 10, 20))
+    finally:
+        server.NDJSON_CHUNK_ROWS = saved
+    assert len(chunks) == 3
+    lines = b"".join(chunks).decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == rows[10:30]
+    assert list(server._iter_ndjson(rows, 200)) == []
+    print("   ✓ NDJSON 依區塊輸出指定範圍的資料列")
+
+    with _client() as client:
+        params = {"tid": "0001", "cid": "0001", "sid": "000004"}
+        preview = client.get("/get_statistics_data", params=params).json()
+        assert "preview_data" in preview
+        paged = client.get("/get_statistics_data", params={**params, "offset": 100}).json()
+        assert paged["offset"] == 100 and paged["rows"] == rows[100:] and paged["limit"] == server.PAGE_DEFAULT_LIMIT
+        paged = client.get("/get_statistics_data", params={**params, "limit": 10, "offset": 5}).json()
+        assert paged["rows"] == rows[5:15] and paged["next_offset"] == 15
+        response = client.get("/get_statistics_data", params={**params, "format": "ndjson", "offset": 118})
+        assert response.headers["X-Total-Count"] == "120"
+        assert [json.loads(line) for line in response.text.splitlines()] == rows[118:]
+        assert client.get("/get_statistics_data", params={**params, "limit": 0}).status_code == 422
+    print("   ✓ 只給 offset 時以預設筆數分頁，不再被忽略")
+
+def test_profile_requires_opt_in():
+    params = {"keyword": "人口", "profile": "true"}
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as data_dir, _client() as client:
+        # 目錄改用暫存的 CSV，避免讀取 (並在 data/ 寫出快照) 專案內的資料
+        csv_path = os.path.join(data_dir, "statistics.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write(CATALOG_CSV)
+        saved = (server.profiling.PROFILE_ALLOW, server.profiling.PROFILE_DIR, server.DATA_FILE, server._search_index)
+        server.profiling.PROFILE_DIR = tmp
+        server.DATA_FILE, server._search_index = csv_path, None
+        try:
+            server.profiling.PROFILE_ALLOW = False
+            assert client.get("/search_statistics", params=params).status_code == 403
+            assert client.get("/analyze_statistics_report", params={"tid": "0001", "cid": "0001", "sid": "000001", "profile": "true"}).status_code == 403
+            assert os.listdir(tmp) == []
+            server.profiling.PROFILE_ALLOW = True
+            body = client.get("/search_statistics", params=params).json()
+            assert set(body) == {"result", "profile"} and len(os.listdir(tmp)) == 1
+            assert [r["資料名稱"] for r in body["result"]] == ["現住人口數"]
+        finally:
+            server.profiling.PROFILE_ALLOW, server.profiling.PROFILE_DIR, server.DATA_FILE, server._search_index = saved
+    print("   ✓ ?profile=true 預設回 403，設定 TAOYUAN_PROFILE_ALLOW=1 後才剖析")
+
+if __name__ == "__main__":
+    test_compare_validation()
+    test_profile_requires_opt_in()
+    test_paging_and_ndjson()
+    test_generate_dashboard_conditional_get()
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Server 匯入時會開啟快取檔，測試時改用暫存目錄
+os.environ.setdefault("TAOYUAN_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "cache.sqlite3"))
+
+import httpx
+
+import server
+import upstream_client
+from response_cache import ResponseCache, make_key
+
+PAYLOAD = {"Header": {}, "Data": [{"DataDate": "2024", "ComplexName1": "人口數", "ComplexName2": "桃園區", "FValue": 1}]}
+
+class _ScriptedClient:
+    """依序回傳預先設定的結果 (httpx.Response 或例外)，最後一個結果重複使用。"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    async def get(self, url, params=None, headers=None, timeout=None):
+        self.calls += 1
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+class _PrefetcherStub:
+    def __init__(self):
+        self.revalidated = []
+
+    def record(self, key, params):
+        pass
+
+    def revalidate(self, key, params):
+        self.revalidated.append(key)
+
+def _patched(client, fn):
+    saved = (upstream_client.get_async_client, upstream_client.BACKOFF_FACTOR)
+    upstream_client.get_async_client = lambda verify=True: client
+    upstream_client.BACKOFF_FACTOR = 0
+    try:
+        return asyncio.run(fn())
+    finally:
+        upstream_client.get_async_client, upstream_client.BACKOFF_FACTOR = saved
+
+def test_async_get_retry():
+    print("=" * 60)
+    print("測試非同步上游請求")
+    print("=" * 60)
+
+    ok, busy, missing = httpx.Response(200, text="ok"), httpx.Response(503), httpx.Response(404)
+    url = "https://example.invalid"
+
+    client = _ScriptedClient(busy, ok)
+    assert _patched(client, lambda: upstream_client.async_get(url)).status_code == 200 and client.calls == 2
+    client = _ScriptedClient(busy)
+    assert _patched(client, lambda: upstream_client.async_get(url)).status_code == 503
+    assert client.calls == upstream_client.MAX_RETRIES + 1
+    client = _ScriptedClient(missing)
+    assert _patched(client, lambda: upstream_client.async_get(url)).status_code == 404 and client.calls == 1
+    print("   ✓ 5xx 重試，重試用盡回傳最後的回應；4xx 不重試")
+
+    client = _ScriptedClient(httpx.ReadTimeout("timed out"), httpx.ConnectError("refused"), ok)
+    assert _patched(client, lambda: upstream_client.async_get(url)).status_code == 200 and client.calls == 3
+    client = _ScriptedClient(httpx.ReadTimeout("timed out"))
+    try:
+        _patched(client, lambda: upstream_client.async_get(url))
+        assert False, "expected ReadTimeout"
+    except httpx.ReadTimeout:
+        pass
+    assert client.calls == upstream_client.MAX_RETRIES + 1
+    print("   ✓ 逾時 / 連線錯誤重試，重試用盡時拋出例外")
+
+def test_fetch_entry_async():
+    calls = []
+    on_loop = []
+
+    def handler(request):
+        calls.append(dict(request.url.params))
+        if request.url.params["sid"] == "000009":
+            return httpx.Response(500)
+        return httpx.Response(200, text=json.dumps(PAYLOAD, ensure_ascii=False))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(path=os.path.join(tmp, "cache.sqlite3"), ttl=60)
+        read = cache.get_entry
+
+        def get_entry(*args, **kwargs):
+            on_loop.append(threading.current_thread() is threading.main_thread())
+            return read(*args, **kwargs)
+
+        cache.get_entry = get_entry
+        stub = _PrefetcherStub()
+        saved = (server.response_cache, server.prefetcher)
+        server.response_cache, server.prefetcher = cache, stub
+
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            upstream_client.get_async_client = lambda verify=True: client
+            try:
+                first = await asyncio.gather(*[server._fetch_entry_internal_async("0001", "0001", "000001", "2020", "2024") for _ in range(5)])
+                again = await server._fetch_entry_internal_async("0001", "0001", "000001", "2020", "2024")
+                failed = await server._fetch_entry_internal_async("0001", "0001", "000009", "2020", "2024")
+                cache.set(make_key("0001", "0001", "000002", "2020", "2024"), PAYLOAD, ttl=-1)
+                stale = await server._fetch_entry_internal_async("0001", "0001", "000002", "2020", "2024")
+                return first, again, failed, stale
+            finally:
+                await client.aclose()
+
+        try:
+            first, again, failed, stale = _patched(None, scenario)
+        finally:
+            server.response_cache, server.prefetcher = saved
+
+    assert all(e.data == PAYLOAD for e in first) and len({e.etag for e in first}) == 1
+    assert again.data == PAYLOAD and again.etag == first[0].etag
+    assert sum(1 for c in calls if c["sid"] == "000001") == 1
+    print("   ✓ 同時的相同請求只打一次上游，之後由快取回應")
+
+    assert failed is None and sum(1 for c in calls if c["sid"] == "000009") == upstream_client.MAX_RETRIES + 1
+    print("   ✓ 上游失敗時回傳 None")
+
+    assert stale.stale and stale.data == PAYLOAD and stub.revalidated == [make_key("0001", "0001", "000002", "2020", "2024")]
+    assert not any(c["sid"] == "000002" for c in calls)
+    print("   ✓ 過期資料先回傳並在背景更新")
+
+    assert on_loop and not any(on_loop)
+    print("   ✓ 快取讀取不在 event loop 的 thread 上執行")
+
+class _SyncResponse:
+    def __init__(self, text):
+        self.status_code = 200
+        self.text = text
+        self.content = text.encode("utf-8")
+
+def test_refresh_coalesces_with_async_fetch():
+    sync_calls, async_calls = [], []
+    release = threading.Event()
+    body = json.dumps(PAYLOAD, ensure_ascii=False)
+
+    def fake_get(url, params=None, headers=None, verify=True, **kwargs):
+        sync_calls.append(params["sid"])
+        release.wait(5)
+        return _SyncResponse(body)
+
+    def handler(request):
+        async_calls.append(request.url.params["sid"])
+        return httpx.Response(200, text=body)
+
+    params = {"tid": "0001", "cid": "0001", "sid": "000003", "begin": "2020", "end": "2024", "type": "JSON"}
+    cache_key = make_key("0001", "0001", "000003", "2020", "2024")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = (server.response_cache, server.prefetcher, upstream_client.get)
+        server.response_cache = ResponseCache(path=os.path.join(tmp, "cache.sqlite3"), ttl=60)
+        server.prefetcher = _PrefetcherStub()
+        upstream_client.get = fake_get
+        refreshed = []
+
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            upstream_client.get_async_client = lambda verify=True: client
+            try:
+                # 背景預取 (同步路徑) 正在向上游抓取時，前景的非同步請求抓同一組資料
+                refresh = threading.Thread(target=lambda: refreshed.append(server._refresh_entry(cache_key, params)))
+                refresh.start()
+                while not sync_calls:
+                    await asyncio.sleep(0.01)
+                task = asyncio.ensure_future(server._fetch_entry_internal_async("0001", "0001", "000003", "2020", "2024"))
+                await asyncio.sleep(0.1)
+                release.set()
+                entry = await task
+                await asyncio.to_thread(refresh.join)
+                return entry
+            finally:
+                await client.aclose()
+
+        try:
+            entry = _patched(None, scenario)
+        finally:
+            server.response_cache, server.prefetcher, upstream_client.get = saved
+
+    assert sync_calls == ["000003"] and async_calls == []
+    assert entry.data == PAYLOAD and refreshed[0].etag == entry.etag
+    print("   ✓ 背景更新與非同步請求同時抓同一組資料時只打一次上游")
+
+if __name__ == "__main__":
+    test_async_get_retry()
+    test_fetch_entry_async()
+    test_refresh_coalesces_with_async_fetch()
@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Server 匯入時會開啟快取檔，測試時改用暫存目錄
+os.environ.setdefault("TAOYUAN_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "cache.sqlite3"))
+
+import server
+from response_cache import CacheEntry, payload_etag
+
+def _payload(scale=1):
+    rows = []
+    for year in ("2021", "2022", "2023"):
+        values = {"桃園區": 100 * scale, "中壢區": (200 + int(year) - 2021) * scale}
+        for district, value in values.items():
+            rows.append({"DataDate": year, "PlaceName": "", "ComplexName1": "人口數", "ComplexName2": district, "FValue": value})
+        rows.append({"DataDate": year, "PlaceName": "", "ComplexName1": "人口數", "ComplexName2": "桃園市", "FValue": sum(values.values())})
+    return {"EffectiveComplexName": "人口", "Header": {"ComplexHeaderName2": "行政區"}, "Data": rows}
+
+def _entry(data):
+    return CacheEntry(data, payload_etag(repr(data).encode("utf-8")), 0)
+
+def test_parse_series_ids():
+    print("=" * 60)
+    print("測試批次分析")
+    print("=" * 60)
+
+    items = server._parse_series_ids(["1-1-1", "0002/0003/000010", " 0001 - 0002 - 000005 ", "abc", "1-2"])
+    assert items[0] == {"series": "0001-0001-000001", "tid": "0001", "cid": "0001", "sid": "000001"}
+    assert items[1]["series"] == "0002-0003-000010"
+    assert items[2]["series"] == "0001-0002-000005"
+    assert items[3] == {"series": "abc", "error": items[3]["error"]} and "tid-cid-sid" in items[3]["error"]
+    assert "error" in items[4]
+    for bad in ([], ["1-1-1"] * (server.BATCH_MAX_ITEMS + 1)):
+        try:
+            server._parse_series_ids(bad)
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    print("   ✓ 解析 tid-cid-sid (補零、/ 分隔)，格式錯誤只標記該項，空白 / 過多時拒絕")
+
+def test_batch_item_errors():
+    payload = _payload()
+
+    def fake_fetch(tid, cid, sid, begin, end):
+        if sid == "000002":
+            return None
+        if sid == "000003":
+            raise RuntimeError("boom")
+        return _entry(payload)
+
+    saved = (server._fetch_entry_internal, server.BATCH_PROCESS_WORKERS)
+    server._fetch_entry_internal, server.BATCH_PROCESS_WORKERS = fake_fetch, 0
+    try:
+        result = server._analyze_batch(["1-1-1", "1-1-2", "1-1-3", "bad"], "2021", "2023")
+    finally:
+        server._fetch_entry_internal, server.BATCH_PROCESS_WORKERS = saved
+
+    assert (result["total"], result["succeeded"], result["failed"]) == (4, 1, 3)
+    by_series = {r["series"]: r for r in result["results"]}
+    assert by_series["0001-0001-000001"]["status"] == "ok" and "人口數" in by_series["0001-0001-000001"]["report"]
+    assert by_series["0001-0001-000002"]["error"] == "Unable to fetch data or empty response."
+    assert by_series["0001-0001-000003"] == {"series": "0001-0001-000003", "status": "error", "error": "boom"}
+    assert by_series["bad"]["status"] == "error"
+    assert server._analyze_batch_internal([]).startswith("Error:")
+    print("   ✓ 單一項目抓取失敗 / 例外 / 格式錯誤只記錄在該項目，不影響整批")
+
+def test_cube_follows_etag():
+    old, new = _payload(), _payload(scale=3)
+    first = server._render_analysis_report("0009", "0009", "000009", "2021", "2023", old, _entry(old).etag)
+    # 資料筆數相同但內容更新 (例如上游修正數值)：ETag 不同就不可沿用舊的 cube
+    second = server._render_analysis_report("0009", "0009", "000009", "2021", "2023", new, _entry(new).etag)
+    assert first != second
+    assert "中壢區 (603)" in first and "中壢區 (1809)" in second
+    again = server._render_analysis_report("0009", "0009", "000009", "2021", "2023", new, _entry(new).etag)
+    assert again == second
+    # 沒有 ETag 時不使用快取
+    assert server._render_analysis_report("0009", "0009", "000009", "2021", "2023", old) == first
+    print("   ✓ cube 快取以資料 ETag 驗證，內容更新後不會沿用舊的分析結果")
+
+if __name__ == "__main__":
+    test_parse_series_ids()
+    test_batch_item_errors()
+    test_cube_follows_etag()
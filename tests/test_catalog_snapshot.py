@@ -0,0 +1,69 @@
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog_snapshot
+
+CSV_TEXT = "所屬資料庫,tid,所屬類別,cid,資料名稱,sid\n桃園市統計年報,1,人口,2,現住人口數,5\n"
+
+def test_catalog_snapshot():
+    print("=" * 60)
+    print("目錄快照測試")
+    print("=" * 60)
+
+    tmp = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmp, "statistics_full.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write(CSV_TEXT)
+
+        # 第一次載入：沒有快照 -> 解析 CSV 並寫出快照
+        index = catalog_snapshot.load_catalog(csv_path)
+        snap = catalog_snapshot.snapshot_path(csv_path)
+        assert os.path.exists(snap)
+        record = index.records[0]
+        assert (record["tid"], record["cid"], record["sid"]) == ("0001", "0002", "000005")
+        print("   ✓ ID 已補零並寫出快照")
+
+        # 第二次載入：直接讀快照
+        assert catalog_snapshot._load_snapshot(csv_path, snap) is not None
+        assert catalog_snapshot.load_catalog(csv_path).search("人口")[0]["sid"] == "000005"
+        print("   ✓ 快照含預先建好的搜尋索引")
+
+        # 快照只含內建型別，不依賴 NgramIndex 類別的 pickle 格式
+        with open(snap, "rb") as f:
+            payload = pickle.load(f)
+        state = payload["index"]
+        assert payload["version"] == catalog_snapshot.SNAPSHOT_VERSION
+        assert type(state) is dict and all(type(v) is list for v in state["columns"].values())
+        assert all(type(v) is list for v in state["postings"].values())
+        restored = catalog_snapshot._load_snapshot(csv_path, snap)
+        assert restored.records == index.records and restored.postings == index.postings
+        print("   ✓ 快照以欄位 list 儲存，還原後與原索引相同")
+
+        # 舊版 (直接 pickle 索引物件) 的快照視為過期
+        payload["version"] = catalog_snapshot.SNAPSHOT_VERSION - 1
+        with open(snap, "wb") as f:
+            pickle.dump(payload, f)
+        assert catalog_snapshot._load_snapshot(csv_path, snap) is None
+        assert len(catalog_snapshot.load_catalog(csv_path)) == 1
+        assert catalog_snapshot._load_snapshot(csv_path, snap) is not None
+        print("   ✓ 舊版快照會被重建")
+
+        # CSV 更新後快照視為過期
+        time.sleep(0.01)
+        with open(csv_path, "a", encoding="utf-8") as f:
+            f.write("桃園市統計年報,1,人口,2,戶數,6\n")
+        assert catalog_snapshot._load_snapshot(csv_path, snap) is None
+        assert len(catalog_snapshot.load_catalog(csv_path)) == 2
+        print("   ✓ CSV 變更後會自動重建快照")
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    test_catalog_snapshot()
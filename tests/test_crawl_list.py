@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import crawl_list
+from crawl_list import EMPTY, ERROR, FOUND
+
+class _FakeResponse:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.url = "https://example.invalid/GetStaticData.aspx"
+
+class _FakeClient:
+    """依 (sid, begin) 回傳預先設定的回應；沒有設定的組合回傳空陣列。"""
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.calls = []
+
+    async def get(self, url, params=None, timeout=None):
+        self.calls.append((params["sid"], params["begin"]))
+        result = self.responses.get((params["sid"], params["begin"]), self.responses.get(params["sid"], (200, "[]")))
+        if isinstance(result, list):
+            result = result.pop(0) if len(result) > 1 else result[0]
+        if isinstance(result, Exception):
+            raise result
+        return _FakeResponse(*result)
+
+def _found_body(name="人口數"):
+    return json.dumps({"Header": {}, "Data": [{"Item": name, "FValue": "1"}]}, ensure_ascii=False)
+
+def _with_client(client, coro_fn):
+    saved = (crawl_list.upstream_client.get_async_client, crawl_list.upstream_client.BACKOFF_FACTOR)
+    crawl_list.upstream_client.get_async_client = lambda verify=True: client
+    crawl_list.upstream_client.BACKOFF_FACTOR = 0
+    try:
+        return asyncio.run(coro_fn())
+    finally:
+        crawl_list.upstream_client.get_async_client, crawl_list.upstream_client.BACKOFF_FACTOR = saved
+
+def test_adaptive_limiter():
+    print("=" * 60)
+    print("測試 AIMD 併發限制器")
+    print("=" * 60)
+
+    async def scenario():
+        limiter = crawl_list.AdaptiveLimiter(start=4, minimum=2, maximum=5)
+        await limiter.acquire()
+        await limiter.release(0.1, congested=False)
+        assert 4 < limiter.limit < 5
+        for _ in range(20):
+            await limiter.acquire()
+            await limiter.release(0.1, congested=False)
+        assert limiter.limit == 5
+        print("   ✓ 回應正常時逐步增加併發，不超過上限")
+
+        await limiter.acquire()
+        await limiter.release(0.1, congested=True)
+        assert limiter.limit == 2.5
+        await limiter.acquire()
+        await limiter.release(crawl_list.TARGET_LATENCY + 1, congested=False)
+        assert limiter.limit == 2.5
+        print("   ✓ 壅塞時減半，同一波壅塞只減半一次")
+
+        limiter.limit = 2
+        await limiter.acquire()
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done() and limiter.in_flight == 2
+        await limiter.release(0.1, congested=False)
+        await asyncio.wait_for(waiter, 1)
+        assert limiter.in_flight == 2 and limiter.requests == 26
+        print("   ✓ 超過併發上限的請求會等待")
+
+    asyncio.run(scenario())
+
+def test_parse_probe():
+    url = "https://example.invalid"
+    assert crawl_list._parse_probe("0001", "0001", "000001", "", url) == (EMPTY, None)
+    assert crawl_list._parse_probe("0001", "0001", "000001", "[]", url) == (EMPTY, None)
+    assert crawl_list._parse_probe("0001", "0001", "000001", '{"Header": {}, "Data": []}', url) == (EMPTY, None)
+    assert crawl_list._parse_probe("0001", "0001", "000001", "<html>系統維護中</html>", url) == (ERROR, None)
+    assert crawl_list._parse_probe("0001", "0001", "000001", '{"Data": "maintenance"}', url) == (ERROR, None)
+    status, record = crawl_list._parse_probe("0001", "0002", "000003", _found_body(), url)
+    assert status == FOUND and record["資料名稱"] == "人口數"
+    assert (record["tid"], record["cid"], record["sid"]) == ("0001", "0002", "000003")
+    print("   ✓ 空回應為 EMPTY，維護頁面 / 格式不符為 ERROR，有資料為 FOUND")
+
+def test_probe_status():
+    client = _FakeClient({
+        "000001": (200, _found_body()),
+        "000002": (404, "Not Found"),
+        "000003": (503, "busy"),
+        "000004": [(500, "error"), (200, "[]")],
+    })
+
+    async def scenario():
+        limiter = crawl_list.AdaptiveLimiter()
+        results = {sid: await crawl_list.probe(limiter, "0001", "0001", sid) for sid in ("000001", "000002", "000003", "000004")}
+        return results, limiter
+
+    results, limiter = _with_client(client, scenario)
+    assert results["000001"][0] == FOUND and results["000001"][2]
+    assert results["000002"][0] == ERROR
+    assert results["000003"][0] == ERROR
+    assert results["000004"][0] == EMPTY
+    assert sum(1 for sid, _ in client.calls if sid == "000003") == crawl_list.MAX_ATTEMPTS
+    assert sum(1 for sid, _ in client.calls if sid == "000002") == 1
+    assert limiter.in_flight == 0
+    print("   ✓ 4xx 為 ERROR 不重試，5xx 重試用盡為 ERROR，重試成功回傳結果")
+
+def test_needs_probe_and_extend():
+    now = time.time()
+    assert crawl_list.needs_probe(None, now)
+    assert crawl_list.needs_probe({"status": ERROR, "checked": now}, now)
+    assert not crawl_list.needs_probe({"status": FOUND, "checked": now - 3600}, now)
+    assert crawl_list.needs_probe({"status": FOUND, "checked": now - crawl_list.FOUND_MAX_AGE - 1}, now)
+    assert not crawl_list.needs_probe({"status": EMPTY, "checked": now - crawl_list.FOUND_MAX_AGE - 1}, now)
+    assert crawl_list.needs_probe({"status": EMPTY, "checked": now - crawl_list.EMPTY_MAX_AGE - 1}, now)
+    print("   ✓ 只有沒有紀錄、失敗或過期的組合需要重新探測")
+
+    ledger = {
+        "0001:0001:000037": {"status": FOUND},
+        "0001:0001:000038": {"status": EMPTY},
+        "0001:0002:000005": {"status": FOUND},
+        "0001:0003:000039": {"status": EMPTY},
+    }
+    upper = {("0001", "0001"): 39, ("0001", "0002"): 39, ("0001", "0003"): 39}
+    extra = crawl_list._extend_sid_ranges(ledger, upper)
+    assert extra == [("0001", "0001", f"{i:06d}") for i in range(40, 48)]
+    assert upper == {("0001", "0001"): 47, ("0001", "0002"): 39, ("0001", "0003"): 39}
+    assert crawl_list._extend_sid_ranges(ledger, upper) == []
+    print("   ✓ 最後一個有效 sid 接近上限時才往後延伸")
+
+def test_apply_catalog_diff():
+    columns = ["所屬資料庫", "tid", "所屬類別", "cid", "資料名稱", "sid", "統計資料檔案格式"]
+
+    def row(tid, cid, sid, name):
+        return dict(zip(columns, [f"資料庫_{tid}", tid, f"類別_{cid}", cid, name, sid, "url"]))
+
+    def empty(streak, full_range=True):
+        return {"status": EMPTY, "checked": 0, "hash": None, "record": None, "full_range": full_range, "empty_streak": streak}
+
+    saved = (crawl_list.ORIGINAL_CSV, crawl_list.OUTPUT_CSV)
+    with tempfile.TemporaryDirectory() as tmp:
+        crawl_list.ORIGINAL_CSV = os.path.join(tmp, "statistics.csv")
+        crawl_list.OUTPUT_CSV = os.path.join(tmp, "statistics_full.csv")
+        try:
+            pd.DataFrame([row("0001", "0001", "000001", "人工整理")], columns=columns).to_csv(crawl_list.ORIGINAL_CSV, index=False)
+            pd.DataFrame([
+                row("0001", "0001", "000001", "人工整理"),
+                row("0001", "0001", "000002", "舊名稱"),
+                row("0001", "0001", "000003", "已停止更新"),
+                row("0001", "0001", "000004", "暫時錯誤"),
+                row("0001", "0001", "000005", "確定移除"),
+            ], columns=columns).to_csv(crawl_list.OUTPUT_CSV, index=False)
+
+            ledger = {
+                "0001:0001:000001": empty(5),
+                "0001:0001:000002": {"status": FOUND, "checked": 0, "hash": "a", "record": row("0001", "0001", "000002", "新名稱")},
+                "0001:0001:000003": empty(1),
+                "0001:0001:000004": {"status": ERROR, "checked": 0, "hash": None, "record": None},
+                "0001:0001:000005": empty(crawl_list.REMOVE_AFTER_EMPTY),
+                "0001:0001:000006": empty(crawl_list.REMOVE_AFTER_EMPTY, full_range=False),
+                "0001:0002:000001": {"status": FOUND, "checked": 0, "hash": "b", "record": row("0001", "0002", "000001", "新項目")},
+            }
+            diff = crawl_list.apply_catalog_diff(ledger)
+            assert diff == {"added": ["0001:0002:000001"], "updated": ["0001:0001:000002"], "removed": ["0001:0001:000005"]}
+
+            result = crawl_list.catalog_snapshot.normalize_ids(pd.read_csv(crawl_list.OUTPUT_CSV))
+            names = dict(zip(result["sid"] + "@" + result["cid"], result["資料名稱"]))
+            assert names == {
+                "000001@0001": "人工整理", "000002@0001": "新名稱", "000003@0001": "已停止更新",
+                "000004@0001": "暫時錯誤", "000001@0002": "新項目",
+            }
+            assert crawl_list.apply_catalog_diff(ledger) == {"added": [], "updated": [], "removed": []}
+            print("   ✓ 差異更新：新增 / 更新，只有連續以完整期間確認沒有資料才移除，人工項目保留")
+        finally:
+            crawl_list.ORIGINAL_CSV, crawl_list.OUTPUT_CSV = saved
+
+def test_check_confirms_full_range():
+    client = _FakeClient({("000001", crawl_list.FULL_RANGE_BEGIN): (200, _found_body("已停止更新"))})
+    ledger = {}
+
+    async def scenario():
+        run = crawl_list.CrawlRun(ledger, known={"0001:0001:000001", "0001:0001:000002"})
+        statuses = [await run.check("0001", "0001", sid) for sid in ("000001", "000002", "000003")]
+        return statuses, run
+
+    saved = crawl_list.save_ledger
+    crawl_list.save_ledger = lambda ledger: None
+    try:
+        statuses, run = _with_client(client, scenario)
+    finally:
+        crawl_list.save_ledger = saved
+    assert statuses == [FOUND, EMPTY, EMPTY]
+    assert ("000001", crawl_list.FULL_RANGE_BEGIN) in client.calls and ("000003", crawl_list.FULL_RANGE_BEGIN) not in client.calls
+    assert ledger["0001:0001:000002"]["empty_streak"] == 1 and ledger["0001:0001:000003"]["empty_streak"] == 0
+    assert run.stats["discovered"] == 1
+    print("   ✓ 目錄中的項目在探測區間沒有資料時，以完整期間再確認")
+
+def test_walk_category_pruning():
+    calls = []
+
+    async def fake_check(self, tid, cid, sid):
+        calls.append((cid, int(sid)))
+        found = {"0001": {2}, "0002": set(), "0003": {3, 30}}[cid]
+        return FOUND if int(sid) in found else EMPTY
+
+    async def scenario():
+        run = crawl_list.CrawlRun({}, known=set())
+        await run.walk_category("0001", "0001", set())
+        await run.walk_category("0001", "0002", set())
+        await run.walk_category("0001", "0003", {30})
+        return run
+
+    async def widened():
+        # 種子只有 sid 3：預設門檻會在 sid 30 之前停止，放寬門檻後才找得到
+        found = []
+        for run, max_misses in ((crawl_list.CrawlRun({}, known=set()), None),
+                                (crawl_list.CrawlRun({}, known=set(), max_misses=30), None),
+                                (crawl_list.CrawlRun({}, known=set()), 30)):
+            calls.clear()
+            await run.walk_category("0001", "0003", {3}, max_misses)
+            found.append(30 in {s for _, s in calls})
+        return found
+
+    saved = crawl_list.CrawlRun.check
+    crawl_list.CrawlRun.check = fake_check
+    try:
+        run = asyncio.run(scenario())
+        snapshot = list(calls)
+        found = asyncio.run(widened())
+    finally:
+        crawl_list.CrawlRun.check = saved
+    calls[:] = snapshot
+
+    walked = lambda cid: sorted({s for c, s in calls if c == cid})
+    assert walked("0002") == list(range(1, crawl_list.CATEGORY_SAMPLE_SIZE + 1))
+    assert run.stats["pruned_categories"] == 1
+    print("   ✓ 抽樣全部不存在的類別整個跳過")
+
+    # 最後一個有效 sid 之後連續 MAX_CONSECUTIVE_MISSES 個不存在就停止
+    assert max(walked("0001")) < 2 + crawl_list.MAX_CONSECUTIVE_MISSES + crawl_list.WALK_BATCH
+    # 已知的種子 sid 之前不會提早停止
+    assert 30 in walked("0003") and max(walked("0003")) < 30 + crawl_list.MAX_CONSECUTIVE_MISSES + crawl_list.WALK_BATCH
+    print("   ✓ 連續多個不存在時停止，不會在已知的 sid 之前停止")
+
+    assert found == [False, True, True]
+    print("   ✓ 停止門檻可由 CrawlRun / walk_category 的 max_misses 調整")
+
+if __name__ == "__main__":
+    test_adaptive_limiter()
+    test_parse_probe()
+    test_probe_status()
+    test_needs_probe_and_extend()
+    test_apply_catalog_diff()
+    test_check_confirms_full_range()
+    test_walk_category_pruning()
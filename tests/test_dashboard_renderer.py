@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard_renderer import DashboardStore, DashboardTemplate
+
+INDEX_HTML = '<html><head><link rel="stylesheet" href="style.css"></head><body><script>window.DASHBOARD_DATA = null;</script><script src="script.js"></script></body></html>'
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def test_dashboard_renderer():
+    print("=" * 60)
+    print("Dashboard 產生器測試")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _write(os.path.join(tmp, "index.html"), INDEX_HTML)
+        _write(os.path.join(tmp, "style.css"), "body { color: red; }")
+        _write(os.path.join(tmp, "script.js"), "console.log('v1');")
+        template = DashboardTemplate(tmp)
+
+        html = template.render({"Data": [{"ComplexName2": "</script><b>"}]})
+        assert "<style>" in html and "console.log('v1')" in html
+        assert 'src="script.js"' not in html and 'href="style.css"' not in html
+        assert '"Data": [{"ComplexName2": "<\\/script><b>"}]' in html
+        print("   ✓ CSS / JS 內嵌並注入資料 (</script> 已跳脫)")
+
+        # 內嵌檔案更新後自動重新編譯
+        version = template.version()
+        time.sleep(0.01)
+        _write(os.path.join(tmp, "script.js"), "console.log('v2');")
+        assert template.version() != version
+        assert "console.log('v2')" in template.render({})
+        print("   ✓ 樣板變更後自動重新載入")
+
+        out_dir = os.path.join(tmp, "out")
+        store = DashboardStore(template, out_dir=out_dir)
+        path = store.write("d.html", "k", {"Data": [1]}, etag="abc")
+        assert os.path.exists(path) and os.path.dirname(path) == out_dir
+        assert store.write("d.html", "k", {"Data": [1]}, etag="abc") == path
+        store.write("d.html", "k", {"Data": [2]}, etag="def")
+        stats = store.stats()
+        assert stats["writes"] == 2 and stats["skipped_writes"] == 1 and stats["renders"] == 2
+        print(f"   ✓ 資料未變時略過重寫: {stats}")
+
+if __name__ == "__main__":
+    test_dashboard_renderer()
@@ -0,0 +1,60 @@
+import gzip
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import http_compression
+from http_compression import CompressionMiddleware, choose_encoding
+
+def _app():
+    def big(request):
+        return PlainTextResponse("桃園" * 2000)
+
+    def small(request):
+        return PlainTextResponse("ok")
+
+    def stream(request):
+        return StreamingResponse((f"{i}\n".encode() for i in range(1000)), media_type="application/x-ndjson")
+
+    app = Starlette(routes=[Route("/big", big), Route("/small", small), Route("/stream", stream)])
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    return app
+
+def test_choose_encoding():
+    print("=" * 60)
+    print("回應壓縮測試")
+    print("=" * 60)
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("identity") is None
+    expected = "br" if http_compression.brotli is not None else "gzip"
+    assert choose_encoding("br, gzip") == expected
+    print("   ✓ 依 Accept-Encoding 選擇壓縮方式")
+
+def test_compression_middleware():
+    client = TestClient(_app())
+    r = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.text == "桃園" * 2000
+    assert int(r.headers["content-length"]) < 500
+    print("   ✓ 大型回應以 gzip 壓縮")
+
+    r = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers and r.text == "ok"
+    print("   ✓ 小於門檻的回應不壓縮")
+
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as r:
+        raw = b"".join(r.iter_raw())
+        assert r.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(raw).decode().splitlines()[-1] == "999"
+    print("   ✓ 串流回應逐段壓縮")
+
+if __name__ == "__main__":
+    test_choose_encoding()
+    test_compression_middleware()
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+def test_metrics():
+    print("=" * 60)
+    print("測試 metrics (histogram / counter)")
+    print("=" * 60)
+
+    registry = metrics.Registry()
+    latency = registry.histogram("test_seconds", "test latency", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 2.0):
+        latency.observe(value, stage="fetch")
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{stage="fetch",le="0.1"} 2' in text
+    assert 'test_seconds_bucket{stage="fetch",le="1"} 3' in text
+    assert 'test_seconds_bucket{stage="fetch",le="+Inf"} 4' in text
+    assert 'test_seconds_count{stage="fetch"} 4' in text
+    print("   ✓ histogram 的 bucket 為累計值 (Prometheus 格式)")
+
+    summary = registry.snapshot()["test_seconds"]["fetch"]
+    assert summary["count"] == 4 and abs(summary["sum"] - 2.6) < 1e-9
+    assert summary["p50"] == 0.1
+    print(f"   ✓ 摘要含 p50 / p95 / p99 ({summary['p50']}, {summary['p95']}, {summary['p99']})")
+
+    failures = registry.counter("test_failures_total", "failures", ("type",))
+    failures.inc(type="timeout")
+    failures.inc(type="timeout")
+    failures.inc(type="bad_json")
+    assert failures.value(type="timeout") == 2
+    assert 'test_failures_total{type="bad_json"} 1' in registry.render()
+    assert registry.counter("test_failures_total", "failures", ("type",)) is failures
+    print("   ✓ counter 依 label 分別計數，重複註冊取得同一個物件")
+
+    @metrics.timed(latency, stage="sync")
+    def work(x):
+        return x * 2
+
+    @metrics.timed(latency, stage="async")
+    async def work_async(x):
+        return x * 3
+
+    assert work(2) == 4 and asyncio.run(work_async(2)) == 6
+    assert work.__name__ == "work" and asyncio.iscoroutinefunction(work_async)
+    assert set(registry.snapshot()["test_seconds"]) == {"fetch", "sync", "async"}
+    print("   ✓ timed 裝飾器支援同步與 async 函式")
+
+if __name__ == "__main__":
+    test_metrics()
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 匯出時會匯入 Server (共用 headers 與回應檢查)，Server 匯入時會開啟快取檔，測試時改用暫存目錄
+os.environ.setdefault("TAOYUAN_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "cache.sqlite3"))
+
+import httpx
+
+import server
+import upstream_client
+from offline_mirror import OfflineMirror, _fetch_upstream, export_catalog, row_year
+
+def _long_payload():
+    rows = [{"DataDate": str(y), "ComplexName1": "人口", "ComplexName2": "桃園區", "FValue": y - 2000} for y in range(2015, 2025)]
+    return {"Title": "測試", "Data": rows}
+
+def test_offline_mirror():
+    print("=" * 60)
+    print("測試離線鏡像")
+    print("=" * 60)
+
+    assert row_year("2023") == 2023
+    assert row_year("112年") == 2023
+    assert row_year("民國112年01月") == 2023
+    assert row_year("總計") is None
+    assert row_year("民國99年") == 2010 and row_year("2023-01") == 2023
+    assert row_year("10月") is None and row_year("1月") is None
+    print("   ✓ 西元 / 民國年份解析正確，只有月份的標籤不當成年份")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mirror = OfflineMirror(path=os.path.join(tmp, "mirror.sqlite3"), memory_series=1)
+        mirror.put("0001", "0001", "000001", _long_payload(), "1990", "2024")
+        mirror.put("0001", "0001", "000002", [{"年別": f"{y - 1911}年", "值": y} for y in range(2015, 2025)], "1990", "2024")
+
+        entry = mirror.get_entry("0001", "0001", "000001", "2020", "2022")
+        assert [r["DataDate"] for r in entry.data["Data"]] == ["2020", "2021", "2022"]
+        assert entry.data["Title"] == "測試"
+        assert mirror.get_entry("0001", "0001", "000001", "1990", "2030").data == _long_payload()
+        assert entry.etag != mirror.get_entry("0001", "0001", "000001", "2021", "2022").etag
+        print("   ✓ 長表資料依期間在本機切片")
+
+        rows = mirror.get_entry("0001", "0001", "000002", "2023", "2024").data
+        assert [r["值"] for r in rows] == [2023, 2024]
+        print("   ✓ 舊格式 (民國年) 資料依期間切片")
+
+        # 只有月份的列無法判斷年份，一律保留，不會被當成民國年切掉
+        monthly = _long_payload()
+        monthly["Data"] += [{"DataDate": f"{m}月", "ComplexName1": "人口", "ComplexName2": "桃園區", "FValue": m} for m in (1, 10, 12)]
+        mirror.put("0001", "0001", "000005", monthly, "1990", "2024")
+        dates = [r["DataDate"] for r in mirror.get_entry("0001", "0001", "000005", "2023", "2024").data["Data"]]
+        assert dates == ["2023", "2024", "1月", "10月", "12月"]
+        print("   ✓ 只有月份的列在切片時保留")
+
+        assert mirror.get_entry("0001", "0001", "000099", "2020", "2022") is None
+        stats = mirror.stats()
+        assert stats["series"] == 3 and stats["misses"] == 1 and stats["in_memory"] == 1
+        print(f"   ✓ 統計資訊正確 ({stats['series']} 組, {stats['total_bytes']} bytes)")
+
+        calls = []
+
+        async def fake_fetch(params):
+            calls.append(params["sid"])
+            if params["sid"] == "000003":
+                raise RuntimeError("HTTP 500")
+            return None if params["sid"] == "000004" else _long_payload()
+
+        records = [{"tid": "0001", "cid": "0001", "sid": f"{i:06d}"} for i in range(1, 5)]
+        result = asyncio.run(export_catalog(records, mirror, begin="1990", end="2024", fetch=fake_fetch))
+        assert sorted(calls) == ["000003", "000004"]
+        assert result == {"total": 4, "skipped": 2, "exported": 0, "empty": 1, "errors": 1}
+        result = asyncio.run(export_catalog(records, mirror, begin="1990", end="2024", full=True, fetch=fake_fetch))
+        assert result["exported"] == 2 and result["skipped"] == 0
+        print("   ✓ 匯出為增量模式，失敗與無資料的項目分開統計")
+        mirror.close()
+
+def test_reload_callback():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mirror.sqlite3")
+        reloads = []
+        mirror = OfflineMirror(path=path, recheck=0, on_reload=lambda: reloads.append(1))
+        writer = OfflineMirror(path=path)
+        writer.put("0001", "0001", "000001", _long_payload(), "1990", "2024")
+        first = mirror.get_entry("0001", "0001", "000001", "2015", "2024")
+        assert mirror.get_entry("0001", "0001", "000001", "2015", "2024").etag == first.etag and reloads == []
+
+        updated = _long_payload()
+        updated["Data"][0]["FValue"] = 999
+        writer.put("0001", "0001", "000001", updated, "1990", "2024")
+        entry = mirror.get_entry("0001", "0001", "000001", "2015", "2024")
+        assert reloads == [1] and entry.data == updated and entry.etag != first.etag
+        writer.close()
+        mirror.close()
+    print("   ✓ 鏡像檔被其他 process 更新時重新載入並通知呼叫端")
+
+    server._cube_cache["k"] = ("etag", object())
+    server.mirror.on_reload()
+    assert not server._cube_cache
+    print("   ✓ Server 在鏡像重新載入時清除 cube 快取")
+
+def test_export_uses_server_parser():
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("User-Agent"))
+        sid = request.url.params["sid"]
+        if sid == "000001":
+            return httpx.Response(200, text=json.dumps(_long_payload(), ensure_ascii=False))
+        if sid == "000002":
+            return httpx.Response(200, text="  ")
+        if sid == "000003":
+            return httpx.Response(200, text="<html>系統維護中</html>")
+        return httpx.Response(404)
+
+    async def run(mirror):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        saved = upstream_client.get_async_client
+        upstream_client.get_async_client = lambda verify=True: client
+        try:
+            records = [{"tid": "0001", "cid": "0001", "sid": f"{i:06d}"} for i in range(1, 5)]
+            return await export_catalog(records, mirror, begin="1990", end="2024", fetch=_fetch_upstream)
+        finally:
+            upstream_client.get_async_client = saved
+            await client.aclose()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mirror = OfflineMirror(path=os.path.join(tmp, "mirror.sqlite3"))
+        result = asyncio.run(run(mirror))
+        assert result == {"total": 4, "skipped": 0, "exported": 1, "empty": 1, "errors": 2}, result
+        assert mirror.get_entry("0001", "0001", "000001", "1990", "2024").data == _long_payload()
+        mirror.close()
+    assert seen and all(ua == server.get_headers()["User-Agent"] for ua in seen)
+    print("   ✓ 匯出使用 Server 的 headers 與回應檢查 (空回應 / 非 JSON / HTTP 錯誤分開處理)")
+
+if __name__ == "__main__":
+    test_offline_mirror()
+    test_reload_callback()
+    test_export_uses_server_parser()
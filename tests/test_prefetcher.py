@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prefetcher import Prefetcher
+
+def _wait_idle(prefetcher, timeout=5):
+    deadline = time.time() + timeout
+    while prefetcher.stats()["in_flight"] and time.time() < deadline:
+        time.sleep(0.01)
+
+def test_prefetcher():
+    print("=" * 60)
+    print("背景預取測試")
+    print("=" * 60)
+
+    now = time.time()
+    expiry = {"hot-expiring": now + 10, "hot-fresh": now + 3600, "cold": now + 10}
+    refreshed = []
+    lock = threading.Lock()
+
+    def refresh(key, params):
+        with lock:
+            refreshed.append((key, params))
+        expiry[key] = time.time() + 3600
+        return True
+
+    prefetcher = Prefetcher(refresh=refresh, expiry=expiry.get, ahead=60, min_score=2, concurrency=2)
+    for _ in range(3):
+        prefetcher.record("hot-expiring", {"sid": "1"})
+        prefetcher.record("hot-fresh", {"sid": "2"})
+        prefetcher.record("hot-missing", {"sid": "3"})
+    prefetcher.record("cold", {"sid": "4"})
+
+    assert sorted(k for _, k, _ in prefetcher.hot_keys()) == ["hot-expiring", "hot-fresh", "hot-missing"]
+    print("   ✓ 依請求頻率找出熱門項目")
+
+    # 只更新熱門且即將過期 (或已不在快取) 的項目
+    assert prefetcher.run_once() == 2
+    _wait_idle(prefetcher)
+    assert sorted(k for k, _ in refreshed) == ["hot-expiring", "hot-missing"]
+    assert ("hot-expiring", {"sid": "1"}) in refreshed
+    print("   ✓ 只預取熱門且即將過期的項目")
+
+    # 更新後不再重複預取
+    assert prefetcher.run_once() == 0
+    stats = prefetcher.stats()
+    assert stats["refreshed"] == 2 and stats["failures"] == 0
+    print(f"   ✓ 統計: {stats}")
+    prefetcher.stop()
+
+def test_revalidate_dedup():
+    gate = threading.Event()
+    calls = []
+
+    def refresh(key, params):
+        calls.append(key)
+        gate.wait(5)
+        return True
+
+    prefetcher = Prefetcher(refresh=refresh, expiry=lambda key: None)
+    for _ in range(5):
+        prefetcher.revalidate("k", {})
+    gate.set()
+    _wait_idle(prefetcher)
+    assert calls == ["k"] and prefetcher.stats()["revalidations"] == 1
+    print("   ✓ 同一筆過期資料只觸發一次背景更新")
+    prefetcher.stop()
+
+def test_failure_backoff():
+    calls = []
+
+    def refresh(key, params):
+        calls.append(key)
+        if key == "broken":
+            raise RuntimeError("upstream down")
+        return None if key == "empty" else True
+
+    prefetcher = Prefetcher(refresh=refresh, expiry=lambda key: None, failure_backoff=0.3)
+    for key in ("broken", "empty", "ok"):
+        prefetcher.revalidate(key, {})
+        _wait_idle(prefetcher)
+    for _ in range(5):
+        for key in ("broken", "empty", "ok"):
+            prefetcher.revalidate(key, {})
+            _wait_idle(prefetcher)
+    assert calls.count("broken") == 1 and calls.count("empty") == 1 and calls.count("ok") == 6
+    stats = prefetcher.stats()
+    assert stats["failures"] == 2 and stats["backing_off"] == 2 and stats["skipped"] == 10
+    print("   ✓ 更新失敗後在暫停期間內不再重試")
+
+    time.sleep(0.35)
+    assert prefetcher.stats()["backing_off"] == 0
+    prefetcher.revalidate("broken", {})
+    _wait_idle(prefetcher)
+    assert calls.count("broken") == 2
+    print("   ✓ 暫停期間過後恢復更新")
+    prefetcher.stop()
+
+if __name__ == "__main__":
+    test_prefetcher()
+    test_revalidate_dedup()
+    test_failure_backoff()
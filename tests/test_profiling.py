@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+import profiling
+
+STAGES = metrics.Registry().histogram("test_profile_stage_seconds", "stage", ("stage",))
+
+def slow_tool(n):
+    with STAGES.time(stage="build"):
+        values = [str(i) for i in range(n)]
+    with STAGES.time(stage="render"):
+        return ",".join(values)
+
+def test_profiling():
+    print("=" * 60)
+    print("測試單次呼叫的效能剖析")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        profiling.PROFILE_DIR = tmp
+        profiling.PROFILE_KEEP = 2
+        result, report = profiling.profile_call("slow_tool", slow_tool, 20000)
+        assert result == slow_tool(20000)
+        assert set(report["stages"]) == {"build", "render"}
+        assert report["wall_seconds"] >= sum(report["stages"].values())
+        print(f"   ✓ 回傳原本的結果與各階段耗時 {report['stages']}")
+
+        names = [f["function"] for f in report["top_functions"]]
+        assert any("slow_tool" in n for n in names)
+        assert os.path.exists(report["profile_path"])
+        print(f"   ✓ 函式耗時排行與 .prof 檔 ({os.path.basename(report['profile_path'])})")
+
+        for _ in range(3):
+            profiling.profile_call("slow_tool", slow_tool, 10)
+        assert len([f for f in os.listdir(tmp) if f.endswith(".prof")]) == 2
+        print("   ✓ 只保留最近 PROFILE_KEEP 份剖析檔")
+
+        # 沒有開啟 TAOYUAN_PROFILE 時不剖析也不存檔
+        profiling.PROFILE_ALL = False
+        before = sorted(os.listdir(tmp))
+        assert profiling.maybe_profile("slow_tool", slow_tool, 5) == "0,1,2,3,4"
+        assert sorted(os.listdir(tmp)) == before
+        print("   ✓ 預設關閉，不影響一般呼叫")
+
+        # 已有呼叫正在剖析時，其他呼叫不排隊，直接執行
+        profiling.PROFILE_ALL = True
+        try:
+            with profiling._profile_lock:
+                assert profiling.maybe_profile("slow_tool", slow_tool, 5) == "0,1,2,3,4"
+            assert sorted(os.listdir(tmp)) == before
+            assert profiling.maybe_profile("slow_tool", slow_tool, 5) == "0,1,2,3,4"
+            assert sorted(os.listdir(tmp)) != before
+        finally:
+            profiling.PROFILE_ALL = False
+        print("   ✓ TAOYUAN_PROFILE=1 時不會因剖析而讓其他呼叫排隊")
+
+if __name__ == "__main__":
+    test_profiling()
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache, make_key
+
+def test_response_cache():
+    print("=" * 60)
+    print("回應快取測試")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        cache = ResponseCache(path=path, ttl=60, max_bytes=10_000_000)
+        key = make_key("0001", "0002", "000005", "2021", "2025")
+        payload = {"Header": {"FValueHeaderName": "數量"}, "Data": [{"DataDate": "2024", "FValue": 1}]}
+
+        # 測試 1: 未命中 -> 寫入 -> 命中
+        assert cache.get(key) is None
+        cache.set(key, payload)
+        assert cache.get(key) == payload
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        print(f"   ✓ 命中/未命中計數正確: {stats['hits']}/{stats['misses']}")
+
+        # 測試 2: 重新開啟後仍然存在
+        reopened = ResponseCache(path=path, ttl=60, max_bytes=10_000_000)
+        assert reopened.get(key) == payload
+        print("   ✓ 重新啟動後快取仍有效")
+
+        # ETag 由快取內容決定：內容相同 ETag 相同，內容改變 ETag 跟著變
+        entry = reopened.get_entry(key)
+        assert entry.data == payload and entry.expires > time.time()
+        assert cache.set(key, payload).etag == entry.etag
+        assert cache.set(key, {"Data": []}).etag != entry.etag
+        cache.set(key, payload)
+        print("   ✓ ETag 隨內容變化")
+
+        # 測試 3: TTL 過期
+        cache.set("expired", payload, ttl=-1)
+        assert cache.get("expired") is None
+        print("   ✓ 過期資料不會被回傳")
+
+        # 測試 4: 容量上限與 LRU 淘汰
+        blob = {"Data": [os.urandom(64).hex()]}
+        probe = ResponseCache(path=os.path.join(tmp, "probe.sqlite3"))
+        probe.set("x", blob)
+        entry_size = probe.stats()["total_bytes"]
+        small = ResponseCache(path=os.path.join(tmp, "small.sqlite3"), ttl=60, max_bytes=entry_size * 2)
+        small.set("a", blob)
+        time.sleep(0.01)
+        small.set("b", blob)
+        time.sleep(0.01)
+        small.get("a")  # a 最近被使用
+        small.set("c", blob)
+        assert small.get("a") is not None
+        assert small.get("b") is None
+        assert small.stats()["total_bytes"] <= entry_size * 2
+        print(f"   ✓ LRU 淘汰正常 (evictions={small.stats()['evictions']})")
+
+if __name__ == "__main__":
+    test_response_cache()
@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sandbox_pool import CPU_LIMIT, ERROR, MEMORY_LIMIT, OK, TIMEOUT, WorkerPool, resource
+
+def test_sandbox_pool():
+    print("=" * 60)
+    print("測試 python_runner 的 worker pool")
+    print("=" * 60)
+
+    pool = WorkerPool(size=1, cell_timeout=4, cpu_seconds=1, memory_mb=256)
+    try:
+        assert pool.run("s", "x = 21").status == OK
+        result = pool.run("s", "print(x * 2)")
+        assert result.status == OK and result.output == "42\n"
+        assert pool.run("other", "print('x' in globals())").output == "False\n"
+        print("   ✓ 變數保存在各 session 的 worker 內")
+
+        result = pool.run("s", "open('/etc/hosts')")
+        assert result.status == ERROR and "open" in result.error
+        assert pool.run("s", "raise SystemExit").status == ERROR
+        assert pool.run("s", "print(x)").output == "21\n"
+        print("   ✓ 錯誤只影響該 cell，worker 仍保留變數")
+
+        if resource is not None:
+            result = pool.run("s", "while True: pass")
+            assert result.status == CPU_LIMIT, result
+            assert pool.run("s", "print(x)").output == "21\n"
+            print("   ✓ 超過 CPU 時間上限時中止 cell，變數保留")
+
+        start = time.perf_counter()
+        result = pool.run("s", "import time\nwhile True: time.sleep(0.05)")
+        assert result.status == TIMEOUT and time.perf_counter() - start < 8
+        result = pool.run("s", "print('x' in globals())")
+        assert result.status == OK and result.output == "False\n"
+        assert pool.stats()["timeouts"] == 1
+        print("   ✓ 逾時時終止 worker，session 改用新的 worker")
+
+        pool.run("other", "y = 1")
+        pool.reset("other")
+        assert pool.run("other", "print('y' in globals())").output == "False\n"
+        assert pool.close_session("other") and not pool.close_session("other")
+        print("   ✓ reset / close_session 正常")
+
+        try:
+            pool.run("../etc", "x = 1")
+            assert False, "invalid session name accepted"
+        except ValueError:
+            pass
+        print("   ✓ 不合法的 session 名稱會被拒絕")
+    finally:
+        pool.shutdown()
+
+def test_sessions():
+    print("=" * 60)
+    print("測試多 session：記憶體上限、LRU 與閒置回收")
+    print("=" * 60)
+
+    pool = WorkerPool(size=1, cell_timeout=10, cpu_seconds=5, memory_mb=256, session_memory_mb=160, max_sessions=2, idle_timeout=0.5)
+    try:
+        if resource is not None:
+            assert pool.run("a", "big = bytearray(100 * 1024 * 1024)").status == OK
+            result = pool.run("a", "more = bytearray(100 * 1024 * 1024)")
+            assert result.status == MEMORY_LIMIT, result
+            assert pool.run("a", "print(len(big) // 1024 // 1024)").output == "100\n"
+            print("   ✓ session 累計記憶體超過上限時中止 cell，變數保留")
+
+        pool.run("b", "y = 1")
+        sessions = pool.list_sessions()
+        assert [s["session"] for s in sessions] == ["b", "a"]
+        assert sessions[0]["variables"] == 1 and sessions[0]["cells"] == 1
+        assert all(s["memory_mb"] is None or s["memory_mb"] > 0 for s in sessions)
+        if resource is not None:
+            assert sessions[1]["memory_mb"] > sessions[0]["memory_mb"]
+        print("   ✓ list_sessions 回傳各 session 的記憶體與變數數量")
+
+        pool.run("b", "y += 1")
+        pool.run("c", "z = 1")  # 超過 max_sessions，最久未使用的 a 被回收
+        assert [s["session"] for s in pool.list_sessions()] == ["c", "b"]
+        assert pool.run("b", "print(y)").output == "2\n"
+        assert pool.stats()["evicted"] == 1
+        print("   ✓ session 數超過上限時回收最久未使用的 session")
+
+        time.sleep(0.7)
+        pool.run("c", "z += 1")
+        # 背景的回收 thread 也可能先回收 b，因此檢查結果而不是 reap_idle() 的回傳值
+        pool.reap_idle()
+        assert [s["session"] for s in pool.list_sessions()] == ["c"]
+        assert pool.stats()["evicted"] == 2
+        print("   ✓ 閒置過久的 session 會被回收")
+    finally:
+        pool.shutdown()
+
+def test_lazy_start():
+    pool = WorkerPool(size=1, cell_timeout=10, idle_timeout=60)
+    try:
+        assert pool.stats()["spawned"] == 0 and pool._reaper is None
+        assert pool.run("s", "print(1)").output == "1\n"
+        assert pool._reaper is not None and pool._reaper.is_alive()
+        deadline = time.time() + 30
+        while pool.stats()["spare_workers"] < 1 and time.time() < deadline:
+            time.sleep(0.1)
+        assert pool.stats()["spare_workers"] == 1
+        reaper = pool._reaper
+        pool.start()
+        assert pool._reaper is reaper
+        print("   ✓ 第一次使用時自動啟動閒置回收與備用 worker (不需另外呼叫 start)")
+    finally:
+        pool.shutdown()
+    assert pool._stop.is_set() and pool.stats()["spare_workers"] == 0
+
+if __name__ == "__main__":
+    test_sandbox_pool()
+    test_sessions()
+    test_lazy_start()
@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import NgramIndex, parse_query
+
+RECORDS = [
+    {"所屬類別": "人口", "資料名稱": "現住人口之年齡分配", "sid": "000003"},
+    {"所屬類別": "人口", "資料名稱": "人口", "sid": "000001"},
+    {"所屬類別": "社會治安", "資料名稱": "道路交通事故原因及傷亡人數", "sid": "000004"},
+    {"所屬類別": "人口", "資料名稱": "戶數及人口密度", "sid": "000002"},
+    {"所屬類別": "交通", "資料名稱": "機動車輛登記數", "sid": "000007"},
+    {"所屬類別": "Land", "資料名稱": "GDP Index", "sid": "000009"},
+]
+
+def test_parse_query():
+    print("=" * 60)
+    print("搜尋索引測試")
+    print("=" * 60)
+    assert parse_query("交通 事故") == [["交通", "事故"]]
+    assert parse_query("人口 OR 戶數") == [["人口"], ["戶數"]]
+    assert parse_query("人口|戶數 密度") == [["人口"], ["戶數", "密度"]]
+    print("   ✓ AND / OR 查詢解析正確")
+
+def test_search_ranking():
+    index = NgramIndex(RECORDS)
+
+    # 完全符合名稱者排第一，其次為開頭符合，再來是包含
+    sids = [r["sid"] for r in index.search("人口")]
+    assert sids[0] == "000001"
+    assert set(sids) == {"000001", "000002", "000003"}
+    print(f"   ✓ 依比對品質排序: {sids}")
+
+    # AND: 兩個關鍵字都要出現
+    assert [r["sid"] for r in index.search("交通 事故")] == ["000004"]
+    # 類別符合也算命中
+    assert "000007" in [r["sid"] for r in index.search("交通")]
+    # OR
+    assert {r["sid"] for r in index.search("事故 OR 車輛")} == {"000004", "000007"}
+    # 單一字元與大小寫
+    assert [r["sid"] for r in index.search("gdp")] == ["000009"]
+    assert index.search("密") and not index.search("不存在的關鍵字")
+    print("   ✓ 多關鍵字 AND/OR、單字元與大小寫查詢正確")
+
+if __name__ == "__main__":
+    test_parse_query()
+    test_search_ranking()
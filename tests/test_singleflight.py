@@ -0,0 +1,122 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from singleflight import SingleFlight
+
+def test_singleflight_threads():
+    print("=" * 60)
+    print("Single-flight 請求合併測試 (thread)")
+    print("=" * 60)
+
+    flight = SingleFlight()
+    executions = []
+    results = []
+
+    def slow_fetch():
+        executions.append(1)
+        time.sleep(0.2)
+        return {"Data": [1, 2, 3]}
+
+    def worker():
+        results.append(flight.do("0001:0002:000005:2021:2025", slow_fetch))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    assert len(executions) == 1
+    assert all(r is results[0] for r in results)
+    stats = flight.stats()
+    assert stats["coalesced"] == 7 and stats["in_flight"] == 0
+    print(f"   ✓ 8 個呼叫只打一次上游 (coalesced={stats['coalesced']})")
+
+def test_singleflight_async():
+    print("\n[測試] Single-flight 請求合併 (asyncio)...")
+    flight = SingleFlight()
+    executions = []
+
+    async def slow_fetch():
+        executions.append(1)
+        await asyncio.sleep(0.1)
+        return {"Data": []}
+
+    async def main():
+        return await asyncio.gather(*[flight.do_async("key", slow_fetch) for _ in range(10)])
+
+    results = asyncio.run(main())
+    assert len(executions) == 1
+    assert all(r == {"Data": []} for r in results)
+    assert flight.stats()["coalesced"] == 9
+    print(f"   ✓ 10 個協程只打一次上游")
+
+    # 錯誤會傳給所有等待者，且之後可以重新執行
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise TimeoutError("upstream timeout")
+
+    async def main_fail():
+        return await asyncio.gather(*[flight.do_async("bad", failing) for _ in range(3)], return_exceptions=True)
+
+    errors = asyncio.run(main_fail())
+    assert all(isinstance(e, TimeoutError) for e in errors)
+    assert flight.stats()["in_flight"] == 0
+    print("   ✓ 上游錯誤會傳遞給所有等待者")
+
+def test_singleflight_mixed():
+    print("\n[測試] Single-flight 請求合併 (thread 與 asyncio 混合)...")
+    flight = SingleFlight()
+    executions = []
+    release = threading.Event()
+
+    def sync_fetch():
+        executions.append("sync")
+        release.wait(5)
+        return {"Data": ["sync"]}
+
+    async def async_fetch():
+        executions.append("async")
+        await asyncio.sleep(0.2)
+        return {"Data": ["async"]}
+
+    # thread 是 leader，協程等待其結果
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", sync_fetch)))
+    leader.start()
+    while not executions:
+        time.sleep(0.01)
+
+    async def waiter():
+        task = asyncio.ensure_future(flight.do_async("key", async_fetch))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await task
+
+    assert asyncio.run(waiter()) == {"Data": ["sync"]}
+    leader.join()
+    assert executions == ["sync"] and results == [{"Data": ["sync"]}]
+    print("   ✓ 背景 thread 進行中的呼叫，非同步請求直接共用")
+
+    # 協程是 leader，thread 等待其結果
+    executions.clear()
+
+    async def async_leader():
+        task = asyncio.ensure_future(flight.do_async("key2", async_fetch))
+        await asyncio.sleep(0.05)
+        follower = await asyncio.to_thread(flight.do, "key2", sync_fetch)
+        return await task, follower
+
+    leader_result, follower_result = asyncio.run(async_leader())
+    assert executions == ["async"] and leader_result == follower_result == {"Data": ["async"]}
+    stats = flight.stats()
+    assert stats["upstream_executions"] == 2 and stats["coalesced"] == 2 and stats["in_flight"] == 0
+    print("   ✓ 非同步請求進行中的呼叫，背景 thread 直接共用")
+
+if __name__ == "__main__":
+    test_singleflight_threads()
+    test_singleflight_async()
+    test_singleflight_mixed()
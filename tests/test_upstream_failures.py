@@ -0,0 +1,84 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Server 匯入時會開啟快取檔，測試時改用暫存目錄
+os.environ.setdefault("TAOYUAN_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "cache.sqlite3"))
+
+import httpx
+import requests
+from urllib3.exceptions import MaxRetryError, ReadTimeoutError
+
+import server
+
+class _Response:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode("utf-8")
+
+def _parse_failure(status_code, text):
+    try:
+        server._parse_upstream_response(status_code, text)
+    except server.UpstreamError as e:
+        return server._failure_type(e)
+    return None
+
+def test_failure_types():
+    print("=" * 60)
+    print("測試上游失敗類型")
+    print("=" * 60)
+
+    assert server._parse_upstream_response(200, ' {"Data": []} ') == {"Data": []}
+    assert _parse_failure(500, "Internal Server Error") == "http_status"
+    assert _parse_failure(404, "") == "http_status"
+    assert _parse_failure(200, "  \r\n") == "empty_body"
+    assert _parse_failure(200, "<html>系統維護中</html>") == "bad_json"
+    print("   ✓ http_status / empty_body / bad_json")
+
+    # requests 重試用盡時，read timeout 會包成 ConnectionError
+    wrapped = requests.exceptions.ConnectionError(MaxRetryError(None, "/api", ReadTimeoutError(None, "/api", "Read timed out. (read timeout=30)")))
+    assert server._failure_type(wrapped) == "timeout"
+    assert server._failure_type(requests.exceptions.ReadTimeout("timeout")) == "timeout"
+    assert server._failure_type(requests.exceptions.ConnectTimeout("connect timeout")) == "timeout"
+    assert server._failure_type(httpx.ReadTimeout("timed out")) == "timeout"
+    print("   ✓ timeout (含包在 ConnectionError 內的 read timeout)")
+
+    assert server._failure_type(requests.exceptions.ConnectionError("Connection refused")) == "connection"
+    assert server._failure_type(httpx.ConnectError("refused")) == "connection"
+    assert server._failure_type(httpx.RemoteProtocolError("server disconnected")) == "connection"
+    assert server._failure_type(KeyError("x")) == "other"
+    print("   ✓ connection / other")
+
+def test_failures_are_counted():
+    responses = iter([
+        _Response(503, "busy"),
+        _Response(200, ""),
+        _Response(200, "not json"),
+        requests.exceptions.ConnectionError("Connection refused"),
+        requests.exceptions.ReadTimeout("Read timed out."),
+    ])
+
+    def fake_get(url, params=None, headers=None, verify=True, **kwargs):
+        result = next(responses)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    kinds = ("http_status", "empty_body", "bad_json", "connection", "timeout")
+    before = {k: server.UPSTREAM_FAILURES.value(type=k) for k in kinds}
+    saved = server.upstream_client.get
+    server.upstream_client.get = fake_get
+    try:
+        for i in range(len(kinds)):
+            assert server._download_data(f"test-failure-{i}", {}) is None
+    finally:
+        server.upstream_client.get = saved
+    assert all(server.UPSTREAM_FAILURES.value(type=k) == before[k] + 1 for k in kinds)
+    print("   ✓ 每種失敗都記錄在 taoyuan_upstream_failures_total{type=...}")
+
+if __name__ == "__main__":
+    test_failure_types()
+    test_failures_are_counted()
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import threading
+
+# 共用的上游 HTTP Client
+# 所有對外請求 (統計 API、爬蟲、外網 IP 查詢) 都走同一個連線池，
+# 避免每次請求都重新做 TCP + TLS 握手。
+# requests / httpx 在第一次發送請求時才匯入，以縮短 Server 啟動時間。
+
+# 可用 TAOYUAN_UPSTREAM_URL 指向本機的替身 (benchmarks/fake_upstream.py) 做壓測
+TYCG_API_URL = os.environ.get("TAOYUAN_UPSTREAM_URL", "https://statisticsinfo.tycg.gov.tw/TaoyuanSTYB/RestfulAPI/GetStaticData.aspx")
+
+POOL_SIZE = int(os.environ.get("TAOYUAN_HTTP_POOL_SIZE", "32"))
+MAX_RETRIES = int(os.environ.get("TAOYUAN_HTTP_RETRIES", "2"))
+BACKOFF_FACTOR = float(os.environ.get("TAOYUAN_HTTP_BACKOFF", "0.5"))
+CONNECT_TIMEOUT = float(os.environ.get("TAOYUAN_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("TAOYUAN_READ_TIMEOUT", "30"))
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Connection": "keep-alive",
+}
+
+_session = None
+_session_lock = threading.Lock()
+_async_clients = {}
+
+
+def _build_session() -> "requests.Session":
+    import requests
+    import urllib3
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # 關閉 SSL 警告 (桃園政府憑證在 Python 內預設不被信任)
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def get_session() -> "requests.Session":
+    """取得共用的 Session (第一次呼叫時建立)。"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get(url: str, params=None, headers=None, connect_timeout: float = None, read_timeout: float = None, verify: bool = True) -> "requests.Response":
+    """透過共用連線池發送 GET 請求，connect / read timeout 分開設定。"""
+    timeout = (
+        CONNECT_TIMEOUT if connect_timeout is None else connect_timeout,
+        READ_TIMEOUT if read_timeout is None else read_timeout,
+    )
+    return get_session().get(url, params=params, headers=headers, timeout=timeout, verify=verify)
+
+
+# --- Async Client (FastAPI 非同步路徑使用) ---
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def get_async_client(verify: bool = True):
+    """取得目前 event loop 專用的 httpx.AsyncClient (含連線池與 keep-alive)。"""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    key = (id(loop), verify)
+    client = _async_clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            verify=verify,
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+        )
+        _async_clients[key] = client
+    return client
+
+
+async def async_get(url: str, params=None, headers=None, connect_timeout: float = None, read_timeout: float = None, verify: bool = True):
+    """非同步版 get()：5xx 與逾時以相同的 backoff 規則重試。"""
+    import httpx
+
+    client = get_async_client(verify)
+    timeout = httpx.Timeout(
+        READ_TIMEOUT if read_timeout is None else read_timeout,
+        connect=CONNECT_TIMEOUT if connect_timeout is None else connect_timeout,
+    )
+    attempt = 0
+    while True:
+        try:
+            response = await client.get(url, params=params, headers=headers, timeout=timeout)
+            if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+                return response
+        except (httpx.TimeoutException, httpx.TransportError):
+            if attempt >= MAX_RETRIES:
+                raise
+        await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
+        attempt += 1
+
+
+async def aclose() -> None:
+    """關閉目前 event loop 的 AsyncClient (Server 關閉時呼叫)。"""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [k for k in _async_clients if k[0] == loop_id]:
+        await _async_clients.pop(key).aclose()